@@ -0,0 +1,33 @@
+"""Помощники для асинхронных представлений.
+
+В Django 3.2 ORM, сессии и шаблоны синхронные, поэтому
+асинхронное представление обращается к ним через sync_to_async.
+Под ASGI (yatube/asgi.py) все такие вызовы одного запроса идут
+в один поток с одним соединением к БД, а цикл событий
+в это время обслуживает другие соединения.
+"""
+from functools import wraps
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth.views import redirect_to_login
+
+
+@sync_to_async
+def get_user(request):
+    """Пользователь запроса: request.user ленивый и читает сессию."""
+    request.user.is_authenticated
+    return request.user
+
+
+def login_required(view):
+    """Асинхронная версия django.contrib.auth.decorators.login_required."""
+    @wraps(view)
+    async def wrapper(request, *args, **kwargs):
+        user = await get_user(request)
+        if not user.is_authenticated:
+            return redirect_to_login(
+                request.get_full_path(), settings.LOGIN_URL
+            )
+        return await view(request, *args, **kwargs)
+    return wrapper
@@ -0,0 +1,347 @@
+"""Кеш в файле SQLite, общий для всех процессов на одном сервере.
+
+LocMemCache у каждого воркера gunicorn свой: кеш холодный после
+перезапуска, а сброс версии в одном воркере не виден остальным.
+Этот бэкенд хранит записи в одном файле SQLite в режиме WAL,
+так что читатели не блокируют друг друга и писателя, а файл
+отображается в память через mmap.
+
+get() только читает и никогда не ждет: многие значения (версии,
+списки популярного) читаются без последующего set().
+
+Защита от лавины запросов (cache stampede) - в get_or_set():
+* single-flight: после промаха или истечения срока значение
+  пересчитывает только тот процесс, который взял блокировку ключа;
+  остальные получают устаревшее значение (в пределах GRACE секунд)
+  или ждут не дольше WAIT секунд, пока оно появится;
+* вероятностный досрочный пересчет (XFetch): незадолго до истечения
+  срока случайный читатель пересчитывает значение заранее. Чем
+  дольше значение считалось в прошлый раз, тем раньше это происходит.
+
+Код, который читает и пишет значение на разных шагах, как кеш
+страниц, берет ту же блокировку через lock() и ждет чужой пересчет
+через wait(). Блокировку снимает set() или unlock().
+
+Пример настройки:
+
+    CACHES = {
+        'default': {
+            'BACKEND': 'core.cache_backends.sqlite.SQLiteCache',
+            'LOCATION': os.path.join(BASE_DIR, 'cache.sqlite3'),
+            'OPTIONS': {'MAX_ENTRIES': 100000},
+        }
+    }
+"""
+import math
+import os
+import pickle
+import random
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+
+from django.core.cache.backends.base import DEFAULT_TIMEOUT, BaseCache
+
+SCHEMA = (
+    'CREATE TABLE IF NOT EXISTS cache_entries ('
+    ' key TEXT PRIMARY KEY, value BLOB NOT NULL,'
+    ' expires REAL, delta REAL NOT NULL DEFAULT 0'
+    ') WITHOUT ROWID',
+    'CREATE TABLE IF NOT EXISTS cache_locks ('
+    ' key TEXT PRIMARY KEY, expires REAL NOT NULL'
+    ') WITHOUT ROWID',
+)
+
+# Как часто (раз в сколько записей) процесс чистит старые записи.
+CULL_EVERY = 100
+
+
+class SQLiteCache(BaseCache):
+    pickle_protocol = pickle.HIGHEST_PROTOCOL
+
+    def __init__(self, location, params):
+        super().__init__(params)
+        options = params.get('OPTIONS', {})
+        self._path = location
+        self._grace = options.get('GRACE', 60)
+        self._beta = options.get('BETA', 1.0)
+        self._lock_timeout = options.get('LOCK_TIMEOUT', 10)
+        self._wait = options.get('WAIT', 1)
+        self._busy_timeout = options.get('BUSY_TIMEOUT', 5)
+        self._mmap_size = options.get('MMAP_SIZE', 64 * 1024 * 1024)
+        self._local = threading.local()
+
+    @property
+    def _db(self):
+        # Соединение свое у каждого потока и у каждого процесса
+        # после fork.
+        local = self._local
+        if getattr(local, 'pid', None) != os.getpid():
+            db = sqlite3.connect(
+                self._path,
+                timeout=self._busy_timeout,
+                isolation_level=None,
+                check_same_thread=False,
+            )
+            db.execute('PRAGMA journal_mode=WAL')
+            db.execute('PRAGMA synchronous=NORMAL')
+            db.execute(f'PRAGMA mmap_size={int(self._mmap_size)}')
+            for statement in SCHEMA:
+                db.execute(statement)
+            local.db = db
+            local.pid = os.getpid()
+            local.misses = {}
+            local.writes = 0
+        return local.db
+
+    @contextmanager
+    def _transaction(self):
+        db = self._db
+        db.execute('BEGIN IMMEDIATE')
+        try:
+            yield db
+        except BaseException:
+            db.execute('ROLLBACK')
+            raise
+        db.execute('COMMIT')
+
+    def _key(self, key, version):
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+        return key
+
+    def _loads(self, value):
+        return pickle.loads(value)
+
+    def _dumps(self, value):
+        return pickle.dumps(value, self.pickle_protocol)
+
+    def _fresh(self, expires, now):
+        return expires is None or expires > now
+
+    def _recompute_early(self, expires, delta, now):
+        """XFetch: True, если этому читателю пора пересчитать значение."""
+        if expires is None or not delta:
+            return False
+        jitter = -math.log(1.0 - random.random())
+        return now + delta * self._beta * jitter >= expires
+
+    def _acquire(self, key, now):
+        """Пытается взять блокировку пересчета ключа."""
+        db = self._db
+        db.execute(
+            'DELETE FROM cache_locks WHERE key = ? AND expires <= ?',
+            (key, now),
+        )
+        cursor = db.execute(
+            'INSERT OR IGNORE INTO cache_locks (key, expires) VALUES (?, ?)',
+            (key, now + self._lock_timeout),
+        )
+        if cursor.rowcount != 1:
+            return False
+        self._local.misses[key] = now
+        return True
+
+    def _fetch(self, key):
+        return self._db.execute(
+            'SELECT value, expires, delta FROM cache_entries WHERE key = ?',
+            (key,),
+        ).fetchone()
+
+    def _release(self, key):
+        self._local.misses.pop(key, None)
+        self._db.execute('DELETE FROM cache_locks WHERE key = ?', (key,))
+
+    def _wait_for(self, key, default):
+        """Ждет, пока значение посчитает владелец блокировки."""
+        deadline = time.time() + self._wait
+        while time.time() < deadline:
+            time.sleep(0.05)
+            row = self._fetch(key)
+            if row is not None and self._fresh(row[1], time.time()):
+                return self._loads(row[0])
+        return default
+
+    def get(self, key, default=None, version=None):
+        row = self._fetch(self._key(key, version))
+        if row is None or not self._fresh(row[1], time.time()):
+            return default
+        return self._loads(row[0])
+
+    def get_many(self, keys, version=None):
+        keys = {self._key(key, version): key for key in keys}
+        if not keys:
+            return {}
+        now = time.time()
+        placeholders = ', '.join('?' * len(keys))
+        rows = self._db.execute(
+            'SELECT key, value, expires FROM cache_entries '
+            f'WHERE key IN ({placeholders})',
+            list(keys),
+        ).fetchall()
+        return {
+            keys[key]: self._loads(value)
+            for key, value, expires in rows if self._fresh(expires, now)
+        }
+
+    def get_or_set(self, key, default, timeout=DEFAULT_TIMEOUT, version=None):
+        made_key = self._key(key, version)
+        now = time.time()
+        row = self._fetch(made_key)
+        if row is not None:
+            value, expires, delta = row
+            if self._fresh(expires, now) and not self._recompute_early(
+                    expires, delta, now):
+                return self._loads(value)
+        if self._acquire(made_key, now):
+            try:
+                value = default() if callable(default) else default
+            except BaseException:
+                self._release(made_key)
+                raise
+            self.set(key, value, timeout=timeout, version=version)
+            return value
+        if row is not None and row[1] + self._grace > now:
+            # Значение уже пересчитывает другой процесс.
+            return self._loads(row[0])
+        value = self._wait_for(made_key, self._missing_key)
+        if value is self._missing_key:
+            # Владелец блокировки не успел: считаем сами, не записывая.
+            value = default() if callable(default) else default
+        return value
+
+    def lock(self, key, version=None):
+        """Берет блокировку пересчета key, как get_or_set().
+        True - значение считает вызывающий, и он же снимает
+        блокировку через set() или unlock().
+        """
+        return self._acquire(self._key(key, version), time.time())
+
+    def unlock(self, key, version=None):
+        self._release(self._key(key, version))
+
+    def wait(self, key, default=None, version=None):
+        """Ждет не дольше WAIT секунд значение, которое считает
+        владелец блокировки.
+        """
+        return self._wait_for(self._key(key, version), default)
+
+    def _write(self, db, key, value, timeout, only_if_stale=False):
+        now = time.time()
+        started = self._local.misses.pop(key, None)
+        delta = None if started is None else now - started
+        sql = (
+            'INSERT INTO cache_entries (key, value, expires, delta) '
+            'VALUES (?, ?, ?, COALESCE(?, 0)) '
+            'ON CONFLICT(key) DO UPDATE SET value = excluded.value, '
+            'expires = excluded.expires, '
+            'delta = COALESCE(?, cache_entries.delta)'
+        )
+        params = [key, self._dumps(value), self.get_backend_timeout(timeout),
+                  delta, delta]
+        if only_if_stale:
+            sql += (
+                ' WHERE cache_entries.expires IS NOT NULL'
+                ' AND cache_entries.expires <= ?'
+            )
+            params.append(now)
+        cursor = db.execute(sql, params)
+        db.execute('DELETE FROM cache_locks WHERE key = ?', (key,))
+        return cursor.rowcount == 1
+
+    def _maybe_cull(self):
+        self._local.writes += 1
+        if self._local.writes % CULL_EVERY:
+            return
+        db = self._db
+        db.execute(
+            'DELETE FROM cache_entries WHERE expires < ?',
+            (time.time() - self._grace,),
+        )
+        count = db.execute('SELECT COUNT(*) FROM cache_entries').fetchone()[0]
+        if count > self._max_entries:
+            db.execute(
+                'DELETE FROM cache_entries WHERE key IN ('
+                ' SELECT key FROM cache_entries'
+                ' ORDER BY expires IS NULL, expires LIMIT ?)',
+                (count // self._cull_frequency,),
+            )
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self._key(key, version)
+        self._write(self._db, key, value, timeout)
+        self._maybe_cull()
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self._key(key, version)
+        added = self._write(self._db, key, value, timeout, only_if_stale=True)
+        self._maybe_cull()
+        return added
+
+    def set_many(self, data, timeout=DEFAULT_TIMEOUT, version=None):
+        with self._transaction() as db:
+            for key, value in data.items():
+                self._write(db, self._key(key, version), value, timeout)
+        self._maybe_cull()
+        return []
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self._key(key, version)
+        cursor = self._db.execute(
+            'UPDATE cache_entries SET expires = ? WHERE key = ? '
+            'AND (expires IS NULL OR expires > ?)',
+            (self.get_backend_timeout(timeout), key, time.time()),
+        )
+        return cursor.rowcount == 1
+
+    def incr(self, key, delta=1, version=None):
+        key = self._key(key, version)
+        with self._transaction() as db:
+            row = db.execute(
+                'SELECT value, expires FROM cache_entries WHERE key = ?',
+                (key,),
+            ).fetchone()
+            if row is None or not self._fresh(row[1], time.time()):
+                raise ValueError(f"Key '{key}' not found")
+            value = self._loads(row[0]) + delta
+            db.execute(
+                'UPDATE cache_entries SET value = ? WHERE key = ?',
+                (self._dumps(value), key),
+            )
+        return value
+
+    def has_key(self, key, version=None):
+        key = self._key(key, version)
+        row = self._db.execute(
+            'SELECT 1 FROM cache_entries WHERE key = ? '
+            'AND (expires IS NULL OR expires > ?)',
+            (key, time.time()),
+        ).fetchone()
+        return row is not None
+
+    def delete(self, key, version=None):
+        key = self._key(key, version)
+        with self._transaction() as db:
+            cursor = db.execute(
+                'DELETE FROM cache_entries WHERE key = ?', (key,)
+            )
+            db.execute('DELETE FROM cache_locks WHERE key = ?', (key,))
+        return cursor.rowcount == 1
+
+    def delete_many(self, keys, version=None):
+        with self._transaction() as db:
+            for key in keys:
+                key = self._key(key, version)
+                db.execute('DELETE FROM cache_entries WHERE key = ?', (key,))
+                db.execute('DELETE FROM cache_locks WHERE key = ?', (key,))
+
+    def clear(self):
+        with self._transaction() as db:
+            db.execute('DELETE FROM cache_entries')
+            db.execute('DELETE FROM cache_locks')
+
+    def close(self, **kwargs):
+        # Соединение живет все время жизни потока: закрывать его
+        # после каждого запроса дороже, чем держать открытым.
+        pass
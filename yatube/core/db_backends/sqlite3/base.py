@@ -0,0 +1,71 @@
+"""Бэкенд SQLite с настройками для работы под нагрузкой.
+
+Стандартный бэкенд открывает файл в режиме журнала DELETE: каждая
+запись блокирует всех читателей, а при встречных записях транзакция,
+начатая как читающая, получает "database is locked" без ожидания.
+Этот бэкенд на каждом новом соединении включает:
+* журнал WAL: читатели не ждут писателя и друг друга;
+* synchronous=NORMAL: в режиме WAL база не портится при сбое,
+  теряются только последние транзакции при отключении питания;
+* busy_timeout: писатель ждет освобождения блокировки;
+* mmap и кеш страниц побольше;
+* auto_vacuum=INCREMENTAL для новых файлов, см. sqlite_maintenance.
+Транзакции начинаются с BEGIN IMMEDIATE: блокировка записи берется
+сразу, и ожидание по busy_timeout работает, а не обрывается ошибкой
+при попытке повысить читающую транзакцию до пишущей.
+
+Пример настройки:
+
+    DATABASES = {
+        'default': {
+            'ENGINE': 'core.db_backends.sqlite3',
+            'NAME': os.path.join(BASE_DIR, 'db.sqlite3'),
+            'CONN_MAX_AGE': 600,
+            'OPTIONS': {'BUSY_TIMEOUT': 5000},
+        }
+    }
+"""
+from django.db.backends.sqlite3 import base
+
+# Параметры OPTIONS, которые не передаются в sqlite3.connect(),
+# и их значения по умолчанию.
+TUNING = {
+    'JOURNAL_MODE': 'WAL',
+    'SYNCHRONOUS': 'NORMAL',
+    'BUSY_TIMEOUT': 5000,
+    'MMAP_SIZE': 256 * 1024 * 1024,
+    # Отрицательное значение - размер в КиБ, а не в страницах.
+    'CACHE_SIZE': -64 * 1024,
+    'TEMP_STORE': 'MEMORY',
+    'AUTO_VACUUM': 'INCREMENTAL',
+    'TRANSACTION_MODE': 'IMMEDIATE',
+}
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+    def __init__(self, settings_dict, *args, **kwargs):
+        options = dict(settings_dict.get('OPTIONS', {}))
+        self.tuning = {
+            name: options.pop(name, default)
+            for name, default in TUNING.items()
+        }
+        super().__init__({**settings_dict, 'OPTIONS': options},
+                         *args, **kwargs)
+
+    def get_new_connection(self, conn_params):
+        conn = super().get_new_connection(conn_params)
+        tuning = self.tuning
+        # auto_vacuum действует, только пока в файле нет таблиц,
+        # поэтому ставится первым.
+        conn.execute(f'PRAGMA auto_vacuum = {tuning["AUTO_VACUUM"]}')
+        conn.execute(f'PRAGMA journal_mode = {tuning["JOURNAL_MODE"]}')
+        conn.execute(f'PRAGMA synchronous = {tuning["SYNCHRONOUS"]}')
+        conn.execute(f'PRAGMA busy_timeout = {int(tuning["BUSY_TIMEOUT"])}')
+        conn.execute(f'PRAGMA mmap_size = {int(tuning["MMAP_SIZE"])}')
+        conn.execute(f'PRAGMA cache_size = {int(tuning["CACHE_SIZE"])}')
+        conn.execute(f'PRAGMA temp_store = {tuning["TEMP_STORE"]}')
+        return conn
+
+    def _start_transaction_under_autocommit(self):
+        mode = self.tuning['TRANSACTION_MODE']
+        self.cursor().execute(f'BEGIN {mode}' if mode else 'BEGIN')
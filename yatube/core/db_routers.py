@@ -0,0 +1,133 @@
+"""Чтение с реплик БД.
+
+Пишет приложение всегда в default. Читать с реплик из
+DATABASE_REPLICAS разрешено только представлениям, отмеченным
+core.middleware.replica.replica_reads, и только если:
+* пользователь недавно ничего не записывал (иначе он может не увидеть
+  свой пост или комментарий): после записи его чтения идут в default
+  REPLICA_STICKY_SECONDS секунд;
+* снимок реплики отстает от последней записи в базу не больше чем
+  на REPLICA_MAX_LAG секунд. Значение по умолчанию 0: страницы
+  и фрагменты в кеше хранятся под версиями, которые меняются сразу
+  при записи, и устаревшая реплика заполнила бы их старыми данными.
+
+Время последней записи и время снимка каждой реплики хранятся в общем
+кеше. Снимок делает команда refresh_replica.
+"""
+import random
+import re
+import time
+from contextvars import ContextVar
+from dataclasses import dataclass
+from typing import Optional
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS, connections, transaction
+
+LAST_WRITE_KEY = 'db:last-write'
+SYNCED_KEY = 'db:replica-synced:{alias}'
+
+WRITE_SQL = re.compile(r'\s*(?:INSERT|UPDATE|DELETE|REPLACE)\b', re.I)
+
+
+@dataclass
+class RoutingState:
+    """Решение о репликах для одного запроса к сайту."""
+    replica: Optional[str] = None
+    wrote: bool = False
+
+
+routing = ContextVar('db_routing', default=None)
+
+
+def replicas() -> list:
+    return list(getattr(settings, 'DATABASE_REPLICAS', ()))
+
+
+def mark_synced(alias: str, started: float) -> None:
+    """Запоминает время начала снимка, который теперь в реплике."""
+    cache.set(SYNCED_KEY.format(alias=alias), started, None)
+
+
+def mark_written() -> None:
+    cache.set(LAST_WRITE_KEY, time.time(), None)
+
+
+def mark_after_write(execute, sql, params, many, context):
+    """Обертка execute_wrapper соединения default: ставит время записи,
+    когда запись, которую роутер отправил в default, уже выполнена.
+    Внутри транзакции - после коммита, одна отметка на транзакцию.
+    """
+    result = execute(sql, params, many, context)
+    connection = context['connection']
+    if getattr(connection, 'write_pending', False) and WRITE_SQL.match(sql):
+        connection.write_pending = False
+        if not connection.in_atomic_block:
+            mark_written()
+        elif not any(
+            entry[1] is mark_written for entry in connection.run_on_commit
+        ):
+            transaction.on_commit(mark_written, using=connection.alias)
+    return result
+
+
+def fresh_replica() -> Optional[str]:
+    """Случайная реплика, снимок которой достаточно свежий, или None.
+    Время записи ставится после коммита, а время снимка - до начала
+    копирования, поэтому сравнение не пропустит запись, которая
+    не попала в снимок.
+    """
+    aliases = replicas()
+    if not aliases:
+        return None
+    keys = {SYNCED_KEY.format(alias=alias): alias for alias in aliases}
+    values = cache.get_many([LAST_WRITE_KEY, *keys])
+    last_write = values.get(LAST_WRITE_KEY, 0)
+    max_lag = getattr(settings, 'REPLICA_MAX_LAG', 0)
+    fresh = [
+        alias for key, alias in keys.items()
+        if key in values and values[key] >= last_write - max_lag
+    ]
+    return random.choice(fresh) if fresh else None
+
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        state = routing.get()
+        if state is None or state.wrote or state.replica is None:
+            return DEFAULT_DB_ALIAS
+        return state.replica
+
+    def db_for_write(self, model, **hints):
+        # Объекты из других баз (например, шардов постов) пишутся
+        # туда же, откуда прочитаны.
+        instance = hints.get('instance')
+        if instance is not None and instance._state.db not in {
+            None, DEFAULT_DB_ALIAS, *replicas()
+        }:
+            return None
+        state = routing.get()
+        if state is not None:
+            state.wrote = True
+        # Роутер спрашивают до записи, а отметка должна появиться
+        # после нее (см. fresh_replica): ее ставит mark_after_write.
+        connection = connections[DEFAULT_DB_ALIAS]
+        connection.write_pending = True
+        if mark_after_write not in connection.execute_wrappers:
+            # В начало списка: execute_wrapper() снимает последнюю
+            # обертку, и эта не должна занять ее место.
+            connection.execute_wrappers.insert(0, mark_after_write)
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        databases = {DEFAULT_DB_ALIAS, *replicas()}
+        if obj1._state.db in databases and obj2._state.db in databases:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # Реплики получают схему вместе с данными из снимка.
+        if db in replicas():
+            return False
+        return None
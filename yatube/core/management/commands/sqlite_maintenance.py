@@ -0,0 +1,98 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS, connections
+
+# Значение PRAGMA auto_vacuum для режима INCREMENTAL.
+AUTO_VACUUM_INCREMENTAL = 2
+
+
+class Command(BaseCommand):
+    help = (
+        'Обслуживание базы SQLite: ANALYZE, возврат свободных страниц '
+        '(incremental vacuum) и перенос WAL в основной файл. '
+        'Запускается по расписанию, например из cron раз в час: '
+        '0 * * * * python manage.py sqlite_maintenance'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--database', default=DEFAULT_DB_ALIAS,
+            help='Алиас базы из DATABASES',
+        )
+        parser.add_argument(
+            '--analysis-limit', type=int, default=1000,
+            help='Сколько строк индекса просматривает ANALYZE '
+                 '(0 - все строки)',
+        )
+        parser.add_argument(
+            '--vacuum-pages', type=int, default=0,
+            help='Сколько свободных страниц вернуть за запуск (0 - все)',
+        )
+        parser.add_argument(
+            '--enable-incremental-vacuum', action='store_true',
+            help='Перевести старый файл в auto_vacuum=INCREMENTAL. '
+                 'Делает полный VACUUM и блокирует запись на время работы',
+        )
+
+    def handle(self, *args, **options):
+        connection = connections[options['database']]
+        if connection.vendor != 'sqlite':
+            raise CommandError('Команда работает только с SQLite')
+        with connection.cursor() as cursor:
+            if options['enable_incremental_vacuum']:
+                self.enable_incremental_vacuum(cursor)
+            self.analyze(cursor, options['analysis_limit'])
+            self.incremental_vacuum(cursor, options['vacuum_pages'])
+            self.checkpoint(cursor)
+
+    def pragma(self, cursor, name):
+        cursor.execute(f'PRAGMA {name}')
+        return cursor.fetchone()
+
+    def enable_incremental_vacuum(self, cursor):
+        auto_vacuum, = self.pragma(cursor, 'auto_vacuum')
+        if auto_vacuum == AUTO_VACUUM_INCREMENTAL:
+            return
+        cursor.execute('PRAGMA auto_vacuum = INCREMENTAL')
+        cursor.execute('VACUUM')
+        self.stdout.write('VACUUM: включен auto_vacuum=INCREMENTAL')
+
+    def analyze(self, cursor, limit):
+        cursor.execute(f'PRAGMA analysis_limit = {int(limit)}')
+        cursor.execute('ANALYZE')
+        self.stdout.write(f'ANALYZE: статистика обновлена (limit={limit})')
+
+    def incremental_vacuum(self, cursor, pages):
+        auto_vacuum, = self.pragma(cursor, 'auto_vacuum')
+        free_before, = self.pragma(cursor, 'freelist_count')
+        if auto_vacuum != AUTO_VACUUM_INCREMENTAL:
+            self.stdout.write(
+                f'incremental_vacuum: пропущен, auto_vacuum={auto_vacuum}, '
+                f'свободных страниц {free_before}. '
+                'Запустите с --enable-incremental-vacuum'
+            )
+            return
+        # PRAGMA incremental_vacuum возвращает строку на каждую
+        # освобожденную страницу, их нужно вычитать.
+        cursor.execute(f'PRAGMA incremental_vacuum({int(pages)})')
+        cursor.fetchall()
+        free_after, = self.pragma(cursor, 'freelist_count')
+        page_size, = self.pragma(cursor, 'page_size')
+        freed = free_before - free_after
+        self.stdout.write(
+            f'incremental_vacuum: возвращено страниц {freed} '
+            f'({freed * page_size // 1024} КиБ), осталось {free_after}'
+        )
+
+    def checkpoint(self, cursor):
+        busy, wal_pages, moved = self.pragma(
+            cursor, 'wal_checkpoint(TRUNCATE)'
+        )
+        if busy:
+            self.stdout.write(
+                f'wal_checkpoint: база занята, перенесено {moved} '
+                f'из {wal_pages} страниц WAL'
+            )
+        else:
+            self.stdout.write(
+                f'wal_checkpoint: перенесено {moved} страниц, WAL обрезан'
+            )
@@ -0,0 +1,209 @@
+"""Отдача файлов из MEDIA_ROOT.
+
+Django только проверяет доступ и условные заголовки, а сами байты
+отдает фронтовой сервер: nginx по заголовку X-Accel-Redirect,
+Apache и lighttpd по X-Sendfile (настройка MEDIA_SENDFILE).
+Без фронтового сервера файл отдается из Python с поддержкой Range,
+причем целиком отданный файл уходит через wsgi.file_wrapper,
+то есть sendfile() сервера приложений, если он его умеет.
+
+Имена с SHA-256 содержимого (core.storages.content_addressed)
+никогда не меняют содержимое: ETag для них - сам хеш,
+а Cache-Control разрешает кешировать навсегда.
+"""
+import mimetypes
+import os
+import posixpath
+import re
+from dataclasses import dataclass
+from typing import Optional
+from urllib.parse import quote
+
+from django.conf import settings
+from django.http import FileResponse, Http404, HttpResponse
+from django.utils.http import http_date, parse_http_date_safe
+
+from core.storages.content_addressed import ContentAddressedStorage
+
+IMMUTABLE = 'public, max-age=31536000, immutable'
+BYTES_RANGE = re.compile(r'^bytes=(\d*)-(\d*)$')
+BLOCK_SIZE = 64 * 1024
+
+
+@dataclass
+class MediaFile:
+    name: str
+    path: str
+    size: int
+    mtime: float
+    etag: str
+    immutable: bool
+
+    @property
+    def content_type(self) -> str:
+        content_type, encoding = mimetypes.guess_type(self.name)
+        if encoding or not content_type:
+            return 'application/octet-stream'
+        return content_type
+
+
+def public_dirs() -> tuple:
+    return tuple(getattr(settings, 'MEDIA_PUBLIC_DIRS', ('posts', 'cache')))
+
+
+def resolve(path: str) -> MediaFile:
+    """Находит файл в MEDIA_ROOT.
+    Пути с выходом за MEDIA_ROOT и скрытые каталоги вроде .incoming
+    не отдаются никому: для них Http404.
+    """
+    name = posixpath.normpath(path).lstrip('/')
+    parts = name.split('/')
+    if name in ('', '.') or any(
+        part in ('', '..') or part.startswith('.') for part in parts
+    ):
+        raise Http404
+    full_path = os.path.join(settings.MEDIA_ROOT, *parts)
+    try:
+        stat = os.stat(full_path)
+    except OSError:
+        raise Http404
+    if not os.path.isfile(full_path):
+        raise Http404
+    digest = ContentAddressedStorage.digest_of(name)
+    if digest:
+        etag = f'"{digest}"'
+    else:
+        etag = f'"{stat.st_mtime_ns:x}-{stat.st_size:x}"'
+    return MediaFile(
+        name=name,
+        path=full_path,
+        size=stat.st_size,
+        mtime=stat.st_mtime,
+        etag=etag,
+        immutable=digest is not None,
+    )
+
+
+def is_public(media: MediaFile) -> bool:
+    return media.name.split('/', 1)[0] in public_dirs()
+
+
+def byte_range(header: str, size: int) -> Optional[tuple]:
+    """Разбирает заголовок Range.
+    Возвращает (начало, конец включительно), None, если заголовок
+    надо проигнорировать и отдать файл целиком (в том числе
+    для нескольких диапазонов), или ValueError для диапазона
+    за концом файла.
+    """
+    match = BYTES_RANGE.match(header.replace(' ', ''))
+    if not match:
+        return None
+    first, last = match.groups()
+    if not first:
+        if not last:
+            return None
+        length = int(last)
+        if not length:
+            raise ValueError(header)
+        return max(size - length, 0), size - 1
+    start = int(first)
+    if last and int(last) < start:
+        return None
+    if start >= size:
+        raise ValueError(header)
+    end = min(int(last), size - 1) if last else size - 1
+    return start, end
+
+
+def range_applies(request, media: MediaFile) -> bool:
+    """If-Range: диапазон отдается, только если файл не изменился."""
+    condition = request.META.get('HTTP_IF_RANGE')
+    if not condition:
+        return True
+    if condition.startswith('"'):
+        return condition == media.etag
+    modified = parse_http_date_safe(condition)
+    return modified is not None and modified == int(media.mtime)
+
+
+class FileRange:
+    """Часть открытого файла для FileResponse.
+    fileno() позволяет серверу приложений отдать диапазон через
+    sendfile(): gunicorn начинает с текущей позиции файла и шлет
+    ровно Content-Length байт.
+    """
+
+    def __init__(self, file, start: int, length: int):
+        self.file = file
+        self.remaining = length
+        file.seek(start)
+
+    def read(self, size=-1):
+        if size is None or size < 0 or size > self.remaining:
+            size = self.remaining
+        data = self.file.read(size)
+        self.remaining -= len(data)
+        return data
+
+    def fileno(self):
+        return self.file.fileno()
+
+    def close(self):
+        self.file.close()
+
+
+def sendfile_response(media: MediaFile) -> Optional[HttpResponse]:
+    """Пустой ответ, тело которого подставит фронтовой сервер."""
+    backend = getattr(settings, 'MEDIA_SENDFILE', None)
+    if not backend:
+        return None
+    response = HttpResponse(content_type=media.content_type)
+    if backend == 'x-accel-redirect':
+        prefix = getattr(settings, 'MEDIA_INTERNAL_URL', '/internal-media/')
+        response['X-Accel-Redirect'] = prefix + quote(media.name)
+    elif backend == 'x-sendfile':
+        response['X-Sendfile'] = media.path
+    else:
+        raise ValueError(f'Неизвестный MEDIA_SENDFILE: {backend}')
+    return response
+
+
+def file_response(request, media: MediaFile) -> HttpResponse:
+    """Отдает файл из Python целиком или один диапазон Range."""
+    header = request.META.get('HTTP_RANGE')
+    span = None
+    if header and range_applies(request, media):
+        try:
+            span = byte_range(header, media.size)
+        except ValueError:
+            response = HttpResponse(
+                status=416, content_type=media.content_type
+            )
+            response['Content-Range'] = f'bytes */{media.size}'
+            return response
+    start, end = span or (0, media.size - 1)
+    length = end - start + 1 if media.size else 0
+    response = FileResponse(
+        FileRange(open(media.path, 'rb'), start, length),
+        content_type=media.content_type,
+    )
+    response.block_size = BLOCK_SIZE
+    response['Content-Length'] = length
+    if span:
+        response.status_code = 206
+        response['Content-Range'] = f'bytes {start}-{end}/{media.size}'
+    return response
+
+
+def set_validators(response: HttpResponse, media: MediaFile,
+                   public: bool = True) -> None:
+    response['ETag'] = media.etag
+    response['Last-Modified'] = http_date(media.mtime)
+    response['Accept-Ranges'] = 'bytes'
+    if not public:
+        response['Cache-Control'] = 'private, no-cache'
+    elif media.immutable:
+        response['Cache-Control'] = IMMUTABLE
+    else:
+        max_age = getattr(settings, 'MEDIA_MAX_AGE', 60 * 60)
+        response['Cache-Control'] = f'public, max-age={max_age}'
@@ -0,0 +1,100 @@
+import hashlib
+from calendar import timegm
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils.cache import (
+    get_conditional_response, patch_vary_headers, quote_etag
+)
+from django.utils.deprecation import MiddlewareMixin
+from django.utils.http import http_date
+
+
+def anonymous_page(freshness):
+    """Разрешает кешировать страницу целиком для анонимных читателей.
+    freshness(request, *args, **kwargs) возвращает пару
+    (версия, дата последнего изменения) или None, если страницу
+    кешировать нельзя, например объекта нет.
+    """
+    def decorator(view):
+        view.page_freshness = freshness
+        return view
+    return decorator
+
+
+class AnonymousPageCacheMiddleware(MiddlewareMixin):
+    """Кеш готовых страниц для анонимных читателей.
+    ETag и Last-Modified считаются до вызова представления, поэтому
+    на If-None-Match / If-Modified-Since ответ 304 уходит без
+    рендеринга шаблонов. Версия страницы входит и в ETag, и в ключ
+    кеша, так что сброс версии сигналами делает недействительными
+    и сохраненные страницы, и ETag у клиентов.
+    Если бэкенд кеша умеет блокировать пересчет (lock(), см.
+    core.cache_backends.sqlite), после сброса версии страницу
+    собирает один процесс, а остальные ждут ее в кеше.
+    """
+
+    def process_response(self, request, response):
+        key = getattr(request, 'page_cache_key', None)
+        if key is None:
+            return response
+        self.set_validators(request, response)
+        if response.status_code == 200 and not response.cookies:
+            cache.set(
+                key, response,
+                getattr(settings, 'PAGE_CACHE_TIMEOUT', 60 * 60)
+            )
+        elif getattr(request, 'page_cache_locked', False):
+            cache.unlock(key)
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        freshness = getattr(view_func, 'page_freshness', None)
+        if (freshness is None or request.method not in ('GET', 'HEAD')
+                or not self.is_anonymous(request)):
+            return None
+        validators = freshness(request, *view_args, **view_kwargs)
+        if validators is None:
+            return None
+        version, last_modified = validators
+        digest = hashlib.md5(
+            f'{version}:{request.get_full_path()}'.encode()
+        ).hexdigest()
+        request.page_etag = quote_etag(digest)
+        request.page_last_modified = (
+            timegm(last_modified.utctimetuple()) if last_modified else None
+        )
+        not_modified = get_conditional_response(
+            request,
+            etag=request.page_etag,
+            last_modified=request.page_last_modified,
+        )
+        if not_modified is not None:
+            self.set_validators(request, not_modified)
+            return not_modified
+        key = f'page:{request.method}:{digest}'
+        cached = cache.get(key)
+        if cached is None and hasattr(cache, 'lock'):
+            request.page_cache_locked = cache.lock(key)
+            if not request.page_cache_locked:
+                # Страницу уже собирает другой процесс.
+                cached = cache.wait(key)
+        if cached is not None:
+            return cached
+        request.page_cache_key = key
+        return None
+
+    def is_anonymous(self, request):
+        # Читатель с сессией может ждать сообщение из messages,
+        # такую страницу собирать из кеша нельзя.
+        return not (
+            request.user.is_authenticated
+            or settings.SESSION_COOKIE_NAME in request.COOKIES
+            or 'messages' in request.COOKIES
+        )
+
+    def set_validators(self, request, response):
+        patch_vary_headers(response, ('Cookie',))
+        response['ETag'] = request.page_etag
+        if request.page_last_modified is not None:
+            response['Last-Modified'] = http_date(request.page_last_modified)
@@ -0,0 +1,161 @@
+import logging
+import re
+import traceback
+from collections import Counter
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.db import connections
+from django.urls import URLResolver, get_resolver
+from django.utils.deprecation import MiddlewareMixin
+
+logger = logging.getLogger(__name__)
+
+# Списки параметров IN (%s, %s, ...) разной длины дают одну форму запроса.
+IN_LIST = re.compile(r'\((?:%s, )+%s\)')
+# Точки сохранения не считаются: в тестах каждый atomic становится
+# точкой сохранения, а в работе внешний atomic - это BEGIN и COMMIT,
+# которые идут мимо курсора.
+SAVEPOINT = re.compile(r'^(?:RELEASE |ROLLBACK TO )?SAVEPOINT ')
+
+
+class QueryBudgetExceeded(Exception):
+    """Представление сделало больше запросов, чем ему разрешено,
+    или повторило один и тот же запрос в цикле (N+1).
+    """
+
+
+def project_stack() -> list:
+    """Стек вызова без кадров Django и сторонних библиотек."""
+    return [
+        frame for frame in traceback.format_stack()[:-2]
+        if frame.startswith(f'  File "{settings.BASE_DIR}')
+    ]
+
+
+def query_shape(sql: str) -> str:
+    """Форма запроса: SQL без значений параметров."""
+    return IN_LIST.sub('(%s...)', sql)
+
+
+def collect_budgets(resolver=None, namespace=''):
+    """Собирает бюджеты запросов из urls.py всех приложений.
+    Приложение объявляет их словарем query_budgets в своем urls.py:
+    {имя URL: максимальное число запросов}.
+    """
+    resolver = resolver or get_resolver()
+    budgets = {}
+    module_budgets = getattr(resolver.urlconf_module, 'query_budgets', {})
+    for name, budget in module_budgets.items():
+        budgets[namespace + name] = budget
+    for pattern in resolver.url_patterns:
+        if isinstance(pattern, URLResolver):
+            prefix = namespace
+            if pattern.namespace:
+                prefix += pattern.namespace + ':'
+            budgets.update(collect_budgets(pattern, prefix))
+    return budgets
+
+
+class QueryRecorder:
+    """Обертка execute_wrapper, которая считает запросы по формам.
+    Бюджет и формы считаются для каждой базы отдельно: запрос,
+    разосланный по шардам (см. posts.sharding), повторяется
+    на каждом шарде, а не на каждом посте.
+    Стек вызова запоминается только для запроса, на котором форма
+    впервые повторилась порог раз или был превышен бюджет, чтобы
+    не платить за traceback на каждом запросе.
+    """
+
+    def __init__(self, budget=None, repeat_threshold=3):
+        self.budget = budget
+        self.repeat_threshold = repeat_threshold
+        self.totals = Counter()
+        self.shapes = Counter()
+        self.repeated = {}
+        self.over_budget_stacks = {}
+
+    def __call__(self, execute, sql, params, many, context):
+        if SAVEPOINT.match(sql):
+            return execute(sql, params, many, context)
+        alias = context['connection'].alias
+        self.totals[alias] += 1
+        shape = (alias, query_shape(sql))
+        self.shapes[shape] += 1
+        if self.shapes[shape] == self.repeat_threshold:
+            self.repeated[shape] = project_stack()
+        if self.budget is not None and self.totals[alias] == self.budget + 1:
+            self.over_budget_stacks[alias] = project_stack()
+        return execute(sql, params, many, context)
+
+    def problems(self):
+        """Список найденных нарушений: (описание, стек вызова)."""
+        found = []
+        for alias, stack in self.over_budget_stacks.items():
+            found.append((
+                f'{self.totals[alias]} запросов к {alias} '
+                f'при бюджете {self.budget}',
+                stack,
+            ))
+        for (alias, shape), stack in self.repeated.items():
+            found.append((
+                f'N+1: запрос к {alias} повторен '
+                f'{self.shapes[alias, shape]} раз: {shape}',
+                stack,
+            ))
+        return found
+
+
+class QueryBudgetMiddleware(MiddlewareMixin):
+    """Записывает все SQL-запросы каждого запроса к сайту.
+    Повторяющиеся формы запросов и превышение бюджета,
+    объявленного в query_budgets приложения, пишутся в лог
+    со стеком вызова. При QUERY_BUDGET_STRICT вместо этого
+    выбрасывается QueryBudgetExceeded, чтобы падали тесты.
+    Под ASGI process_request, представление и process_response
+    работают с БД в одном потоке запроса (см. yatube/asgi.py),
+    поэтому обертки ставятся на те же соединения.
+    """
+
+    def __init__(self, get_response):
+        super().__init__(get_response)
+        self.budgets = None
+
+    def process_request(self, request):
+        if self.budgets is None:
+            self.budgets = collect_budgets()
+        recorder = QueryRecorder(
+            repeat_threshold=getattr(settings, 'QUERY_REPEAT_THRESHOLD', 3)
+        )
+        request.query_recorder = recorder
+        request.query_wrappers = ExitStack()
+        for connection in connections.all():
+            request.query_wrappers.enter_context(
+                connection.execute_wrapper(recorder)
+            )
+
+    def process_response(self, request, response):
+        wrappers = getattr(request, 'query_wrappers', None)
+        if wrappers is None:
+            return response
+        wrappers.close()
+        self.report(request, request.query_recorder)
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        view_name = request.resolver_match.view_name
+        request.query_recorder.budget = self.budgets.get(view_name)
+
+    def report(self, request, recorder):
+        problems = recorder.problems()
+        if not problems:
+            return
+        if getattr(settings, 'QUERY_BUDGET_STRICT', False):
+            raise QueryBudgetExceeded(
+                f'{request.path}: '
+                + '; '.join(message for message, _ in problems)
+            )
+        for message, stack in problems:
+            logger.warning(
+                '%s: %s\n%s', request.path, message, ''.join(stack)
+            )
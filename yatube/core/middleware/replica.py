@@ -0,0 +1,64 @@
+import time
+
+from django.conf import settings
+from django.utils.deprecation import MiddlewareMixin
+
+from core.db_routers import RoutingState, fresh_replica, routing
+
+STICKY_COOKIE = 'primary_until'
+
+
+def replica_reads(view):
+    """Разрешает представлению читать с реплики, см. core.db_routers."""
+    view.replica_reads = True
+    return view
+
+
+class ReplicaMiddleware(MiddlewareMixin):
+    """Выбирает для запроса реплику и прилипание к default.
+    После записи пользователь получает cookie со временем, до которого
+    его чтения идут в default: так он сразу видит свои изменения,
+    даже если реплика еще не обновилась. Cookie не привязана к сессии
+    и не требует запросов к БД.
+    Должен стоять до AnonymousPageCacheMiddleware: проверка свежести
+    страниц тоже читает с реплики.
+    """
+
+    def process_request(self, request):
+        request.db_routing = RoutingState()
+        request.db_routing_token = routing.set(request.db_routing)
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        state = request.db_routing
+        if not getattr(view_func, 'replica_reads', False):
+            return None
+        if request.method not in ('GET', 'HEAD') or self.is_sticky(request):
+            return None
+        state.replica = fresh_replica()
+        return None
+
+    def process_response(self, request, response):
+        state = getattr(request, 'db_routing', None)
+        if state is None:
+            return response
+        try:
+            routing.reset(request.db_routing_token)
+        except ValueError:
+            # Под ASGI process_request и process_response работают
+            # в разных копиях контекста.
+            routing.set(None)
+        if state.wrote:
+            sticky = getattr(settings, 'REPLICA_STICKY_SECONDS', 10)
+            response.set_cookie(
+                STICKY_COOKIE, str(int(time.time() + sticky)),
+                max_age=sticky, httponly=True,
+                samesite=settings.SESSION_COOKIE_SAMESITE,
+            )
+        return response
+
+    def is_sticky(self, request):
+        try:
+            until = int(request.COOKIES.get(STICKY_COOKIE, 0))
+        except ValueError:
+            return False
+        return until > time.time()
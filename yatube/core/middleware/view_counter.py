@@ -0,0 +1,32 @@
+from django.utils.deprecation import MiddlewareMixin
+
+
+def counts_views(counter):
+    """Считает просмотры страницы, в том числе отданной из кеша
+    анонимных страниц или ответом 304.
+    counter(request, *args, **kwargs) вызывается после ответа 200 или 304.
+    """
+    def decorator(view):
+        view.view_counter = counter
+        return view
+    return decorator
+
+
+class ViewCounterMiddleware(MiddlewareMixin):
+    """Вызывает счетчик просмотров представления, см. counts_views.
+    Должен стоять до AnonymousPageCacheMiddleware: тот отдает
+    страницу из кеша, не вызывая представление.
+    """
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        counter = getattr(view_func, 'view_counter', None)
+        if counter is not None and request.method in ('GET', 'HEAD'):
+            request.view_counter = (counter, view_args, view_kwargs)
+        return None
+
+    def process_response(self, request, response):
+        counted = getattr(request, 'view_counter', None)
+        if counted is not None and response.status_code in (200, 304):
+            counter, args, kwargs = counted
+            counter(request, *args, **kwargs)
+        return response
@@ -0,0 +1,77 @@
+"""Файловое хранилище с адресацией по содержимому.
+
+Файл сохраняется под SHA-256 своего содержимого:
+posts/meme.jpg превращается в posts/3f/a2/3fa2…c9.jpg. Одинаковые
+загрузки занимают на диске одно место, а имя файла никогда
+не меняет содержимое, поэтому его можно кешировать навсегда.
+
+Хеш считается по мере чтения загрузки: файл пишется во временный
+файл рядом с целевым каталогом и затем атомарно переименовывается.
+Если такой блоб уже есть, временный файл удаляется.
+
+Хранилище не удаляет блобы само: на один блоб могут ссылаться
+несколько объектов. Учет ссылок и сборка мусора в posts.blobs.
+"""
+import hashlib
+import os
+import re
+import tempfile
+from typing import Optional
+
+from django.core.files.storage import FileSystemStorage
+from django.utils.deconstruct import deconstructible
+
+BLOB_NAME = re.compile(r'(?:^|/)(?P<digest>[0-9a-f]{64})(?:\.\w+)?$')
+
+
+@deconstructible
+class ContentAddressedStorage(FileSystemStorage):
+    incoming = '.incoming'
+
+    @staticmethod
+    def digest_of(name: str) -> Optional[str]:
+        """SHA-256 из имени блоба или None для прочих файлов."""
+        match = BLOB_NAME.search(name or '')
+        return match.group('digest') if match else None
+
+    def blob_name(self, name: str, digest: str) -> str:
+        directory = os.path.dirname(name)
+        extension = os.path.splitext(name)[1].lower()
+        return os.path.join(
+            directory, digest[:2], digest[2:4], digest + extension
+        ).replace('\\', '/')
+
+    def get_available_name(self, name, max_length=None):
+        # Имя определяется содержимым, суффиксы не нужны.
+        return name
+
+    def _save(self, name, content):
+        incoming = self.path(self.incoming)
+        os.makedirs(incoming, exist_ok=True)
+        digest = hashlib.sha256()
+        handle, temp_path = tempfile.mkstemp(dir=incoming)
+        try:
+            with os.fdopen(handle, 'wb') as temp:
+                if hasattr(content, 'seek'):
+                    content.seek(0)
+                for chunk in content.chunks():
+                    digest.update(chunk)
+                    temp.write(chunk)
+            name = self.blob_name(name, digest.hexdigest())
+            full_path = self.path(name)
+            if os.path.exists(full_path):
+                # Свежее время изменения защищает блоб от сборщика
+                # мусора, пока на него не появилась ссылка.
+                os.utime(full_path)
+                return name
+            os.makedirs(os.path.dirname(full_path), exist_ok=True)
+            if self.file_permissions_mode is not None:
+                os.chmod(temp_path, self.file_permissions_mode)
+            os.replace(temp_path, full_path)
+            return name
+        finally:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+
+
+media_storage = ContentAddressedStorage()
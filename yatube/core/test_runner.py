@@ -0,0 +1,40 @@
+from django.core.cache import caches
+from django.test import TransactionTestCase
+from django.test.runner import DiscoverRunner
+
+from posts import follow_graph, trending
+
+
+class ProcessStateMixin:
+    """Перед каждым тестом заново строит граф подписок процесса:
+    транзакцию теста откатывают, а граф в памяти об этом не знает.
+    Граф строится до теста, чтобы его сборка не попадала в бюджет
+    запросов первого обращения к сайту.
+    После теста забываются накопленные просмотры популярного: иначе
+    таймер записал бы их в базу посреди другого теста.
+    """
+
+    def startTest(self, test):
+        super().startTest(test)
+        follow_graph.reset()
+        if isinstance(test, TransactionTestCase) and follow_graph.enabled():
+            follow_graph.graph()
+
+    def stopTest(self, test):
+        trending.discard_views()
+        super().stopTest(test)
+
+
+class TestRunner(DiscoverRunner):
+    """Очищает кеши перед запуском: тесты не должны видеть
+    содержимое кеша с прошлых запусков.
+    """
+
+    def setup_test_environment(self, **kwargs):
+        super().setup_test_environment(**kwargs)
+        for cache in caches.all():
+            cache.clear()
+
+    def get_resultclass(self):
+        base = super().get_resultclass() or self.test_runner.resultclass
+        return type(base.__name__, (ProcessStateMixin, base), {})
@@ -0,0 +1,114 @@
+import os
+import shutil
+import tempfile
+import threading
+import time
+from unittest import mock
+
+from django.test import SimpleTestCase
+
+from core.cache_backends.sqlite import SQLiteCache
+
+
+class SQLiteCacheTests(SimpleTestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.dir, 'cache.sqlite3')
+        self.cache = self.make_cache()
+
+    def tearDown(self):
+        shutil.rmtree(self.dir, ignore_errors=True)
+
+    def make_cache(self, **options):
+        """Отдельный экземпляр бэкенда, как в другом воркере."""
+        return SQLiteCache(self.path, {'OPTIONS': options})
+
+    def test_basic_operations(self):
+        """Бэкенд реализует интерфейс кеша Django."""
+        cache = self.cache
+        cache.set('key', {'a': 1})
+        self.assertEqual(cache.get('key'), {'a': 1})
+        self.assertFalse(cache.add('key', 'other'))
+        self.assertTrue(cache.add('new', 'value'))
+        cache.set('counter', 1, None)
+        self.assertEqual(cache.incr('counter'), 2)
+        with self.assertRaises(ValueError):
+            cache.incr('missing')
+        cache.set_many({'x': 1, 'y': 2})
+        self.assertEqual(cache.get_many(['x', 'y', 'z']), {'x': 1, 'y': 2})
+        self.assertTrue(cache.delete('x'))
+        self.assertFalse(cache.has_key('x'))
+        cache.clear()
+        self.assertEqual(cache.get_many(['y', 'key']), {})
+
+    def test_shared_between_instances(self):
+        """Запись одного воркера сразу видна другому."""
+        self.cache.set('version', 1, None)
+        other = self.make_cache()
+        other.incr('version')
+        self.assertEqual(self.cache.get('version'), 2)
+
+    def test_get_does_not_lock(self):
+        """Чтение без записи не заставляет другие воркеры ждать."""
+        other = self.make_cache()
+        self.cache.set('expired', 'old', 1)
+        with mock.patch('time.time', return_value=time.time() + 2):
+            for key in ('missing', 'expired'):
+                with self.subTest(key=key):
+                    self.assertIsNone(self.cache.get(key))
+                    started = time.monotonic()
+                    self.assertIsNone(other.get(key))
+                    self.assertLess(time.monotonic() - started, 0.05)
+                    self.assertTrue(other.lock(key))
+                    other.unlock(key)
+
+    def test_stale_value_served_while_recomputing(self):
+        """После истечения срока пересчитывает только один читатель."""
+        self.cache.set('page', 'old', 1)
+        other = self.make_cache()
+        with mock.patch('time.time', return_value=time.time() + 2):
+            self.assertTrue(self.cache.lock('page'))
+            self.assertEqual(other.get_or_set('page', 'unused'), 'old')
+            self.cache.set('page', 'new', 60)
+            self.assertEqual(other.get_or_set('page', 'unused'), 'new')
+
+    def test_single_flight_on_cold_key(self):
+        """На холодный ключ в базу идет один поток, остальные ждут."""
+        misses = []
+        results = []
+
+        def render():
+            misses.append(1)
+            time.sleep(0.2)
+            return 'rendered'
+
+        def worker():
+            results.append(self.make_cache().get_or_set('index', render))
+
+        threads = [threading.Thread(target=worker) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(len(misses), 1)
+        self.assertEqual(results, ['rendered'] * 8)
+
+    def test_lock_released_on_error(self):
+        """Ошибка пересчета снимает блокировку ключа."""
+        def fail():
+            raise RuntimeError
+
+        with self.assertRaises(RuntimeError):
+            self.cache.get_or_set('broken', fail)
+        self.assertTrue(self.make_cache().lock('broken'))
+
+    def test_probabilistic_early_recompute(self):
+        """Незадолго до истечения срока читатель пересчитывает заранее."""
+        self.cache.lock('slow')
+        with mock.patch('time.time', return_value=time.time() + 5):
+            self.cache.set('slow', 'value', 6)
+        with mock.patch('random.random', return_value=0.0):
+            self.assertEqual(self.cache.get_or_set('slow', 'new'), 'value')
+        with mock.patch('random.random', return_value=0.99):
+            self.assertEqual(self.cache.get_or_set('slow', 'new'), 'new')
+        self.assertEqual(self.cache.get('slow'), 'new')
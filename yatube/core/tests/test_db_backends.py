@@ -0,0 +1,75 @@
+import os
+import shutil
+import sqlite3
+import tempfile
+from io import StringIO
+
+from django.core.management import call_command
+from django.db import connection
+from django.test import SimpleTestCase, TransactionTestCase
+
+from core.db_backends.sqlite3.base import DatabaseWrapper
+
+
+class SQLiteTuningTests(SimpleTestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.dir, 'db.sqlite3')
+        self.db = DatabaseWrapper(
+            {**connection.settings_dict, 'NAME': self.path,
+             'OPTIONS': {'BUSY_TIMEOUT': 1234, 'timeout': 1}},
+            alias='tuning',
+        )
+
+    def tearDown(self):
+        self.db.close()
+        shutil.rmtree(self.dir, ignore_errors=True)
+
+    def pragma(self, name):
+        with self.db.cursor() as cursor:
+            cursor.execute(f'PRAGMA {name}')
+            return cursor.fetchone()[0]
+
+    def test_pragmas(self):
+        """Новое соединение получает WAL и остальные настройки."""
+        pragmas = {
+            'journal_mode': 'wal',
+            'synchronous': 1,
+            'busy_timeout': 1234,
+            'cache_size': -64 * 1024,
+            'temp_store': 2,
+            'auto_vacuum': 2,
+        }
+        for name, value in pragmas.items():
+            with self.subTest(pragma=name):
+                self.assertEqual(self.pragma(name), value)
+
+    def test_transactions_take_write_lock(self):
+        """atomic() сразу берет блокировку записи (BEGIN IMMEDIATE)."""
+        with self.db.cursor() as cursor:
+            cursor.execute('CREATE TABLE t (x)')
+        other = sqlite3.connect(self.path, timeout=0)
+        # Так atomic() начинает транзакцию в SQLite.
+        self.db._start_transaction_under_autocommit()
+        try:
+            with self.assertRaisesMessage(
+                sqlite3.OperationalError, 'database is locked'
+            ):
+                other.execute('BEGIN IMMEDIATE')
+            # Читатели в режиме WAL не ждут писателя.
+            self.assertEqual(
+                other.execute('SELECT count(*) FROM t').fetchone(), (0,)
+            )
+        finally:
+            self.db.cursor().execute('ROLLBACK')
+            other.close()
+
+
+class SQLiteMaintenanceTests(TransactionTestCase):
+    def test_command(self):
+        """sqlite_maintenance выполняет все шаги обслуживания."""
+        out = StringIO()
+        call_command('sqlite_maintenance', stdout=out)
+        for step in ('ANALYZE', 'incremental_vacuum', 'wal_checkpoint'):
+            with self.subTest(step=step):
+                self.assertIn(step, out.getvalue())
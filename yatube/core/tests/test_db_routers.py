@@ -0,0 +1,103 @@
+import time
+from unittest import mock
+
+from django.core.cache import cache
+from django.db import connections
+from django.test import Client, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from core.db_routers import LAST_WRITE_KEY, mark_synced
+from core.middleware.replica import STICKY_COOKIE
+from posts.models import Post, User
+
+
+@override_settings(DATABASE_REPLICAS=['replica'], REPLICA_MAX_LAG=0)
+class ReplicaRouterTests(TransactionTestCase):
+    # В тестах реплика - зеркало тестовой базы default. Данные
+    # коммитятся, иначе второе соединение их не увидит.
+    databases = {'default', 'replica'}
+
+    def setUp(self):
+        self.author = User.objects.create_user(username='author')
+        self.post = Post.objects.create(author=self.author, text='Пост')
+        cache.clear()
+        self.client = Client()
+        self.author_client = Client()
+        self.author_client.force_login(self.author)
+
+    def sync(self):
+        """Реплика получила снимок после всех записей."""
+        mark_synced('replica', time.time() + 1)
+
+    def queries(self, url, client=None):
+        """Число запросов к default и к реплике при открытии url."""
+        with CaptureQueriesContext(connections['default']) as primary, \
+                CaptureQueriesContext(connections['replica']) as replica:
+            response = (client or self.client).get(url)
+        self.assertEqual(response.status_code, 200)
+        return len(primary), len(replica)
+
+    def test_reads_go_to_fresh_replica(self):
+        """Ленты читают с реплики, если ее снимок свежий."""
+        self.sync()
+        urls = [
+            reverse('posts:index'),
+            reverse('posts:profile', args=(self.author.username,)),
+            reverse('posts:post_detail', args=(self.post.pk,)),
+        ]
+        for url in urls:
+            with self.subTest(url=url):
+                primary, replica = self.queries(url)
+                self.assertEqual(primary, 0)
+                self.assertGreater(replica, 0)
+
+    def test_stale_replica_is_skipped(self):
+        """Снимок старше последней записи не используется."""
+        mark_synced('replica', time.time() - 60)
+        cache.set(LAST_WRITE_KEY, time.time(), None)
+        primary, replica = self.queries(reverse('posts:index'))
+        self.assertEqual(replica, 0)
+        self.assertGreater(primary, 0)
+
+    def test_writer_reads_own_writes(self):
+        """После записи пользователь читает из default."""
+        response = self.author_client.post(
+            reverse('posts:add_comment', args=(self.post.pk,)),
+            data={'text': 'Комментарий'},
+        )
+        self.assertIn(STICKY_COOKIE, response.cookies)
+        self.sync()
+        url = reverse('posts:post_detail', args=(self.post.pk,))
+        primary, replica = self.queries(url, self.author_client)
+        self.assertEqual(replica, 0)
+        self.client.cookies[STICKY_COOKIE] = str(int(time.time()) - 1)
+        primary, replica = self.queries(url)
+        self.assertGreater(replica, 0)
+
+    def test_write_marked_after_it_runs(self):
+        """Время записи ставится, когда строка уже есть в default:
+        снимок, сделанный до этого, не сойдет за свежий.
+        """
+        seen = []
+
+        def mark():
+            seen.append(Post.objects.filter(text='Отмеченный').exists())
+
+        with mock.patch('core.db_routers.mark_written', side_effect=mark):
+            # Вне транзакции: UPDATE коммитится сразу.
+            Post.objects.filter(pk=self.post.pk).update(text='Отмеченный')
+            Post.objects.create(author=self.author, text='Отмеченный')
+        self.assertEqual(seen, [True, True])
+
+    def test_writes_go_to_primary(self):
+        """Запись всегда идет в default и сдвигает время записи."""
+        self.sync()
+        before = time.time()
+        with CaptureQueriesContext(connections['replica']) as replica:
+            self.author_client.post(
+                reverse('posts:post_create'), data={'text': 'Новый пост'}
+            )
+        self.assertEqual(len(replica), 0)
+        self.assertTrue(Post.objects.filter(text='Новый пост').exists())
+        self.assertGreaterEqual(cache.get(LAST_WRITE_KEY), before)
@@ -0,0 +1,116 @@
+import hashlib
+import os
+import shutil
+import tempfile
+
+from django.contrib.auth import get_user_model
+from django.test import Client, TestCase, override_settings
+
+User = get_user_model()
+
+CONTENT = b'0123456789'
+DIGEST = hashlib.sha256(CONTENT).hexdigest()
+BLOB = f'posts/{DIGEST[:2]}/{DIGEST[2:4]}/{DIGEST}.jpg'
+TEMP_MEDIA_ROOT = tempfile.mkdtemp()
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT, MEDIA_SENDFILE=None)
+class MediaViewTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        for name in (BLOB, 'posts/legacy.jpg', 'private/report.txt',
+                     'posts/.incoming/tmp123'):
+            path = os.path.join(TEMP_MEDIA_ROOT, name)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path, 'wb') as file:
+                file.write(CONTENT)
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def get(self, name, client=None, **headers):
+        return (client or self.client).get(f'/media/{name}', **headers)
+
+    def body(self, response):
+        return b''.join(response.streaming_content)
+
+    def test_blob_is_immutable(self):
+        """Блоб отдается с хешем в ETag и кешируется навсегда."""
+        response = self.get(BLOB)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.body(response), CONTENT)
+        self.assertEqual(response['ETag'], f'"{DIGEST}"')
+        self.assertIn('immutable', response['Cache-Control'])
+        self.assertEqual(response['Content-Type'], 'image/jpeg')
+        self.assertEqual(response['Content-Length'], str(len(CONTENT)))
+        legacy = self.get('posts/legacy.jpg')
+        self.assertNotIn('immutable', legacy['Cache-Control'])
+        self.assertEqual(self.get(BLOB, HTTP_IF_NONE_MATCH=f'"{DIGEST}"')
+                         .status_code, 304)
+
+    def test_ranges(self):
+        """Диапазоны Range отдаются с кодом 206 или 416."""
+        ranges = {
+            'bytes=2-5': (206, b'2345', 'bytes 2-5/10'),
+            'bytes=7-': (206, b'789', 'bytes 7-9/10'),
+            'bytes=-3': (206, b'789', 'bytes 7-9/10'),
+            'bytes=8-100': (206, b'89', 'bytes 8-9/10'),
+            'bytes=0-1,4-5': (200, CONTENT, None),
+            'items=0-1': (200, CONTENT, None),
+        }
+        for header, (status, body, content_range) in ranges.items():
+            with self.subTest(header=header):
+                response = self.get(BLOB, HTTP_RANGE=header)
+                self.assertEqual(response.status_code, status)
+                self.assertEqual(self.body(response), body)
+                self.assertEqual(response['Content-Length'], str(len(body)))
+                self.assertEqual(
+                    response.get('Content-Range'), content_range
+                )
+        response = self.get(BLOB, HTTP_RANGE='bytes=10-')
+        self.assertEqual(response.status_code, 416)
+        self.assertEqual(response['Content-Range'], 'bytes */10')
+        response = self.get(
+            BLOB, HTTP_RANGE='bytes=2-5', HTTP_IF_RANGE='"stale"'
+        )
+        self.assertEqual(response.status_code, 200)
+
+    def test_sendfile_backends(self):
+        """С фронтовым сервером Django отдает только заголовок."""
+        backends = {
+            'x-accel-redirect': (
+                'X-Accel-Redirect', f'/internal-media/{BLOB}'
+            ),
+            'x-sendfile': (
+                'X-Sendfile', os.path.join(TEMP_MEDIA_ROOT, BLOB)
+            ),
+        }
+        for backend, (header, value) in backends.items():
+            with self.subTest(backend=backend), override_settings(
+                MEDIA_SENDFILE=backend
+            ):
+                response = self.get(BLOB)
+                self.assertEqual(response.status_code, 200)
+                self.assertEqual(response[header], value)
+                self.assertEqual(response.content, b'')
+                self.assertEqual(response['ETag'], f'"{DIGEST}"')
+
+    def test_access(self):
+        """Скрытые файлы и выход за MEDIA_ROOT недоступны,
+        закрытые каталоги видит только персонал.
+        """
+        for name in ('posts/.incoming/tmp123', 'posts/../../settings.py',
+                     'posts/missing.jpg', 'posts'):
+            with self.subTest(name=name):
+                self.assertEqual(self.get(name).status_code, 404)
+        self.assertEqual(self.get('private/report.txt').status_code, 403)
+        staff = Client()
+        staff.force_login(
+            User.objects.create_user(username='staff', is_staff=True)
+        )
+        response = self.get('private/report.txt', staff)
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('private', response['Cache-Control'])
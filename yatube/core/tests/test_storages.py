@@ -0,0 +1,45 @@
+import hashlib
+import os
+import shutil
+import tempfile
+
+from django.core.files.base import ContentFile
+from django.test import SimpleTestCase
+
+from core.storages.content_addressed import ContentAddressedStorage
+
+
+class ContentAddressedStorageTests(SimpleTestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.storage = ContentAddressedStorage(location=self.dir)
+
+    def tearDown(self):
+        shutil.rmtree(self.dir, ignore_errors=True)
+
+    def files(self):
+        return [
+            os.path.relpath(os.path.join(directory, name), self.dir)
+            for directory, _, names in os.walk(self.dir) for name in names
+        ]
+
+    def test_name_is_digest(self):
+        """Файл сохраняется под SHA-256 содержимого."""
+        digest = hashlib.sha256(b'meme').hexdigest()
+        name = self.storage.save('posts/Meme.JPG', ContentFile(b'meme'))
+        self.assertEqual(
+            name, f'posts/{digest[:2]}/{digest[2:4]}/{digest}.jpg'
+        )
+        self.assertEqual(self.storage.digest_of(name), digest)
+        self.assertIsNone(self.storage.digest_of('posts/meme.jpg'))
+        with self.storage.open(name) as content:
+            self.assertEqual(content.read(), b'meme')
+
+    def test_duplicates_stored_once(self):
+        """Одинаковые загрузки занимают один файл."""
+        first = self.storage.save('posts/a.jpg', ContentFile(b'meme'))
+        second = self.storage.save('posts/b.jpg', ContentFile(b'meme'))
+        other = self.storage.save('posts/c.jpg', ContentFile(b'other'))
+        self.assertEqual(first, second)
+        self.assertNotEqual(first, other)
+        self.assertEqual(len(self.files()), 2)
@@ -1,4 +1,9 @@
+from django.core.exceptions import PermissionDenied
 from django.shortcuts import render
+from django.utils.cache import get_conditional_response
+from django.views.decorators.http import require_safe
+
+from core import media as media_files
 
 
 def page_not_found(request, exception):
@@ -11,3 +16,27 @@ def csrf_failure(request, reason=''):
 
 def permission_denied(request, exception):
     return render(request, 'core/403.html', status=403)
+
+
+@require_safe
+def media(request, path):
+    """Файлы из MEDIA_ROOT.
+    Каталоги из MEDIA_PUBLIC_DIRS открыты всем, остальное только
+    персоналу. Байты отдает фронтовой сервер или core.media.
+    """
+    media_file = media_files.resolve(path)
+    public = media_files.is_public(media_file)
+    if not public and not request.user.is_staff:
+        raise PermissionDenied
+    response = get_conditional_response(
+        request,
+        etag=media_file.etag,
+        last_modified=int(media_file.mtime),
+    )
+    if response is None:
+        response = (
+            media_files.sendfile_response(media_file)
+            or media_files.file_response(request, media_file)
+        )
+    media_files.set_validators(response, media_file, public)
+    return response
@@ -0,0 +1,361 @@
+"""JSON API только для чтения: ленты, группы, профили, посты.
+
+Ответы собираются из .values(): без экземпляров моделей и шаблонов.
+?fields=id,text выбирает поля (неизвестное поле - 400), списки
+листаются курсором ?cursor= по (pub_date, id), как ленты HTML.
+Автор и группа постов - id в проекции и одна выборка имен на
+страницу: так проекция не соединяет таблицы и работает на шардах.
+ETag и кеш ответов для анонимов - те же, что у HTML-страниц
+(AnonymousPageCacheMiddleware и функции posts.freshness), остальным
+ETag считается по телу ответа.
+
+batch отдает пачку постов, профилей и групп за один запрос:
+сначала из кеша объектов, остальное - одним запросом на тип.
+"""
+import hashlib
+import json
+from typing import Iterable, List, Optional
+
+from django.conf import settings
+from django.core.cache import cache
+from django.http import Http404, HttpResponse, JsonResponse
+from django.utils.cache import get_conditional_response, quote_etag
+from django.views.decorators.http import require_safe
+
+from core.middleware.page_cache import anonymous_page
+from core.middleware.replica import replica_reads
+
+from . import feed_cache, freshness
+from .models import Comment, Group, Post, User
+from .utils import CursorPaginator
+from yatube.settings import num_posts
+
+image_storage = Post._meta.get_field('image').storage
+
+
+def _date(value):
+    return value.isoformat() if value is not None else None
+
+
+def _image(name):
+    return image_storage.url(name) if name else None
+
+
+class Resource:
+    """Поля ресурса: имя в ответе -> колонка .values().
+    related - поля с id объекта, которые заменяются одним запросом
+    на всю страницу: имя -> (модель, поле для ответа).
+    """
+
+    def __init__(self, fields: dict, related: dict = None,
+                 converters: dict = None):
+        self.fields = fields
+        self.related = related or {}
+        self.converters = converters or {}
+
+    def names(self, request) -> List[str]:
+        raw = request.GET.get('fields')
+        if not raw:
+            return list(self.fields)
+        names = [name for name in dict.fromkeys(raw.split(',')) if name]
+        unknown = [name for name in names if name not in self.fields]
+        if unknown or not names:
+            raise ValueError(', '.join(unknown))
+        return names
+
+    def columns(self, names: Iterable[str], keys: tuple = ()) -> list:
+        return list(dict.fromkeys(
+            [self.fields[name] for name in names] + list(keys)
+        ))
+
+    def serialize(self, rows: list, names: List[str]) -> List[dict]:
+        lookups = {}
+        for name in names:
+            if name in self.related:
+                model, field = self.related[name]
+                column = self.fields[name]
+                ids = {row[column] for row in rows} - {None}
+                lookups[name] = dict(
+                    model.objects.filter(pk__in=ids).values_list('pk', field)
+                ) if ids else {}
+        plan = [
+            (name, self.fields[name], lookups.get(name),
+             self.converters.get(name))
+            for name in names
+        ]
+        result = []
+        for row in rows:
+            item = {}
+            for name, column, lookup, convert in plan:
+                value = row[column]
+                if lookup is not None:
+                    value = lookup.get(value)
+                elif convert is not None:
+                    value = convert(value)
+                item[name] = value
+            result.append(item)
+        return result
+
+
+POST = Resource(
+    {
+        'id': 'pk',
+        'text': 'text',
+        'pub_date': 'pub_date',
+        'author': 'author_id',
+        'group': 'group_id',
+        'image': 'image',
+        'comments_count': 'comments_count',
+    },
+    related={'author': (User, 'username'), 'group': (Group, 'slug')},
+    converters={'pub_date': _date, 'image': _image},
+)
+COMMENT = Resource(
+    {
+        'id': 'pk',
+        'post': 'post_id',
+        'author': 'author_id',
+        'text': 'text',
+        'created': 'created',
+    },
+    related={'author': (User, 'username')},
+    converters={'created': _date},
+)
+GROUP = Resource(
+    {
+        'id': 'pk',
+        'title': 'title',
+        'slug': 'slug',
+        'description': 'description',
+        'posts_count': 'posts_count',
+    },
+)
+PROFILE = Resource(
+    {
+        'id': 'pk',
+        'username': 'username',
+        'first_name': 'first_name',
+        'last_name': 'last_name',
+        'posts_count': 'stats__posts_count',
+    },
+)
+
+
+def respond(request, data) -> HttpResponse:
+    """JSON-ответ с ETag по телу и 304 на совпавший If-None-Match."""
+    body = json.dumps(data, ensure_ascii=False, separators=(',', ':'))
+    etag = quote_etag(hashlib.md5(body.encode()).hexdigest())
+    not_modified = get_conditional_response(request, etag=etag)
+    if not_modified is not None:
+        return not_modified
+    response = HttpResponse(body, content_type='application/json')
+    # Анонимам AnonymousPageCacheMiddleware заменит его ETag версии.
+    response['ETag'] = etag
+    return response
+
+
+def bad_fields(error: ValueError) -> JsonResponse:
+    return JsonResponse(
+        {'error': f'Неизвестные поля: {error}'}, status=400,
+        json_dumps_params={'ensure_ascii': False},
+    )
+
+
+def detail(request, resource: Resource, queryset) -> HttpResponse:
+    try:
+        names = resource.names(request)
+    except ValueError as error:
+        return bad_fields(error)
+    rows = list(queryset.values(*resource.columns(names))[:1])
+    if not rows:
+        raise Http404
+    return respond(request, resource.serialize(rows, names)[0])
+
+
+def listing(request, resource: Resource, queryset,
+            keys: tuple = ('pub_date', 'pk')) -> HttpResponse:
+    try:
+        names = resource.names(request)
+    except ValueError as error:
+        return bad_fields(error)
+    # Ключи курсора выбираются всегда, даже если их нет в ?fields=.
+    page = CursorPaginator(
+        queryset.values(*resource.columns(names, keys)), num_posts, keys
+    ).get_page(request.GET.get('cursor'))
+    return respond(request, {
+        'results': resource.serialize(list(page), names),
+        'next': page.next_cursor,
+        'previous': page.previous_cursor,
+    })
+
+
+def _pk(queryset) -> Optional[int]:
+    pk = next(iter(queryset.values_list('pk', flat=True)[:1]), None)
+    if pk is None:
+        raise Http404
+    return pk
+
+
+@require_safe
+@replica_reads
+@anonymous_page(freshness.index)
+def posts(request):
+    return listing(request, POST, Post.objects.all())
+
+
+@require_safe
+@replica_reads
+@anonymous_page(freshness.post_detail)
+def post(request, post_id):
+    return detail(request, POST, Post.objects.filter(pk=post_id))
+
+
+@require_safe
+@replica_reads
+@anonymous_page(freshness.post_detail)
+def post_comments(request, post_id):
+    _pk(Post.objects.filter(pk=post_id))
+    return listing(
+        request, COMMENT, Comment.objects.filter(post_id=post_id),
+        ('created', 'pk'),
+    )
+
+
+@require_safe
+@replica_reads
+@anonymous_page(freshness.group_posts)
+def group(request, slug):
+    return detail(request, GROUP, Group.objects.filter(slug=slug))
+
+
+@require_safe
+@replica_reads
+@anonymous_page(freshness.group_posts)
+def group_posts(request, slug):
+    group_id = _pk(Group.objects.filter(slug=slug))
+    return listing(request, POST, Post.objects.filter(group_id=group_id))
+
+
+@require_safe
+@replica_reads
+@anonymous_page(freshness.profile)
+def profile(request, username):
+    return detail(request, PROFILE, User.objects.filter(username=username))
+
+
+@require_safe
+@replica_reads
+@anonymous_page(freshness.profile)
+def profile_posts(request, username):
+    author_id = _pk(User.objects.filter(username=username))
+    return listing(request, POST, Post.objects.filter(author_id=author_id))
+
+
+# Тип пачки: ресурс, модель, поле поиска, имя этого поля в ответе
+# и пространство имен кеша лент, версия которого сбрасывает объект.
+BATCH = {
+    'posts': (POST, Post, 'pk', 'id', 'post'),
+    'users': (PROFILE, User, 'username', 'username', 'profile'),
+    'groups': (GROUP, Group, 'slug', 'slug', 'group'),
+}
+
+
+# id постов передаются в SQLite, где целые числа 64-битные.
+POST_ID_RANGE = range(-2 ** 63, 2 ** 63)
+
+
+def _post_id(key: str) -> int:
+    post_id = int(key)
+    if post_id not in POST_ID_RANGE:
+        raise ValueError(key)
+    return post_id
+
+
+def _batch_keys(request) -> dict:
+    """Запрошенные ключи по типам: ?posts=1,2&users=a&groups=b.
+    ValueError, если id поста не 64-битное целое.
+    """
+    wanted = {}
+    for kind in BATCH:
+        raw = ','.join(request.GET.getlist(kind))
+        keys = [key for key in dict.fromkeys(raw.split(',')) if key]
+        wanted[kind] = (
+            [_post_id(key) for key in keys] if kind == 'posts' else keys
+        )
+    return wanted
+
+
+def _cached(wanted: dict) -> dict:
+    """Объекты из кеша, версия которых не сброшена сигналами."""
+    found = {kind: {} for kind in wanted}
+    keys = {
+        f'api:{kind}:{key}': (kind, key)
+        for kind, kind_keys in wanted.items() for key in kind_keys
+    }
+    entries = cache.get_many(list(keys))
+    if not entries:
+        return found
+    current = feed_cache.versions(
+        *{namespace for namespace, _, _ in entries.values()}
+    )
+    for cache_key, (namespace, version, item) in entries.items():
+        if current[namespace] == version:
+            kind, key = keys[cache_key]
+            found[kind][key] = item
+    return found
+
+
+def _load(kind: str, keys: list) -> dict:
+    """Недостающие объекты одним запросом, с записью в кеш.
+    Версия читается после выборки: объект, измененный между ними,
+    устареет не дольше API_BATCH_CACHE_TIMEOUT.
+    """
+    resource, model, field, name, prefix = BATCH[kind]
+    names = list(resource.fields)
+    rows = list(
+        model.objects.filter(**{f'{field}__in': keys})
+        .values(*resource.columns(names))
+    )
+    items = resource.serialize(rows, names)
+    current = feed_cache.versions(
+        *(f'{prefix}:{item["id"]}' for item in items)
+    )
+    cache.set_many(
+        {
+            f'api:{kind}:{item[name]}': (
+                f'{prefix}:{item["id"]}', current[f'{prefix}:{item["id"]}'],
+                item,
+            )
+            for item in items
+        },
+        getattr(settings, 'API_BATCH_CACHE_TIMEOUT', 300),
+    )
+    return {item[name]: item for item in items}
+
+
+@require_safe
+@replica_reads
+def batch(request):
+    """Посты, профили и группы в порядке запроса, null - не найден."""
+    try:
+        wanted = _batch_keys(request)
+    except ValueError:
+        return JsonResponse(
+            {'error': 'id постов - 64-битные целые числа'}, status=400,
+            json_dumps_params={'ensure_ascii': False},
+        )
+    limit = getattr(settings, 'API_BATCH_LIMIT', 300)
+    if sum(len(keys) for keys in wanted.values()) > limit:
+        return JsonResponse(
+            {'error': f'Не больше {limit} объектов за запрос'}, status=400,
+            json_dumps_params={'ensure_ascii': False},
+        )
+    found = _cached(wanted)
+    for kind, keys in wanted.items():
+        missing = [key for key in keys if key not in found[kind]]
+        if missing:
+            found[kind].update(_load(kind, missing))
+    return respond(request, {
+        kind: [found[kind].get(key) for key in keys]
+        for kind, keys in wanted.items()
+    })
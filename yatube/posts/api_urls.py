@@ -0,0 +1,39 @@
+from django.urls import path
+
+from . import api
+
+app_name = 'api'
+
+# Бюджеты запросов, см. posts/urls.py. Списки постов - выборка
+# страницы, имена авторов и slug групп, плюс сессия и пользователь
+# у клиентов с cookie или проверка свежести у анонимов.
+query_budgets = {
+    'posts': 5,
+    'post': 5,
+    'post_comments': 5,
+    'group': 3,
+    'group_posts': 6,
+    'profile': 3,
+    'profile_posts': 6,
+    # По запросу на тип и по одному на авторов и группы постов.
+    'batch': 7,
+}
+
+urlpatterns = [
+    path('batch/', api.batch, name='batch'),
+    path('posts/', api.posts, name='posts'),
+    path('posts/<int:post_id>/', api.post, name='post'),
+    path(
+        'posts/<int:post_id>/comments/',
+        api.post_comments,
+        name='post_comments'
+    ),
+    path('groups/<slug:slug>/', api.group, name='group'),
+    path('groups/<slug:slug>/posts/', api.group_posts, name='group_posts'),
+    path('profiles/<str:username>/', api.profile, name='profile'),
+    path(
+        'profiles/<str:username>/posts/',
+        api.profile_posts,
+        name='profile_posts'
+    ),
+]
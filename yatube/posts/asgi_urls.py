@@ -0,0 +1,26 @@
+"""Адреса posts под ASGI: ленты и страница поста отдаются
+асинхронными представлениями из posts/async_views.py, остальные -
+теми же, что и под WSGI. Имена и бюджеты запросов общие.
+"""
+from django.urls import URLPattern
+
+from . import async_views
+from .urls import app_name, query_budgets  # noqa: F401
+from .urls import urlpatterns as wsgi_urlpatterns
+
+async_views_by_name = {
+    'index': async_views.index,
+    'group_list': async_views.group_posts,
+    'profile': async_views.profile,
+    'post_detail': async_views.post_detail,
+    'follow_index': async_views.follow_index,
+}
+
+urlpatterns = [
+    URLPattern(
+        pattern.pattern, async_views_by_name[pattern.name],
+        pattern.default_args, pattern.name,
+    )
+    if pattern.name in async_views_by_name else pattern
+    for pattern in wsgi_urlpatterns
+]
@@ -0,0 +1,109 @@
+"""Асинхронные варианты лент и страницы поста для ASGI.
+
+Их подключает posts/asgi_urls.py, а yatube/asgi.py отдает через этот
+URLconf. Под WSGI работают синхронные представления из posts/views.py:
+там асинхронное представление стоило бы лишнего async_to_sync
+на каждый запрос.
+
+ORM и шаблоны в Django 3.2 синхронные, поэтому представления
+вызывают их через sync_to_async, см. core.async_utils.
+"""
+from asgiref.sync import sync_to_async
+from django.shortcuts import get_object_or_404, render
+
+from core import async_utils
+from core.middleware.page_cache import anonymous_page
+from core.middleware.replica import replica_reads
+from core.middleware.view_counter import counts_views
+
+from . import follow_graph, freshness, suggestions, timeline, trending
+from .feed_cache import feed_context
+from .forms import CommentForm
+from .models import Group, Post, User
+from .timeline import CURSOR_KEYS, timeline_posts
+from .utils import get_paginator
+
+aget_object_or_404 = sync_to_async(get_object_or_404)
+arender = sync_to_async(render)
+
+
+@replica_reads
+@anonymous_page(freshness.index)
+async def index(request):
+    posts = Post.objects.select_related('author', 'group')
+    context = {
+        'page_obj': await sync_to_async(get_paginator)(posts, request),
+        **await sync_to_async(feed_context)('index'),
+    }
+    return await arender(request, 'posts/index.html', context)
+
+
+@replica_reads
+@anonymous_page(freshness.group_posts)
+async def group_posts(request, slug):
+    group = await aget_object_or_404(Group, slug=slug)
+    posts = group.gr_posts.select_related('author', 'group')
+    context = {
+        'group': group,
+        'page_obj': await sync_to_async(get_paginator)(posts, request),
+        **await sync_to_async(feed_context)(f'group:{group.pk}'),
+    }
+    return await arender(request, 'posts/group_list.html', context)
+
+
+@replica_reads
+@anonymous_page(freshness.profile)
+async def profile(request, username, following=False, suggested=()):
+    author = await aget_object_or_404(
+        User.objects.select_related('stats'), username=username
+    )
+    post_list = author.posts.select_related('author', 'group')
+    user = await async_utils.get_user(request)
+    if user.is_authenticated:
+        following = await sync_to_async(follow_graph.is_following)(
+            user.pk, author.pk
+        )
+        suggested = await sync_to_async(suggestions.for_user)(user)
+    context = {
+        'author': author,
+        'following': following,
+        'suggestions': suggested,
+        'page_obj': await sync_to_async(get_paginator)(post_list, request),
+        **await sync_to_async(feed_context)(f'profile:{author.pk}'),
+    }
+    return await arender(request, 'posts/profile.html', context)
+
+
+@replica_reads
+@counts_views(trending.post_viewed)
+@anonymous_page(freshness.post_detail)
+async def post_detail(request, post_id):
+    post = await aget_object_or_404(
+        Post.objects.select_related('author__stats', 'group'), pk=post_id
+    )
+    form = CommentForm()
+    comments = post.comments.select_related('author')
+    context = {
+        'post': post,
+        'form': form,
+        'comments': comments,
+        **await sync_to_async(feed_context)(f'post:{post.pk}'),
+    }
+    return await arender(request, 'posts/post_detail.html', context)
+
+
+@replica_reads
+@async_utils.login_required
+async def follow_index(request):
+    user = await async_utils.get_user(request)
+    pulled = await sync_to_async(timeline.pulled_authors)(user)
+    post = await sync_to_async(timeline_posts)(user, pulled)
+    page_obj = await sync_to_async(get_paginator)(post, request, CURSOR_KEYS)
+    context = {
+        'page_obj': page_obj,
+        'suggestions': await sync_to_async(suggestions.for_user)(user),
+        **await sync_to_async(feed_context)(
+            *timeline.feed_namespaces(user, pulled)
+        ),
+    }
+    return await arender(request, 'posts/follow.html', context)
@@ -0,0 +1,116 @@
+import os
+import time
+from datetime import timedelta
+from typing import Iterator
+
+from django.conf import settings
+from django.db.models import F
+from django.utils import timezone
+
+from core.storages.content_addressed import media_storage
+
+from . import thumbnails, variants
+from .models import MediaBlob
+
+
+def grace() -> int:
+    """Сколько секунд блоб без ссылок живет до удаления.
+    Загрузка пишет файл раньше, чем пост со ссылкой на него
+    попадает в базу, поэтому свежие блобы не трогаются.
+    """
+    return getattr(settings, 'MEDIA_GC_GRACE', 60 * 60 * 24)
+
+
+def acquire(name: str) -> None:
+    """Добавляет ссылку на блоб, создавая его запись при первой."""
+    digest = media_storage.digest_of(name)
+    if digest is None:
+        return
+    size = media_storage.size(name) if media_storage.exists(name) else 0
+    MediaBlob.objects.bulk_create(
+        [MediaBlob(digest=digest, name=name, size=size)],
+        ignore_conflicts=True,
+    )
+    MediaBlob.objects.filter(pk=digest).update(
+        refcount=F('refcount') + 1, updated=timezone.now()
+    )
+
+
+def release(name: str) -> None:
+    """Убирает ссылку на блоб. Сам файл удаляет collect()."""
+    digest = media_storage.digest_of(name)
+    if digest is None:
+        return
+    MediaBlob.objects.filter(pk=digest, refcount__gt=0).update(
+        refcount=F('refcount') - 1, updated=timezone.now()
+    )
+
+
+def _old_enough(name: str, cutoff: float) -> bool:
+    try:
+        return os.path.getmtime(media_storage.path(name)) < cutoff
+    except FileNotFoundError:
+        return True
+
+
+def _orphans(cutoff: float) -> Iterator[str]:
+    """Файлы блобов без записи в MediaBlob, например от загрузок,
+    пост для которых так и не сохранился, и брошенные временные
+    файлы незавершенных загрузок.
+    """
+    root = media_storage.path('')
+    for directory, _, files in os.walk(root):
+        for filename in files:
+            name = os.path.relpath(
+                os.path.join(directory, filename), root
+            ).replace(os.sep, '/')
+            incoming = name.startswith(media_storage.incoming + '/')
+            if not incoming and media_storage.digest_of(name) is None:
+                continue
+            if not _old_enough(name, cutoff):
+                continue
+            if incoming or not MediaBlob.objects.filter(
+                pk=media_storage.digest_of(name)
+            ).exists():
+                yield name
+
+
+def _delete_derived(name: str, dry_run: bool) -> tuple:
+    """Удаляет варианты (posts.variants) и превью sorl исходника
+    name. Возвращает число файлов вариантов и их размер.
+    """
+    derived = variants.files(name)
+    size = sum(media_storage.size(variant) for variant in derived)
+    if not dry_run:
+        variants.delete(name)
+        thumbnails.delete(name)
+    return len(derived), size
+
+
+def collect(dry_run: bool = False) -> tuple:
+    """Удаляет блобы без ссылок старше grace() вместе с их
+    вариантами и превью.
+    Возвращает число удаленных файлов и освобожденные байты.
+    """
+    cutoff = timezone.now() - timedelta(seconds=grace())
+    file_cutoff = time.time() - grace()
+    deleted = freed = 0
+    garbage = MediaBlob.objects.filter(refcount=0, updated__lt=cutoff)
+    for blob in garbage.iterator():
+        if dry_run:
+            files, size = _delete_derived(blob.name, dry_run)
+            deleted, freed = deleted + 1 + files, freed + blob.size + size
+            continue
+        # Повторная проверка: ссылка могла появиться после выборки.
+        removed, _ = garbage.filter(pk=blob.pk).delete()
+        if removed and _old_enough(blob.name, file_cutoff):
+            media_storage.delete(blob.name)
+            files, size = _delete_derived(blob.name, dry_run)
+            deleted, freed = deleted + 1 + files, freed + blob.size + size
+    for name in list(_orphans(file_cutoff)):
+        files, size = _delete_derived(name, dry_run)
+        size += media_storage.size(name)
+        if not dry_run:
+            media_storage.delete(name)
+        deleted, freed = deleted + 1 + files, freed + size
+    return deleted, freed
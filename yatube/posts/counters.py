@@ -0,0 +1,96 @@
+from collections import Counter
+
+from django.db.models import Count, F, Model, OuterRef, Subquery
+from django.db.models.functions import Coalesce, Greatest
+
+from . import sharding
+from .models import Comment, Follow, Group, Post, UserStats
+
+# Какие счетчики есть у модели и из какой модели и по какому полю
+# они считаются: {модель: {счетчик: (модель-источник, поле)}}.
+COUNTERS = {
+    UserStats: {
+        'posts_count': (Post, 'author'),
+        'followers_count': (Follow, 'author'),
+        'following_count': (Follow, 'user'),
+    },
+    Group: {
+        'posts_count': (Post, 'group'),
+    },
+    Post: {
+        'comments_count': (Comment, 'post'),
+    },
+}
+
+
+def count_of(model: Model, field: str) -> Coalesce:
+    """Подзапрос, который считает строки model, ссылающиеся на OuterRef."""
+    return Coalesce(Subquery(
+        model.objects.filter(**{field: OuterRef('pk')})
+        .order_by().values(field).annotate(n=Count('pk')).values('n')
+    ), 0)
+
+
+def is_cross_shard(model: Model, source: Model) -> bool:
+    """Источник счетчика лежит на шардах, а сам счетчик - в default:
+    подзапрос count_of увидел бы только строки default.
+    """
+    return sharding.enabled() and (
+        source._meta.label_lower in sharding.SHARDED
+        and model._meta.label_lower not in sharding.SHARDED
+    )
+
+
+def sharded_counts(model: Model, field: str, pks: list) -> Counter:
+    """Считает строки model, ссылающиеся на pks, на каждом шарде
+    и складывает: {pk: число строк}.
+    """
+    attname = model._meta.get_field(field).attname
+    totals = Counter()
+    for alias in sharding.shards():
+        totals.update(dict(
+            model.objects.using(alias)
+            .filter(**{f'{attname}__in': pks})
+            .order_by().values(attname).annotate(n=Count('pk'))
+            .values_list(attname, 'n')
+        ))
+    return totals
+
+
+def change(model: Model, pk, field: str, delta: int) -> None:
+    """Атомарно сдвигает счетчик одной строки на delta.
+    Значение не уходит ниже нуля, даже если счетчик разошелся
+    с реальными данными.
+    """
+    if pk is None:
+        return
+    model.objects.filter(pk=pk).update(
+        **{field: Greatest(F(field) + delta, 0)}
+    )
+
+
+def post_added(post: Post, delta: int = 1) -> None:
+    change(UserStats, post.author_id, 'posts_count', delta)
+    change(Group, post.group_id, 'posts_count', delta)
+
+
+def post_moved(old_group_id, new_group_id) -> None:
+    if old_group_id != new_group_id:
+        change(Group, old_group_id, 'posts_count', -1)
+        change(Group, new_group_id, 'posts_count', 1)
+
+
+def comment_added(comment: Comment, delta: int = 1) -> None:
+    change(Post, comment.post_id, 'comments_count', delta)
+
+
+def follow_added(follow: Follow, delta: int = 1) -> None:
+    follows_changed(follow.user_id, [follow.author_id], delta)
+
+
+def follows_changed(user_id: int, author_ids: list, delta: int) -> None:
+    """Подписки user_id на author_ids добавлены (delta=1) или удалены."""
+    change(UserStats, user_id, 'following_count', delta * len(author_ids))
+    UserStats.objects.filter(pk__in=author_ids).update(
+        followers_count=Greatest(F('followers_count') + delta, 0)
+    )
@@ -0,0 +1,93 @@
+import time
+from datetime import datetime, timezone
+
+from django.conf import settings
+from django.core.cache import cache
+
+
+def _key(namespace: str) -> str:
+    return f'feed:version:{namespace}'
+
+
+def _modified_key(namespace: str) -> str:
+    return f'feed:modified:{namespace}'
+
+
+def _initial_version() -> int:
+    # Версия отсчитывается от текущего времени, а не от единицы:
+    # если ключ версии вытеснят из кеша, новая версия не совпадет
+    # со старой, и устаревшие страницы не оживут.
+    return int(time.time() * 1000)
+
+
+def _get_or_init(initial: dict) -> dict:
+    """Значения ключей одним get_many; отсутствующие ключи
+    записываются со значениями из initial.
+    """
+    found = cache.get_many(list(initial))
+    missing = {
+        key: value for key, value in initial.items() if key not in found
+    }
+    if missing:
+        cache.set_many(missing, None)
+        found.update(missing)
+    return found
+
+
+def versions(*namespaces: str) -> dict:
+    """Версии пространств имен по отдельности, одним get_many."""
+    keys = {_key(namespace): namespace for namespace in namespaces}
+    found = _get_or_init(dict.fromkeys(keys, _initial_version()))
+    return {namespace: found[key] for key, namespace in keys.items()}
+
+
+def feed_version(*namespaces: str) -> str:
+    """Текущая версия набора пространств имен кеша лент.
+    Входит в ключ кеша страницы, поэтому после bump() старые
+    записи просто перестают читаться и доживают свой срок.
+    """
+    return '.'.join(str(version) for version in versions(*namespaces).values())
+
+
+def validators(*namespaces: str) -> tuple:
+    """Версия набора пространств имен, как у feed_version(), и время
+    последнего сброса любого из них - для ETag и Last-Modified.
+    Время сброса хранится рядом с версией: дата последнего поста
+    не меняется при правке и уходит назад при удалении. Если его
+    нет в кеше, берется текущее - клиент просто получит страницу.
+    """
+    version, now = _initial_version(), time.time()
+    initial = {}
+    for namespace in namespaces:
+        initial[_key(namespace)] = version
+        initial[_modified_key(namespace)] = now
+    found = _get_or_init(initial)
+    return (
+        '.'.join(str(found[_key(namespace)]) for namespace in namespaces),
+        datetime.fromtimestamp(
+            max(found[_modified_key(namespace)] for namespace in namespaces),
+            timezone.utc,
+        ),
+    )
+
+
+def bump(*namespaces: str) -> None:
+    """Делает недействительными все страницы этих пространств имен."""
+    for namespace in namespaces:
+        try:
+            cache.incr(_key(namespace))
+        except ValueError:
+            cache.set(_key(namespace), _initial_version(), None)
+    if namespaces:
+        now = time.time()
+        cache.set_many(
+            {_modified_key(namespace): now for namespace in namespaces}, None
+        )
+
+
+def feed_context(*namespaces: str) -> dict:
+    """Переменные для {% cache %} в шаблонах лент."""
+    return {
+        'feed_version': feed_version(*namespaces),
+        'feed_cache_timeout': getattr(settings, 'FEED_CACHE_TIMEOUT', 3600),
+    }
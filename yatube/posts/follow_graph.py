@@ -0,0 +1,317 @@
+"""Граф подписок в памяти процесса.
+
+Для каждого пользователя хранятся отсортированные id авторов, на
+которых он подписан, и отсортированные id подписчиков: массивы
+array('q') в формате CSR (ключи, смещения, значения), измененные
+списки лежат поверх них отдельными массивами. Проверка подписки -
+двоичный поиск, число подписчиков - длина списка, без SQL.
+
+Процессы узнают об изменениях из журнала FollowEvent: при подписке
+и отписке туда пишется событие, а версия в кеше меняется. Процесс,
+увидевший новую версию, дочитывает события после последнего
+примененного. Если нужные события уже удалены, граф строится заново.
+Последнее примененное событие сверяется с журналом по времени
+создания: после отката транзакции SQLite выдает его id заново,
+и такое событие не должно сойти за уже примененное.
+Снимок графа на диске (команда follow_graph) ускоряет запуск:
+процесс читает файл и дочитывает только события после снимка.
+"""
+import os
+import struct
+import sys
+import threading
+import time
+from array import array
+from bisect import bisect_left
+from datetime import datetime, timedelta, timezone
+from typing import Iterable, Optional, Sequence
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+from .models import Follow, FollowEvent
+
+VERSION_KEY = 'follow-graph:version'
+MAGIC = b'YFG2' + sys.byteorder[0].encode()
+EMPTY = array('q')
+EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+
+
+def _stamp(created: Optional[datetime]) -> int:
+    """Время создания события в микросекундах, 0 - событий нет."""
+    if created is None:
+        return 0
+    if created.tzinfo is None:
+        created = created.replace(tzinfo=timezone.utc)
+    return (created - EPOCH) // timedelta(microseconds=1)
+
+
+class Adjacency:
+    """Отсортированные списки соседей для каждого ключа."""
+
+    def __init__(self, keys=None, offsets=None, values=None):
+        self.keys = array('q') if keys is None else keys
+        self.offsets = array('q', [0]) if offsets is None else offsets
+        self.values = array('q') if values is None else values
+        # Срезы memoryview не копируют данные.
+        self._view = memoryview(self.values)
+        self.changed = {}
+
+    @classmethod
+    def from_pairs(cls, pairs: Iterable[tuple]) -> 'Adjacency':
+        """Строит списки из пар, отсортированных по (ключ, сосед)."""
+        keys, offsets, values = array('q'), array('q', [0]), array('q')
+        last = None
+        for key, value in pairs:
+            if key != last:
+                if last is not None:
+                    offsets.append(len(values))
+                keys.append(key)
+                last = key
+            values.append(value)
+        if last is not None:
+            offsets.append(len(values))
+        return cls(keys, offsets, values)
+
+    def get(self, key: int) -> Sequence[int]:
+        if key in self.changed:
+            return self.changed[key]
+        i = bisect_left(self.keys, key)
+        if i < len(self.keys) and self.keys[i] == key:
+            return self._view[self.offsets[i]:self.offsets[i + 1]]
+        return EMPTY
+
+    def contains(self, key: int, value: int) -> bool:
+        neighbours = self.get(key)
+        i = bisect_left(neighbours, value)
+        return i < len(neighbours) and neighbours[i] == value
+
+    def _own(self, key: int) -> array:
+        if key not in self.changed:
+            self.changed[key] = array('q', self.get(key))
+        return self.changed[key]
+
+    def add(self, key: int, value: int) -> None:
+        neighbours = self._own(key)
+        i = bisect_left(neighbours, value)
+        if i == len(neighbours) or neighbours[i] != value:
+            neighbours.insert(i, value)
+
+    def remove(self, key: int, value: int) -> None:
+        neighbours = self._own(key)
+        i = bisect_left(neighbours, value)
+        if i < len(neighbours) and neighbours[i] == value:
+            del neighbours[i]
+
+    def items(self):
+        keys = sorted(set(self.keys).union(self.changed))
+        for key in keys:
+            yield key, self.get(key)
+
+    def compact(self) -> 'Adjacency':
+        """Те же списки одним CSR без отдельных измененных массивов."""
+        return Adjacency.from_pairs(
+            (key, value)
+            for key, neighbours in self.items() for value in neighbours
+        )
+
+    def dump(self, file) -> None:
+        compact = self.compact() if self.changed else self
+        file.write(struct.pack('<qq', len(compact.keys), len(compact.values)))
+        for part in (compact.keys, compact.offsets, compact.values):
+            part.tofile(file)
+
+    @classmethod
+    def load(cls, file) -> 'Adjacency':
+        n_keys, n_values = struct.unpack('<qq', file.read(16))
+        parts = []
+        for size in (n_keys, n_keys + 1, n_values):
+            part = array('q')
+            part.fromfile(file, size)
+            parts.append(part)
+        return cls(*parts)
+
+    @property
+    def nbytes(self) -> int:
+        return sum(
+            part.itemsize * len(part)
+            for part in (self.keys, self.offsets, self.values,
+                         *self.changed.values())
+        )
+
+
+class FollowGraph:
+    def __init__(self, following=None, followers=None, last_event=0,
+                 last_stamp=0):
+        self.following = following or Adjacency()
+        self.followers = followers or Adjacency()
+        # id и время создания последнего примененного FollowEvent.
+        self.last_event = last_event
+        self.last_stamp = last_stamp
+
+    @classmethod
+    def from_database(cls) -> 'FollowGraph':
+        # События после этой точки применяются поверх таблицы
+        # повторно, это безопасно: добавление и удаление идемпотентны.
+        last_event, created = FollowEvent.objects.order_by('-id').values_list(
+            'id', 'created'
+        ).first() or (0, None)
+        pairs = Follow.objects.values_list('user_id', 'author_id')
+        return cls(
+            Adjacency.from_pairs(
+                pairs.order_by('user_id', 'author_id').iterator()
+            ),
+            Adjacency.from_pairs(
+                (author_id, user_id) for author_id, user_id in
+                pairs.order_by('author_id', 'user_id')
+                .values_list('author_id', 'user_id').iterator()
+            ),
+            last_event,
+            _stamp(created),
+        )
+
+    def apply(self, user_id: int, author_id: int, followed: bool) -> None:
+        if followed:
+            self.following.add(user_id, author_id)
+            self.followers.add(author_id, user_id)
+        else:
+            self.following.remove(user_id, author_id)
+            self.followers.remove(author_id, user_id)
+
+    def catch_up(self) -> bool:
+        """Применяет новые события журнала.
+        Возвращает False, если часть событий уже удалена или
+        последнее примененное событие откатилось.
+        """
+        events = (
+            FollowEvent.objects.filter(id__gte=self.last_event)
+            .order_by('id')
+            .values_list('id', 'user_id', 'author_id', 'followed', 'created')
+        )
+        checked = not self.last_event
+        for event_id, user_id, author_id, followed, created in (
+                events.iterator()):
+            if not checked:
+                if (event_id != self.last_event
+                        or _stamp(created) != self.last_stamp):
+                    return False
+                checked = True
+                continue
+            if event_id != self.last_event + 1:
+                return False
+            self.apply(user_id, author_id, followed)
+            self.last_event, self.last_stamp = event_id, _stamp(created)
+        return checked
+
+    def dump(self, path: str) -> None:
+        """Пишет снимок атомарно: читатели видят старый или новый файл.
+        """
+        tmp_path = f'{path}.tmp'
+        with open(tmp_path, 'wb') as file:
+            file.write(MAGIC)
+            file.write(struct.pack('<qq', self.last_event, self.last_stamp))
+            self.following.dump(file)
+            self.followers.dump(file)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path: str) -> Optional['FollowGraph']:
+        with open(path, 'rb') as file:
+            if file.read(len(MAGIC)) != MAGIC:
+                return None
+            last_event, last_stamp = struct.unpack('<qq', file.read(16))
+            following = Adjacency.load(file)
+            followers = Adjacency.load(file)
+        return cls(following, followers, last_event, last_stamp)
+
+    def is_following(self, user_id: int, author_id: int) -> bool:
+        return self.following.contains(user_id, author_id)
+
+
+def enabled() -> bool:
+    return getattr(settings, 'FOLLOW_GRAPH', False)
+
+
+def snapshot_path() -> Optional[str]:
+    return getattr(settings, 'FOLLOW_GRAPH_SNAPSHOT', None)
+
+
+_state = {'graph': None, 'version': None}
+_lock = threading.Lock()
+
+
+def reset() -> None:
+    with _lock:
+        _state.update(graph=None, version=None)
+
+
+def build(use_snapshot: bool = True) -> FollowGraph:
+    """Граф из снимка и журнала или, если это невозможно, из Follow."""
+    path = snapshot_path()
+    if use_snapshot and path and os.path.exists(path):
+        graph = FollowGraph.load(path)
+        if graph is not None and graph.catch_up():
+            return graph
+    graph = FollowGraph.from_database()
+    graph.catch_up()
+    return graph
+
+
+def graph() -> FollowGraph:
+    """Граф процесса с примененными последними изменениями.
+    Стоит одного обращения к кешу, пока подписки не менялись.
+    """
+    # Версия читается до событий: изменение, записанное после
+    # этого, снова поменяет версию и будет дочитано в следующий раз.
+    version = cache.get(VERSION_KEY)
+    with _lock:
+        current = _state['graph']
+        if current is None:
+            current = build()
+        elif version != _state['version'] and not current.catch_up():
+            current = build()
+        _state.update(graph=current, version=version)
+        return current
+
+
+def _bump() -> None:
+    cache.set(VERSION_KEY, time.time_ns(), None)
+
+
+def record(user_id: int, author_ids: list, followed: bool) -> None:
+    """Пишет в журнал изменения подписок user_id на author_ids."""
+    FollowEvent.objects.bulk_create([
+        FollowEvent(user_id=user_id, author_id=author_id, followed=followed)
+        for author_id in author_ids
+    ])
+    # Версия меняется и сразу, для этого же соединения, и после
+    # коммита, когда события видны остальным процессам.
+    _bump()
+    transaction.on_commit(_bump)
+
+
+def is_following(user_id: int, author_id: int) -> bool:
+    if not enabled():
+        return Follow.objects.filter(
+            user_id=user_id, author_id=author_id
+        ).exists()
+    return graph().is_following(user_id, author_id)
+
+
+def followees(user_id: int) -> Iterable[int]:
+    """id авторов, на которых подписан пользователь.
+    Без графа - ленивый QuerySet, его можно подставить в __in
+    подзапросом.
+    """
+    if not enabled():
+        return Follow.objects.filter(user_id=user_id).values_list(
+            'author_id', flat=True
+        )
+    return list(graph().following.get(user_id))
+
+
+def followers_count(author_id: int) -> int:
+    if not enabled():
+        return Follow.objects.filter(author_id=author_id).count()
+    return len(graph().followers.get(author_id))
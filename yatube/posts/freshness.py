@@ -0,0 +1,51 @@
+from typing import Optional
+
+from django.db.models import QuerySet
+from django.http import HttpRequest
+
+from .feed_cache import validators
+from .models import Group, Post, User
+
+# Функции свежести для AnonymousPageCacheMiddleware. ETag и
+# Last-Modified берутся из тех же пространств имен кеша лент, что
+# и в шаблоне: версия и время ее последнего сброса сигналами posts.
+# Поэтому новый пост, правка, удаление и комментарий меняют оба
+# валидатора, а база нужна только чтобы найти id группы, автора
+# или автора поста.
+
+Freshness = Optional[tuple]
+
+
+def _row(queryset: QuerySet) -> Optional[tuple]:
+    # Без сортировки: first() добавил бы ORDER BY по ключу.
+    return next(iter(queryset[:1]), None)
+
+
+def index(request: HttpRequest) -> Freshness:
+    return validators('index')
+
+
+def group_posts(request: HttpRequest, slug: str) -> Freshness:
+    pk = _row(Group.objects.filter(slug=slug).values_list('pk', flat=True))
+    if pk is None:
+        return None
+    return validators(f'group:{pk}')
+
+
+def profile(request: HttpRequest, username: str) -> Freshness:
+    pk = _row(
+        User.objects.filter(username=username).values_list('pk', flat=True)
+    )
+    if pk is None:
+        return None
+    return validators(f'profile:{pk}')
+
+
+def post_detail(request: HttpRequest, post_id: int) -> Freshness:
+    author_id = _row(
+        Post.objects.filter(pk=post_id).values_list('author_id', flat=True)
+    )
+    if author_id is None:
+        return None
+    # На странице поста есть счетчик постов автора.
+    return validators(f'post:{post_id}', f'profile:{author_id}')
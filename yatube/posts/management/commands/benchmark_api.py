@@ -0,0 +1,122 @@
+import statistics
+import time
+from io import BytesIO
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.core.wsgi import get_wsgi_application
+
+from posts.models import Comment, Group, Post, User
+
+USERNAME = 'benchmark-api'
+
+
+class Command(BaseCommand):
+    help = (
+        'Сравнивает запросы в секунду у JSON API и HTML-страниц тех же '
+        'ресурсов. Приложение WSGI вызывается в процессе по очереди. '
+        'Без кеша страниц запросы идут с cookie сессии: так кеш '
+        'анонимных страниц не участвует. Синтетические данные '
+        'удаляются в конце'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--requests', type=int, default=500,
+            help='Сколько запросов к каждому адресу',
+        )
+        parser.add_argument(
+            '--posts', type=int, default=200,
+            help='Сколько синтетических постов создать',
+        )
+
+    def handle(self, *args, **options):
+        application = get_wsgi_application()
+        pairs = self.populate(options['posts'])
+        try:
+            self.stdout.write(
+                f'{"ресурс":<10}{"кеш страниц":>12}{"HTML, з/с":>12}'
+                f'{"API, з/с":>12}{"HTML p50":>10}{"API p50":>10}'
+            )
+            for cached in (False, True):
+                for name, (html, api) in pairs.items():
+                    results = [
+                        self.measure(application, path, cached, options)
+                        for path in (html, api)
+                    ]
+                    (html_rps, html_p50), (api_rps, api_p50) = results
+                    self.stdout.write(
+                        f'{name:<10}{"да" if cached else "нет":>12}'
+                        f'{html_rps:>12.0f}{api_rps:>12.0f}'
+                        f'{html_p50:>10.2f}{api_p50:>10.2f}'
+                    )
+        finally:
+            User.objects.filter(username=USERNAME).delete()
+            Group.objects.filter(slug=USERNAME).delete()
+
+    def populate(self, count):
+        """Создает автора, группу, посты и комментарии,
+        возвращает пары адресов HTML и API.
+        """
+        author = User.objects.create(username=USERNAME)
+        group = Group.objects.create(
+            title=USERNAME, slug=USERNAME, description=USERNAME
+        )
+        Post.objects.bulk_create(
+            Post(author=author, group=group, text=f'Пост {i}')
+            for i in range(count)
+        )
+        post = Post.objects.filter(author=author).first()
+        Comment.objects.bulk_create(
+            Comment(post=post, author=author, text=f'Комментарий {i}')
+            for i in range(10)
+        )
+        return {
+            'index': ('/', '/api/v1/posts/'),
+            'group': (
+                f'/group/{group.slug}/', f'/api/v1/groups/{group.slug}/posts/'
+            ),
+            'profile': (
+                f'/profile/{author.username}/',
+                f'/api/v1/profiles/{author.username}/posts/',
+            ),
+            'post': (f'/posts/{post.pk}/', f'/api/v1/posts/{post.pk}/'),
+        }
+
+    def environ(self, path, cached):
+        environ = {
+            'REQUEST_METHOD': 'GET',
+            'PATH_INFO': path,
+            'QUERY_STRING': '',
+            'SERVER_NAME': 'localhost',
+            'SERVER_PORT': '80',
+            'HTTP_HOST': 'localhost',
+            'wsgi.input': BytesIO(),
+            'wsgi.url_scheme': 'http',
+        }
+        if not cached:
+            environ['HTTP_COOKIE'] = f'{settings.SESSION_COOKIE_NAME}=none'
+        return environ
+
+    def measure(self, application, path, cached, options):
+        """Запросов в секунду и медиана в миллисекундах."""
+        def request():
+            result = application(
+                self.environ(path, cached), lambda status, headers: None
+            )
+            try:
+                b''.join(result)
+            finally:
+                result.close()
+
+        # Прогрев: шаблоны, кеш фрагментов и соединения.
+        for _ in range(10):
+            request()
+        timings = []
+        started = time.perf_counter()
+        for _ in range(options['requests']):
+            begin = time.perf_counter()
+            request()
+            timings.append((time.perf_counter() - begin) * 1000)
+        elapsed = time.perf_counter() - started
+        return options['requests'] / elapsed, statistics.median(timings)
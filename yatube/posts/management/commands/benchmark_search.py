@@ -0,0 +1,107 @@
+import random
+import statistics
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from posts import search
+from posts.models import Post, User
+from yatube.settings import num_posts
+
+SYLLABLES = (
+    'ба', 'ве', 'го', 'ду', 'же', 'зи', 'ко', 'ла', 'ми', 'но',
+    'пу', 'ра', 'се', 'ти', 'фо', 'ха', 'це', 'ша', 'ю', 'я',
+)
+RARE_WORD = 'редкослово'
+
+
+class Command(BaseCommand):
+    help = (
+        'Сравнивает поиск через FTS5 с поиском через LIKE. '
+        'Синтетические посты создаются в транзакции, которая '
+        'в конце откатывается'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--posts', type=int, default=1_000_000,
+            help='Сколько синтетических постов создать',
+        )
+        parser.add_argument(
+            '--repeat', type=int, default=5,
+            help='Сколько раз повторять каждый запрос',
+        )
+        parser.add_argument(
+            '--chunk-size', type=int, default=10_000,
+            help='Размер пачки при вставке и индексации',
+        )
+
+    def handle(self, *args, **options):
+        rnd = random.Random(0)
+        vocabulary = sorted({
+            ''.join(rnd.choices(SYLLABLES, k=rnd.randint(2, 4)))
+            for _ in range(5000)
+        })
+        # Частоты слов убывают как 1/ранг, как в живом тексте.
+        weights = [1 / rank for rank in range(1, len(vocabulary) + 1)]
+        queries = {
+            'частое слово': vocabulary[0],
+            'среднее слово': vocabulary[100],
+            'два слова': f'{vocabulary[0]} {vocabulary[1]}',
+            'редкое слово': RARE_WORD,
+            'нет совпадений': 'отсутствует',
+        }
+        with transaction.atomic():
+            self.populate(
+                rnd, vocabulary, weights, options['posts'],
+                options['chunk_size'],
+            )
+            started = time.perf_counter()
+            for _ in search.rebuild(options['chunk_size']):
+                pass
+            self.stdout.write(
+                f'перестроение индекса: '
+                f'{time.perf_counter() - started:.1f} с'
+            )
+            self.stdout.write(
+                f'{"запрос":<16}{"LIKE, мс":>12}{"FTS5, мс":>12}'
+            )
+            for name, query in queries.items():
+                like = self.measure(
+                    lambda: list(
+                        search.like_search(query)
+                        .order_by('-pub_date')[:num_posts]
+                    ),
+                    options['repeat'],
+                )
+                fts = self.measure(
+                    lambda: search.search(query, None, num_posts),
+                    options['repeat'],
+                )
+                self.stdout.write(f'{name:<16}{like:>12.1f}{fts:>12.1f}')
+            transaction.set_rollback(True)
+
+    def populate(self, rnd, vocabulary, weights, count, chunk_size):
+        author = User.objects.create(username='benchmark-search')
+        created = 0
+        while created < count:
+            size = min(chunk_size, count - created)
+            posts = []
+            for i in range(created, created + size):
+                words = rnd.choices(vocabulary, weights, k=rnd.randint(5, 40))
+                if i % 10_000 == 0:
+                    words.append(RARE_WORD)
+                posts.append(Post(author=author, text=' '.join(words)))
+            Post.objects.bulk_create(posts)
+            created += size
+        self.stdout.write(f'создано постов: {created}')
+
+    def measure(self, run, repeat):
+        """Медиана времени выполнения в миллисекундах."""
+        timings = []
+        for _ in range(repeat):
+            started = time.perf_counter()
+            run()
+            timings.append((time.perf_counter() - started) * 1000)
+        return statistics.median(timings)
@@ -0,0 +1,179 @@
+import asyncio
+import statistics
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+
+from django.core.management.base import BaseCommand
+from django.core.wsgi import get_wsgi_application
+
+from posts.models import Group, Post, User
+
+USERNAME = 'benchmark-servers'
+
+
+class Command(BaseCommand):
+    help = (
+        'Сравнивает пропускную способность WSGI и ASGI при множестве '
+        'одновременных соединений. Приложения вызываются в процессе: '
+        'WSGI из пула потоков размером --threads, как воркер '
+        'gunicorn gthread, ASGI из одного цикла событий, как uvicorn. '
+        'Медленный клиент читает каждый кусок ответа --client-delay мс. '
+        'Синтетические данные удаляются в конце'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--requests', type=int, default=400,
+            help='Сколько запросов сделать в каждом прогоне',
+        )
+        parser.add_argument(
+            '--concurrency', type=int, default=50,
+            help='Сколько соединений открыто одновременно',
+        )
+        parser.add_argument(
+            '--threads', type=int, default=8,
+            help='Сколько потоков у WSGI-воркера',
+        )
+        parser.add_argument(
+            '--client-delay', type=float, default=200,
+            help='Задержка медленного клиента на кусок ответа, мс',
+        )
+        parser.add_argument(
+            '--posts', type=int, default=200,
+            help='Сколько синтетических постов создать',
+        )
+
+    def handle(self, *args, **options):
+        from yatube.asgi import application as asgi_application
+
+        wsgi_application = get_wsgi_application()
+        paths = self.populate(options['posts'])
+        try:
+            # Прогрев: шаблоны, кеши страниц и соединения.
+            warmup = {**options, 'requests': len(paths) * 3}
+            self.run_wsgi(wsgi_application, paths, 0, warmup)
+            asyncio.run(self.run_asgi(asgi_application, paths, 0, warmup))
+            self.stdout.write(
+                f'{"сервер":<8}{"задержка, мс":>14}{"запросов/с":>12}'
+                f'{"p50, мс":>10}{"p99, мс":>10}'
+            )
+            for delay in sorted({0, options['client_delay']}):
+                delay /= 1000
+                runs = {
+                    'WSGI': lambda: self.run_wsgi(
+                        wsgi_application, paths, delay, options
+                    ),
+                    'ASGI': lambda: asyncio.run(self.run_asgi(
+                        asgi_application, paths, delay, options
+                    )),
+                }
+                for name, run in runs.items():
+                    started = time.perf_counter()
+                    timings = run()
+                    elapsed = time.perf_counter() - started
+                    self.report(name, delay, len(timings) / elapsed, timings)
+        finally:
+            User.objects.filter(username=USERNAME).delete()
+            Group.objects.filter(slug=USERNAME).delete()
+
+    def populate(self, count):
+        """Создает автора, группу и посты, возвращает адреса страниц.
+        Данные сохраняются: ASGI читает их из других потоков
+        и других соединений с БД.
+        """
+        author = User.objects.create(username=USERNAME)
+        group = Group.objects.create(
+            title=USERNAME, slug=USERNAME, description=USERNAME
+        )
+        Post.objects.bulk_create(
+            Post(author=author, group=group, text=f'Пост {i}')
+            for i in range(count)
+        )
+        post = Post.objects.filter(author=author).first()
+        return [
+            '/',
+            f'/group/{group.slug}/',
+            f'/profile/{author.username}/',
+            f'/posts/{post.pk}/',
+        ]
+
+    def environ(self, path, number):
+        return {
+            'REQUEST_METHOD': 'GET',
+            'PATH_INFO': path,
+            'QUERY_STRING': f'page={number % 3 + 1}',
+            'SERVER_NAME': 'localhost',
+            'SERVER_PORT': '80',
+            'HTTP_HOST': 'localhost',
+            'wsgi.input': BytesIO(),
+            'wsgi.url_scheme': 'http',
+        }
+
+    def run_wsgi(self, application, paths, delay, options):
+        """Поток воркера занят, пока клиент не дочитает ответ."""
+        def request(number):
+            started = time.perf_counter()
+            environ = self.environ(paths[number % len(paths)], number)
+            result = application(environ, lambda status, headers: None)
+            try:
+                for _ in result:
+                    time.sleep(delay)
+            finally:
+                result.close()
+            return (time.perf_counter() - started) * 1000
+
+        # Соединения сверх числа потоков ждут в очереди.
+        semaphore = threading.BoundedSemaphore(options['concurrency'])
+
+        def connection(number):
+            with semaphore:
+                return request(number)
+
+        with ThreadPoolExecutor(options['threads']) as pool:
+            return list(pool.map(connection, range(options['requests'])))
+
+    async def run_asgi(self, application, paths, delay, options):
+        """Медленный клиент держит только корутину, не поток."""
+        semaphore = asyncio.Semaphore(options['concurrency'])
+
+        async def request(number):
+            environ = self.environ(paths[number % len(paths)], number)
+            scope = {
+                'type': 'http',
+                'asgi': {'version': '3.0'},
+                'http_version': '1.1',
+                'method': 'GET',
+                'scheme': 'http',
+                'path': environ['PATH_INFO'],
+                'root_path': '',
+                'query_string': environ['QUERY_STRING'].encode(),
+                'headers': [(b'host', b'localhost')],
+                'server': ('localhost', 80),
+                'client': ('127.0.0.1', 1024 + number),
+            }
+
+            async def receive():
+                return {'type': 'http.request', 'body': b''}
+
+            async def send(message):
+                if message['type'] == 'http.response.body':
+                    await asyncio.sleep(delay)
+
+            async with semaphore:
+                started = time.perf_counter()
+                await application(scope, receive, send)
+                return (time.perf_counter() - started) * 1000
+
+        return await asyncio.gather(
+            *(request(number) for number in range(options['requests']))
+        )
+
+    def report(self, name, delay, throughput, timings):
+        timings = sorted(timings)
+        p99 = timings[min(len(timings) - 1, int(len(timings) * 0.99))]
+        self.stdout.write(
+            f'{name:<8}{delay * 1000:>14.0f}{throughput:>12.1f}'
+            f'{statistics.median(timings):>10.1f}{p99:>10.1f}'
+        )
@@ -0,0 +1,109 @@
+import random
+import statistics
+import time
+from array import array
+
+from django.core.management.base import BaseCommand
+
+from posts import suggestions
+from posts.follow_graph import Adjacency, FollowGraph
+
+
+class Command(BaseCommand):
+    help = (
+        'Замеряет расчет рекомендаций на синтетическом графе подписок '
+        'в памяти, без базы данных'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--users', type=int, default=1_000_000,
+            help='Сколько пользователей в графе',
+        )
+        parser.add_argument(
+            '--edges', type=int, default=50_000_000,
+            help='Сколько подписок в графе',
+        )
+        parser.add_argument(
+            '--sample', type=int, default=1000,
+            help='Для скольких случайных пользователей считать',
+        )
+        parser.add_argument(
+            '--top', type=int, default=20,
+            help='Сколько рекомендаций на пользователя',
+        )
+        parser.add_argument(
+            '--max-degree', type=int, default=5000,
+            help='Как --max-degree у suggest_follows',
+        )
+        parser.add_argument(
+            '--workers', type=int, default=8,
+            help='Для скольких процессов оценить полный расчет',
+        )
+
+    def handle(self, *args, **options):
+        rnd = random.Random(0)
+        started = time.perf_counter()
+        graph = self.generate(rnd, options['users'], options['edges'])
+        size = graph.following.nbytes + graph.followers.nbytes
+        self.stdout.write(
+            f'граф: {options["users"]} пользователей, '
+            f'{len(graph.following.values)} подписок, {size >> 20} МиБ, '
+            f'построен за {time.perf_counter() - started:.1f} с'
+        )
+        users = rnd.sample(range(options['users']), options['sample'])
+        self.stdout.write(
+            f'{"оценка":<14}{"мс на польз.":>14}{"p99, мс":>10}'
+            f'{"весь граф, мин":>16}'
+        )
+        for score in suggestions.SCORES:
+            timings = []
+            for user_id in users:
+                started = time.perf_counter()
+                suggestions.suggest(
+                    graph, user_id, options['top'], score,
+                    options['max_degree'],
+                )
+                timings.append((time.perf_counter() - started) * 1000)
+            mean = statistics.mean(timings)
+            p99 = statistics.quantiles(timings, n=100)[-1]
+            total = mean * options['users'] / options['workers'] / 6e4
+            self.stdout.write(
+                f'{score:<14}{mean:>14.2f}{p99:>10.1f}{total:>16.2f}'
+            )
+        self.stdout.write(
+            f'полный расчет оценен для --workers {options["workers"]}'
+        )
+
+    def generate(self, rnd, users, edges):
+        """Подписки с популярностью авторов по степенному закону:
+        на автора с id k подписываются примерно в 1 / sqrt(k) раз чаще.
+        """
+        degree = max(1, edges // users)
+        keys = array('q', range(users))
+        offsets = array('q', [0])
+        values = array('q')
+        in_degree = array('q', bytes(8 * users))
+        for user in range(users):
+            followees = sorted({
+                int(users * rnd.random() ** 2)
+                for _ in range(rnd.randint(1, 2 * degree - 1))
+            } - {user})
+            values.extend(followees)
+            offsets.append(len(values))
+            for author in followees:
+                in_degree[author] += 1
+        # Подписчики - та же матрица, транспонированная подсчетом.
+        follower_offsets = array('q', [0])
+        for count in in_degree:
+            follower_offsets.append(follower_offsets[-1] + count)
+        followers = array('q', bytes(8 * len(values)))
+        fill = array('q', follower_offsets[:-1])
+        for user in range(users):
+            for author in values[offsets[user]:offsets[user + 1]]:
+                followers[fill[author]] = user
+                fill[author] += 1
+        return FollowGraph(
+            Adjacency(keys, offsets, values),
+            Adjacency(array('q', range(users)), follower_offsets, followers),
+        )
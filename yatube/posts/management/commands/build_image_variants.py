@@ -0,0 +1,27 @@
+from django.core.management.base import BaseCommand
+
+from posts import variants
+from posts.models import Post
+
+
+class Command(BaseCommand):
+    help = 'Создает варианты картинок постов, у которых их еще нет'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--dry-run', action='store_true',
+            help='Только показать, сколько постов без вариантов',
+        )
+
+    def handle(self, *args, **options):
+        missing = 0
+        posts = Post.objects.exclude(image='').only(
+            'pk', 'image', 'image_variants'
+        )
+        for post in posts.iterator():
+            if variants.sources(post):
+                continue
+            missing += 1
+            if not options['dry_run']:
+                variants.schedule(post, inline=True)
+        self.stdout.write(f'постов без вариантов: {missing}')
@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+
+from posts import blobs
+
+
+class Command(BaseCommand):
+    help = 'Удаляет файлы картинок, на которые не ссылается ни один пост'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--dry-run', action='store_true',
+            help='Только показать, сколько места освободится',
+        )
+
+    def handle(self, *args, **options):
+        deleted, freed = blobs.collect(options['dry_run'])
+        self.stdout.write(
+            f'файлов удалено: {deleted}, освобождено байт: {freed}'
+        )
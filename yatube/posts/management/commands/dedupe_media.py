@@ -0,0 +1,115 @@
+import hashlib
+from collections import defaultdict
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from core.storages.content_addressed import media_storage
+from posts import blobs
+from posts.models import Post
+
+
+class Command(BaseCommand):
+    help = (
+        'Переносит картинки постов из media/posts в хранилище '
+        'с адресацией по содержимому, удаляя дубликаты'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size', type=int, default=500,
+            help='Сколько постов переносить в одной транзакции',
+        )
+        parser.add_argument(
+            '--dry-run', action='store_true',
+            help='Только посчитать дубликаты, ничего не менять',
+        )
+
+    def handle(self, *args, **options):
+        legacy = (
+            Post.objects.exclude(image='').exclude(image__isnull=True)
+            .exclude(image__regex=r'[0-9a-f]{64}(\.\w+)?$')
+        )
+        if options['dry_run']:
+            return self.report(legacy)
+        moved = missing = 0
+        freed = 0
+        last_pk = 0
+        while True:
+            batch = list(
+                legacy.filter(pk__gt=last_pk).order_by('pk')
+                .only('pk', 'image', 'image_variants')[:options['batch_size']]
+            )
+            if not batch:
+                break
+            last_pk = batch[-1].pk
+            moved_batch, missing_batch, freed_batch = self.move(batch)
+            moved += moved_batch
+            missing += missing_batch
+            freed += freed_batch
+            self.stdout.write(f'перенесено постов: {moved}')
+        self.stdout.write(
+            f'Готово: перенесено {moved}, файлов не найдено {missing}, '
+            f'удалено старых файлов на {freed} байт'
+        )
+
+    def move(self, posts):
+        """Переносит файлы пачки и переписывает ссылки в постах.
+        Старый файл удаляется, только когда на него больше
+        не ссылается ни один пост.
+        """
+        renamed = {}
+        missing = 0
+        for post in posts:
+            old = post.image.name
+            if old in renamed:
+                continue
+            if not media_storage.exists(old):
+                missing += 1
+                continue
+            with media_storage.open(old) as content:
+                renamed[old] = media_storage.save(old, content)
+        updated = []
+        with transaction.atomic():
+            for post in posts:
+                old = post.image.name
+                if old not in renamed:
+                    continue
+                post.image.name = renamed[old]
+                if post.image_variants.get('source') == old:
+                    # Содержимое не изменилось, варианты остаются.
+                    post.image_variants['source'] = renamed[old]
+                updated.append(post)
+                blobs.acquire(renamed[old])
+            Post.objects.bulk_update(updated, ['image', 'image_variants'])
+        still_used = set(
+            Post.objects.filter(image__in=renamed)
+            .values_list('image', flat=True)
+        )
+        freed = 0
+        for old in renamed:
+            if old not in still_used:
+                freed += media_storage.size(old)
+                media_storage.delete(old)
+        return len(updated), missing, freed
+
+    def report(self, legacy):
+        names = set(legacy.values_list('image', flat=True))
+        by_digest = defaultdict(list)
+        for name in names:
+            if not media_storage.exists(name):
+                continue
+            digest = hashlib.sha256()
+            with media_storage.open(name) as content:
+                for chunk in content.chunks():
+                    digest.update(chunk)
+            by_digest[digest.hexdigest()].append(name)
+        duplicates = sum(len(files) - 1 for files in by_digest.values())
+        reclaimable = sum(
+            media_storage.size(name)
+            for files in by_digest.values() for name in files[1:]
+        )
+        self.stdout.write(
+            f'файлов: {len(names)}, уникальных: {len(by_digest)}, '
+            f'дубликатов: {duplicates}, освободится байт: {reclaimable}'
+        )
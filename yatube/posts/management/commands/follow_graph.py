@@ -0,0 +1,67 @@
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from posts import follow_graph
+from posts.models import FollowEvent
+
+
+class Command(BaseCommand):
+    help = 'Записывает снимок графа подписок для быстрого запуска воркеров'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--rebuild', action='store_true',
+            help='Строить граф по таблице подписок, а не по старому снимку',
+        )
+        parser.add_argument(
+            '--prune', action='store_true',
+            help='Удалить вошедшие в снимок события старше '
+                 'FOLLOW_GRAPH_EVENT_RETENTION, кроме последнего',
+        )
+
+    def handle(self, *args, **options):
+        path = follow_graph.snapshot_path()
+        if not path:
+            raise CommandError('FOLLOW_GRAPH_SNAPSHOT не задан')
+        started = time.perf_counter()
+        graph = follow_graph.build(use_snapshot=not options['rebuild'])
+        built = time.perf_counter() - started
+        graph.dump(path)
+        started = time.perf_counter()
+        graph = follow_graph.FollowGraph.load(path)
+        loaded = time.perf_counter() - started
+        size = graph.following.nbytes + graph.followers.nbytes
+        self.stdout.write(
+            f'событие {graph.last_event}: '
+            f'{len(graph.following.values)} подписок, {size} байт, '
+            f'построен за {built:.3f} с, читается за {loaded:.3f} с'
+        )
+        self.stdout.write(f'проверка подписки: {self.probe(graph):.2f} мкс')
+        if options['prune']:
+            retention = getattr(
+                settings, 'FOLLOW_GRAPH_EVENT_RETENTION', 60 * 60 * 24
+            )
+            # Последнее событие снимка остается: по нему воркеры,
+            # читающие снимок, сверяют журнал.
+            deleted, _ = FollowEvent.objects.filter(
+                id__lt=graph.last_event,
+                created__lt=timezone.now() - timedelta(seconds=retention),
+            ).delete()
+            self.stdout.write(f'событий удалено: {deleted}')
+
+    def probe(self, graph, rounds=10000):
+        """Среднее время is_following по пользователям с подписками."""
+        keys = graph.following.keys
+        if not keys:
+            return 0.0
+        pairs = [
+            (keys[i % len(keys)], i) for i in range(rounds)
+        ]
+        started = time.perf_counter()
+        for user_id, author_id in pairs:
+            graph.is_following(user_id, author_id)
+        return (time.perf_counter() - started) / rounds * 1e6
@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand
+
+from posts import search
+
+
+class Command(BaseCommand):
+    help = 'Перестраивает полнотекстовый индекс постов и комментариев'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--chunk-size', type=int, default=1000,
+            help='Сколько строк индексировать в одной транзакции',
+        )
+
+    def handle(self, *args, **options):
+        total = 0
+        for size in search.rebuild(options['chunk_size']):
+            total += size
+            self.stdout.write(f'проиндексировано строк: {total}')
+        self.stdout.write(self.style.SUCCESS(f'Готово, строк: {total}'))
@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+
+from posts import trending
+
+
+class Command(BaseCommand):
+    help = (
+        'Добавляет к оценкам популярности события после прошлого '
+        'запуска и обновляет списки популярного в кеше'
+    )
+
+    def handle(self, *args, **options):
+        result = trending.refresh()
+        self.stdout.write(
+            f'оценок обновлено: {result["objects"]}, '
+            f'постов в списке: {result["posts"]}, '
+            f'групп: {result["groups"]}'
+        )
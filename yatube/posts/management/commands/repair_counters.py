@@ -0,0 +1,87 @@
+from django.core.management.base import BaseCommand
+
+from posts.counters import (COUNTERS, count_of, is_cross_shard,
+                            sharded_counts)
+from posts.models import User, UserStats
+
+
+class Command(BaseCommand):
+    help = 'Находит и исправляет расхождения денормализованных счетчиков'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size', type=int, default=1000,
+            help='Сколько строк проверять за один запрос',
+        )
+        parser.add_argument(
+            '--dry-run', action='store_true',
+            help='Только показать расхождения, ничего не исправлять',
+        )
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        dry_run = options['dry_run']
+        missing = User.objects.filter(stats__isnull=True)
+        if not dry_run:
+            UserStats.objects.bulk_create(
+                [UserStats(user_id=pk)
+                 for pk in missing.values_list('pk', flat=True)],
+                batch_size=batch_size,
+            )
+        for model, fields in COUNTERS.items():
+            fixed = self.repair(model, fields, batch_size, dry_run)
+            self.stdout.write(
+                f'{model._meta.verbose_name_plural}: '
+                f'исправлено строк {fixed}'
+            )
+
+    def repair(self, model, fields, batch_size, dry_run):
+        """Проходит таблицу пачками по первичному ключу.
+        Для каждой пачки один запрос считает реальные значения
+        и один bulk_update записывает исправленные. Счетчики постов
+        в default при нескольких шардах считаются на каждом шарде
+        отдельно и складываются.
+        """
+        sharded = {
+            field: source for field, source in fields.items()
+            if is_cross_shard(model, source[0])
+        }
+        expected = {
+            f'real_{field}': count_of(source, fk)
+            for field, (source, fk) in fields.items() if field not in sharded
+        }
+        fixed = 0
+        last_pk = None
+        while True:
+            batch = (
+                model.objects.order_by('pk').only('pk', *fields)
+                .annotate(**expected)
+            )
+            if last_pk is not None:
+                batch = batch.filter(pk__gt=last_pk)
+            batch = list(batch[:batch_size])
+            if not batch:
+                return fixed
+            last_pk = batch[-1].pk
+            self.count_sharded(batch, sharded)
+            drifted = []
+            for obj in batch:
+                changed = False
+                for field in fields:
+                    real = getattr(obj, f'real_{field}')
+                    if getattr(obj, field) != real:
+                        setattr(obj, field, real)
+                        changed = True
+                if changed:
+                    drifted.append(obj)
+            if drifted and not dry_run:
+                model.objects.bulk_update(drifted, list(fields))
+            fixed += len(drifted)
+
+    def count_sharded(self, batch, sharded):
+        """Ставит real_-значения счетчиков, которые считаются по шардам."""
+        pks = [obj.pk for obj in batch]
+        for field, (source, fk) in sharded.items():
+            counts = sharded_counts(source, fk, pks)
+            for obj in batch:
+                setattr(obj, f'real_{field}', counts[obj.pk])
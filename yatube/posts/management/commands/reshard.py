@@ -0,0 +1,225 @@
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models import F
+
+from posts import feed_cache, sharding
+from posts.models import Comment, Post, ShardBucket, ShardSequence, User
+
+
+def chunks(items, size):
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+def batches(queryset, size):
+    """Пачки строк по возрастанию pk без OFFSET."""
+    last_pk = None
+    while True:
+        page = queryset.order_by('pk')
+        if last_pk is not None:
+            page = page.filter(pk__gt=last_pk)
+        batch = list(page[:size])
+        if not batch:
+            return
+        last_pk = batch[-1].pk
+        yield batch
+
+
+class Command(BaseCommand):
+    help = (
+        'Переносит корзины авторов (см. posts/sharding.py) на другой '
+        'шард вместе с постами, комментариями к ним и счетчиками id. '
+        'Сайт продолжает работать: чтение идет со старого шарда, '
+        'запись в переносимую корзину ждет окончания переноса. '
+        'Перед добавлением шарда в POST_SHARDS запустите с --pin'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--bucket', type=int, action='append', dest='buckets',
+            help='Номер корзины',
+        )
+        parser.add_argument(
+            '--author', action='append', dest='authors',
+            help='Имя пользователя: переносится вся его корзина',
+        )
+        parser.add_argument('--to', help='Алиас шарда из POST_SHARDS')
+        parser.add_argument(
+            '--pin', action='store_true',
+            help='Записать текущее размещение всех корзин в ShardBucket, '
+                 'чтобы новый шард в POST_SHARDS его не изменил',
+        )
+        parser.add_argument(
+            '--batch-size', type=int, default=500,
+            help='Сколько постов копировать за один запрос',
+        )
+        parser.add_argument(
+            '--settle', type=float,
+            help='Сколько ждать завершения начатых записей и обновления '
+                 'карты корзин в других процессах '
+                 '(по умолчанию POST_SHARD_MAP_TTL + 1 с)',
+        )
+
+    def handle(self, *args, **options):
+        if options['pin']:
+            return self.pin()
+        if not sharding.enabled():
+            raise CommandError('В POST_SHARDS только один шард')
+        target = options['to']
+        if target not in sharding.shards():
+            raise CommandError(f'{target}: шарда нет в POST_SHARDS')
+        buckets = set(options['buckets'] or ())
+        for username in options['authors'] or ():
+            pk = User.objects.filter(username=username).values_list(
+                'pk', flat=True
+            ).first()
+            if pk is None:
+                raise CommandError(f'Пользователь {username} не найден')
+            buckets.add(sharding.bucket_of_author(pk))
+        if not buckets:
+            raise CommandError('Укажите --bucket или --author')
+        if not buckets <= set(range(sharding.buckets())):
+            raise CommandError(
+                f'Номер корзины должен быть меньше {sharding.buckets()}'
+            )
+        settle = options['settle']
+        if settle is None:
+            settle = getattr(settings, 'POST_SHARD_MAP_TTL', 1) + 1
+        for bucket in sorted(buckets):
+            self.move(bucket, target, options['batch_size'], settle)
+
+    def pin(self):
+        ShardBucket.objects.bulk_create(
+            [ShardBucket(bucket=bucket, alias=sharding.shard_of_bucket(bucket))
+             for bucket in range(sharding.buckets())],
+            ignore_conflicts=True,
+        )
+        self.publish()
+        self.stdout.write(f'Закреплено корзин: {sharding.buckets()}')
+
+    def publish(self):
+        """Сообщает всем процессам, что карта корзин изменилась."""
+        cache.set(sharding.MAP_VERSION_KEY, time.time_ns(), None)
+        sharding.reset_directory()
+
+    def mark_moving(self, bucket, moving):
+        """Добавляет корзину в список переносимых или убирает из него."""
+        buckets = set(cache.get(sharding.MOVING_KEY) or ())
+        if moving:
+            buckets.add(bucket)
+        else:
+            buckets.discard(bucket)
+        cache.set(sharding.MOVING_KEY, sorted(buckets), None)
+        self.publish()
+
+    def namespaces(self, bucket, source):
+        """Пространства имен кеша лент, где есть посты корзины."""
+        authors = self.authors(bucket)
+        groups = (
+            Post.objects.using(source).filter(
+                author_id__in=authors, group_id__isnull=False
+            ).order_by().values_list('group_id', flat=True).distinct()
+        )
+        return [
+            'index',
+            *(f'profile:{pk}' for pk in authors),
+            *(f'group:{pk}' for pk in groups),
+        ]
+
+    def authors(self, bucket):
+        return list(
+            User.objects.annotate(bucket=F('pk') % sharding.buckets())
+            .filter(bucket=bucket).values_list('pk', flat=True)
+        )
+
+    def move(self, bucket, target, batch_size, settle):
+        source = sharding.shard_of_bucket(bucket)
+        if source == target:
+            self.stdout.write(f'Корзина {bucket} уже на {target}')
+            return
+        started = time.monotonic()
+        namespaces = self.namespaces(bucket, source)
+        key = sharding.FROZEN_KEY.format(bucket=bucket)
+        cache.set(key, True, None)
+        # До конца чистки строки корзины лежат на двух шардах, и запросы
+        # по всем шардам читают только владельца корзины. Отметка
+        # остается, если перенос прервался: остатки не попадут в ленты.
+        self.mark_moving(bucket, True)
+        try:
+            # Записи, начатые до заморозки, успевают закончиться,
+            # а процессы - увидеть отметку.
+            time.sleep(settle)
+            with transaction.atomic(using=target):
+                posts, comments = self.copy(
+                    bucket, source, target, batch_size
+                )
+            ShardBucket.objects.update_or_create(
+                bucket=bucket, defaults={'alias': target}
+            )
+            self.publish()
+            feed_cache.bump(*namespaces)
+            # Старый шард удаляется, когда все процессы читают новый.
+            time.sleep(settle)
+        finally:
+            cache.delete(key)
+        self.purge(bucket, source, batch_size)
+        self.mark_moving(bucket, False)
+        feed_cache.bump(*namespaces)
+        self.stdout.write(
+            f'Корзина {bucket}: {source} -> {target}, постов {posts}, '
+            f'комментариев {comments}, '
+            f'{time.monotonic() - started:.1f} с'
+        )
+
+    def copy(self, bucket, source, target, batch_size):
+        posts = comments = 0
+        for authors in chunks(self.authors(bucket), batch_size):
+            queryset = Post.objects.using(source).filter(
+                author_id__in=authors
+            )
+            for batch in batches(queryset, batch_size):
+                ids = [post.pk for post in batch]
+                # Остатки прерванного переноса.
+                Comment.objects.using(target).filter(
+                    post_id__in=ids
+                )._raw_delete(target)
+                Post.objects.using(target).filter(
+                    pk__in=ids
+                )._raw_delete(target)
+                Post.objects.using(target).bulk_create(batch)
+                posts += len(batch)
+                related = Comment.objects.using(source).filter(
+                    post_id__in=ids
+                )
+                for comment_batch in batches(related, batch_size):
+                    Comment.objects.using(target).bulk_create(comment_batch)
+                    comments += len(comment_batch)
+        ShardSequence.objects.using(target).filter(bucket=bucket).delete()
+        sequence = ShardSequence.objects.using(source).filter(
+            bucket=bucket
+        ).first()
+        if sequence is not None:
+            sequence.save(using=target, force_insert=True)
+        return posts, comments
+
+    def purge(self, bucket, source, batch_size):
+        for authors in chunks(self.authors(bucket), batch_size):
+            queryset = Post.objects.using(source).filter(
+                author_id__in=authors
+            )
+            while True:
+                ids = list(queryset.values_list('pk', flat=True)[:batch_size])
+                if not ids:
+                    break
+                with transaction.atomic(using=source):
+                    Comment.objects.using(source).filter(
+                        post_id__in=ids
+                    )._raw_delete(source)
+                    Post.objects.using(source).filter(
+                        pk__in=ids
+                    )._raw_delete(source)
+        ShardSequence.objects.using(source).filter(bucket=bucket).delete()
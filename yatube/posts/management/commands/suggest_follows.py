@@ -0,0 +1,95 @@
+import multiprocessing
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from posts import follow_graph, suggestions
+
+# Граф для дочерних процессов: при fork они получают его без копирования.
+_job = {}
+
+
+def compute(user_ids):
+    graph, options = _job['graph'], _job['options']
+    return {
+        user_id: suggestions.suggest(
+            graph, user_id, options['top'], options['score'],
+            options['max_degree'],
+        )
+        for user_id in user_ids
+    }
+
+
+class Command(BaseCommand):
+    help = 'Пересчитывает рекомендации «на кого подписаться»'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--score', choices=suggestions.SCORES, default='adamic-adar',
+            help='Оценка кандидатов, см. posts/suggestions.py',
+        )
+        parser.add_argument(
+            '--top', type=int,
+            default=getattr(settings, 'FOLLOW_SUGGESTIONS_TOP', 20),
+            help='Сколько рекомендаций хранить на пользователя',
+        )
+        parser.add_argument(
+            '--max-degree', type=int, default=5000,
+            help='Не считать посредниками подписанных на большее число '
+                 'авторов, 0 - без ограничения',
+        )
+        parser.add_argument(
+            '--chunk-size', type=int, default=1000,
+            help='Сколько пользователей считать и записывать за раз',
+        )
+        parser.add_argument(
+            '--workers', type=int, default=1,
+            help='Число процессов для расчета',
+        )
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        graph = follow_graph.build()
+        self.stdout.write(
+            f'граф загружен за {time.perf_counter() - started:.1f} с'
+        )
+        user_ids = graph.following.compact().keys
+        chunk_size = options['chunk_size']
+        chunks = [
+            user_ids[start:start + chunk_size]
+            for start in range(0, len(user_ids), chunk_size)
+        ]
+        _job.update(graph=graph, options=options)
+        started = time.perf_counter()
+        written = 0
+        pool = None
+        if options['workers'] > 1:
+            pool = multiprocessing.get_context('fork').Pool(
+                options['workers']
+            )
+            results = pool.imap(compute, chunks)
+        else:
+            results = map(compute, chunks)
+        try:
+            for index, result in enumerate(results):
+                # Диапазоны соседних пачек стыкуются, первая и последняя
+                # открыты: так удаляются строки пользователей, которые
+                # больше ни на кого не подписаны.
+                low = chunks[index][0] if index else None
+                high = (
+                    chunks[index + 1][0] - 1
+                    if index + 1 < len(chunks) else None
+                )
+                written += suggestions.store(result, low, high)
+        finally:
+            if pool is not None:
+                pool.close()
+                pool.join()
+            _job.clear()
+        if not chunks:
+            suggestions.store({}, None, None)
+        self.stdout.write(
+            f'пользователей: {len(user_ids)}, рекомендаций: {written}, '
+            f'расчет за {time.perf_counter() - started:.1f} с'
+        )
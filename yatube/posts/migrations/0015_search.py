@@ -0,0 +1,32 @@
+from django.db import migrations
+
+CREATE_INDEX = """
+CREATE VIRTUAL TABLE posts_search USING fts5(
+    text,
+    kind UNINDEXED,
+    post_id UNINDEXED,
+    tokenize = 'unicode61 remove_diacritics 2',
+    prefix = '2 3 4'
+)
+"""
+
+FILL_INDEX = """
+INSERT INTO posts_search (rowid, text, kind, post_id)
+SELECT id * 2, text, 'post', id FROM posts_post
+UNION ALL
+SELECT id * 2 + 1, text, 'comment', post_id FROM posts_comment
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0014_feed_indexes'),
+    ]
+
+    operations = [
+        migrations.RunSQL(
+            [CREATE_INDEX, FILL_INDEX],
+            'DROP TABLE posts_search',
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 3.2 on 2026-10-17 18:38
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0015_search'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='post',
+            name='image_variants',
+            field=models.JSONField(blank=True, default=dict, editable=False, help_text='Ширины и форматы, созданные posts.variants', verbose_name='Варианты картинки'),
+        ),
+    ]
@@ -0,0 +1,59 @@
+# Generated by Django 3.2 on 2026-10-17 19:00
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('posts', '0017_media_blobs'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ShardBucket',
+            fields=[
+                ('bucket', models.PositiveIntegerField(primary_key=True, serialize=False, verbose_name='Корзина')),
+                ('alias', models.CharField(max_length=100, verbose_name='Шард')),
+            ],
+            options={
+                'verbose_name': 'Корзина шарда',
+                'verbose_name_plural': 'Корзины шардов',
+            },
+        ),
+        migrations.CreateModel(
+            name='ShardSequence',
+            fields=[
+                ('bucket', models.PositiveIntegerField(primary_key=True, serialize=False, verbose_name='Корзина')),
+                ('posts', models.PositiveBigIntegerField(default=0, verbose_name='Выдано id постов')),
+                ('comments', models.PositiveBigIntegerField(default=0, verbose_name='Выдано id комментариев')),
+            ],
+            options={
+                'verbose_name': 'Счетчик корзины',
+                'verbose_name_plural': 'Счетчики корзин',
+            },
+        ),
+        migrations.AlterField(
+            model_name='comment',
+            name='author',
+            field=models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.CASCADE, related_name='comments', to=settings.AUTH_USER_MODEL, verbose_name='Автор'),
+        ),
+        migrations.AlterField(
+            model_name='post',
+            name='author',
+            field=models.ForeignKey(db_constraint=False, db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='posts', to=settings.AUTH_USER_MODEL, verbose_name='Автор'),
+        ),
+        migrations.AlterField(
+            model_name='post',
+            name='group',
+            field=models.ForeignKey(blank=True, db_constraint=False, db_index=False, help_text='Группа, к которой будет относиться пост', null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='gr_posts', to='posts.group', verbose_name='Группа'),
+        ),
+        migrations.AlterField(
+            model_name='timelineentry',
+            name='post',
+            field=models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.DO_NOTHING, related_name='timeline_entries', to='posts.post', verbose_name='Пост'),
+        ),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 3.2 on 2026-10-17 19:09
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0018_sharding'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='FollowEvent',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('user_id', models.IntegerField(verbose_name='Подписчик')),
+                ('author_id', models.IntegerField(verbose_name='Наблюдаемый')),
+                ('followed', models.BooleanField(verbose_name='Подписка')),
+                ('created', models.DateTimeField(auto_now_add=True, verbose_name='Создано')),
+            ],
+            options={
+                'verbose_name': 'Событие подписки',
+                'verbose_name_plural': 'События подписок',
+            },
+        ),
+    ]
@@ -0,0 +1,60 @@
+# Generated by Django 3.2 on 2026-10-17 19:14
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0020_follow_suggestions'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TrendingCursor',
+            fields=[
+                ('source', models.CharField(max_length=50, primary_key=True, serialize=False, verbose_name='Журнал')),
+                ('last_id', models.BigIntegerField(default=0, verbose_name='Последний id')),
+                ('updated', models.DateTimeField(verbose_name='Обновлен')),
+            ],
+            options={
+                'verbose_name': 'Позиция расчета популярности',
+                'verbose_name_plural': 'Позиции расчета популярности',
+            },
+        ),
+        migrations.CreateModel(
+            name='TrendingEvent',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('view', 'Просмотры'), ('comment', 'Комментарий')], max_length=10, verbose_name='Тип')),
+                ('post_id', models.BigIntegerField(verbose_name='Пост')),
+                ('count', models.PositiveIntegerField(default=1, verbose_name='Число')),
+                ('created', models.DateTimeField(auto_now_add=True, verbose_name='Создано')),
+            ],
+            options={
+                'verbose_name': 'Событие популярности',
+                'verbose_name_plural': 'События популярности',
+            },
+        ),
+        migrations.CreateModel(
+            name='TrendingScore',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('post', 'Пост'), ('group', 'Группа'), ('author', 'Автор')], max_length=10, verbose_name='Тип')),
+                ('object_id', models.BigIntegerField(verbose_name='Объект')),
+                ('score', models.FloatField(verbose_name='Оценка')),
+            ],
+            options={
+                'verbose_name': 'Оценка популярности',
+                'verbose_name_plural': 'Оценки популярности',
+            },
+        ),
+        migrations.AddIndex(
+            model_name='trendingscore',
+            index=models.Index(fields=['kind', 'score'], name='trending_kind_score_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='trendingscore',
+            constraint=models.UniqueConstraint(fields=('kind', 'object_id'), name='unique_trending_score'),
+        ),
+    ]
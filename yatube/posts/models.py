@@ -1,5 +1,10 @@
 from django.contrib.auth import get_user_model
-from django.db import models
+from django.db import models, transaction
+
+from core.storages.content_addressed import media_storage
+
+from . import sharding
+from .sharding import ShardedManager
 
 User = get_user_model()
 
@@ -8,6 +13,11 @@ class Group(models.Model):
     title = models.CharField(max_length=200)
     slug = models.SlugField(unique=True, null=True)
     description = models.TextField()
+    posts_count = models.PositiveIntegerField(
+        'Число постов',
+        default=0,
+        editable=False
+    )
 
     def __str__(self) -> str:
         return f'{self.title}'
@@ -22,9 +32,13 @@ class Post(models.Model):
         'Дата публикации',
         auto_now_add=True
     )
+    # На дополнительных шардах (см. posts.sharding) нет пользователей
+    # и групп: там ограничений внешних ключей в БД нет, а удаление
+    # автора или группы обходит шарды в posts.signals.
     author = models.ForeignKey(
         User,
         on_delete=models.CASCADE,
+        db_index=False,
         related_name='posts',
         verbose_name='Автор'
     )
@@ -33,6 +47,7 @@ class Post(models.Model):
         blank=True,
         null=True,
         on_delete=models.SET_NULL,
+        db_index=False,
         related_name='gr_posts',
         verbose_name='Группа',
         help_text='Группа, к которой будет относиться пост'
@@ -40,21 +55,63 @@ class Post(models.Model):
     image = models.ImageField(
         verbose_name='Картинка',
         upload_to='posts/',
+        storage=media_storage,
         blank=True,
         null=True
     )
+    image_variants = models.JSONField(
+        'Варианты картинки',
+        default=dict,
+        blank=True,
+        editable=False,
+        help_text='Ширины и форматы, созданные posts.variants'
+    )
+    comments_count = models.PositiveIntegerField(
+        'Число комментариев',
+        default=0,
+        editable=False
+    )
 
     class Meta:
         ordering = ('-pub_date',)
+        # Индексы повторяют порядок сортировки лент, поэтому
+        # отдельные индексы внешних ключей author и group не нужны.
+        indexes = [
+            models.Index(
+                fields=('pub_date', 'id'), name='post_pub_date_id_idx'
+            ),
+            models.Index(
+                fields=('author', 'pub_date', 'id'),
+                name='post_author_pub_date_idx'
+            ),
+            models.Index(
+                fields=('group', 'pub_date', 'id'),
+                name='post_group_pub_date_idx'
+            ),
+        ]
+
+    objects = ShardedManager()
 
     def __str__(self):
         return self.text
 
+    def save(self, *args, **kwargs):
+        # Счетчики обновляются сигналами в той же транзакции.
+        using = kwargs.get('using') or sharding.writer_for(self)
+        with transaction.atomic(using=using):
+            sharding.before_write(self, using, kwargs)
+            super().save(*args, **kwargs)
+
+    def delete(self, *args, **kwargs):
+        sharding.before_write(self)
+        return super().delete(*args, **kwargs)
+
 
 class Comment(models.Model):
     post = models.ForeignKey(
         Post,
         on_delete=models.CASCADE,
+        db_index=False,
         related_name='comments',
     )
     author = models.ForeignKey(
@@ -74,10 +131,27 @@ class Comment(models.Model):
         ordering = ('-created',)
         verbose_name = 'Комментарий'
         verbose_name_plural = 'Комментарии'
+        indexes = [
+            models.Index(
+                fields=('post', 'created'), name='comment_post_created_idx'
+            ),
+        ]
+
+    objects = ShardedManager()
 
     def __str__(self):
         return self.text[:15]
 
+    def save(self, *args, **kwargs):
+        using = kwargs.get('using') or sharding.writer_for(self)
+        with transaction.atomic(using=using):
+            sharding.before_write(self, using, kwargs)
+            super().save(*args, **kwargs)
+
+    def delete(self, *args, **kwargs):
+        sharding.before_write(self)
+        return super().delete(*args, **kwargs)
+
 
 class Follow(models.Model):
     user = models.ForeignKey(
@@ -89,6 +163,7 @@ class Follow(models.Model):
     author = models.ForeignKey(
         User,
         on_delete=models.CASCADE,
+        db_index=False,
         related_name='following',
         verbose_name='Наблюдаемый'
     )
@@ -99,3 +174,246 @@ class Follow(models.Model):
                 fields=['user', 'author'], name='unique_follow'
             )
         ]
+        indexes = [
+            models.Index(
+                fields=('author', 'user'), name='follow_author_user_idx'
+            ),
+        ]
+
+    def save(self, *args, **kwargs):
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+
+
+class FollowEvent(models.Model):
+    """Журнал подписок и отписок.
+    По нему процессы обновляют граф подписок в памяти,
+    см. posts.follow_graph. Старые события удаляет команда
+    follow_graph --prune после записи снимка.
+    """
+    user_id = models.IntegerField('Подписчик')
+    author_id = models.IntegerField('Наблюдаемый')
+    followed = models.BooleanField('Подписка')
+    created = models.DateTimeField('Создано', auto_now_add=True)
+
+    class Meta:
+        verbose_name = 'Событие подписки'
+        verbose_name_plural = 'События подписок'
+
+
+class FollowSuggestion(models.Model):
+    """Рекомендованный автор для подписки.
+    Пересчитывается командой suggest_follows, см. posts.suggestions.
+    """
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        db_index=False,
+        related_name='follow_suggestions',
+        verbose_name='Читатель'
+    )
+    author = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='+',
+        verbose_name='Автор'
+    )
+    score = models.FloatField('Оценка')
+    rank = models.PositiveSmallIntegerField('Место')
+
+    class Meta:
+        verbose_name = 'Рекомендация подписки'
+        verbose_name_plural = 'Рекомендации подписок'
+        # Ограничение служит и индексом для чтения по порядку мест.
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'rank'], name='unique_suggestion_rank'
+            )
+        ]
+
+
+class UserStats(models.Model):
+    """Денормализованные счетчики пользователя.
+    Поддерживаются сигналами при создании и удалении Post и Follow,
+    чтобы страницы не считали COUNT(*) на каждый просмотр.
+    Расхождения исправляет команда repair_counters.
+    """
+    user = models.OneToOneField(
+        User,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='stats',
+        verbose_name='Пользователь'
+    )
+    posts_count = models.PositiveIntegerField('Число постов', default=0)
+    followers_count = models.PositiveIntegerField(
+        'Число подписчиков', default=0
+    )
+    following_count = models.PositiveIntegerField('Число подписок', default=0)
+
+    class Meta:
+        verbose_name = 'Счетчики пользователя'
+        verbose_name_plural = 'Счетчики пользователей'
+
+
+class TimelineEntry(models.Model):
+    """Запись материализованной ленты подписок пользователя.
+    Заполняется при публикации поста (fan-out on write),
+    чтобы follow_index читал готовую ленту, а не соединял
+    Follow и Post на каждый запрос.
+    """
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='timeline',
+        verbose_name='Читатель'
+    )
+    # Пост может лежать на другом шарде: записи ленты удаляет
+    # сигнал posts.signals.forget_deleted_post.
+    post = models.ForeignKey(
+        Post,
+        on_delete=models.DO_NOTHING,
+        db_constraint=False,
+        related_name='timeline_entries',
+        verbose_name='Пост'
+    )
+    # Копия Post.pub_date: лента сортируется по индексу этой таблицы.
+    pub_date = models.DateTimeField('Дата публикации', null=True)
+
+    class Meta:
+        verbose_name = 'Запись ленты'
+        verbose_name_plural = 'Записи ленты'
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'post'], name='unique_timeline_entry'
+            )
+        ]
+        indexes = [
+            models.Index(
+                fields=('user', 'pub_date', 'post'),
+                name='timeline_user_pub_date_idx'
+            ),
+        ]
+
+
+class PopularAuthor(models.Model):
+    """Автор, посты которого не раскладываются по лентам подписчиков.
+    У таких авторов слишком много подписчиков для fan-out,
+    поэтому их посты подмешиваются в ленту при чтении.
+    """
+    author = models.OneToOneField(
+        User,
+        on_delete=models.CASCADE,
+        related_name='popular',
+        verbose_name='Автор'
+    )
+
+    class Meta:
+        verbose_name = 'Популярный автор'
+        verbose_name_plural = 'Популярные авторы'
+
+
+class MediaBlob(models.Model):
+    """Файл в хранилище с адресацией по содержимому и число ссылок
+    на него из Post.image. Счетчик поддерживается сигналами,
+    блобы без ссылок удаляет команда collect_media.
+    """
+    digest = models.CharField('SHA-256', max_length=64, primary_key=True)
+    name = models.CharField('Имя файла', max_length=255, unique=True)
+    size = models.PositiveBigIntegerField('Размер', default=0)
+    refcount = models.PositiveIntegerField('Число ссылок', default=0)
+    updated = models.DateTimeField('Изменен', auto_now=True)
+
+    class Meta:
+        verbose_name = 'Медиафайл'
+        verbose_name_plural = 'Медиафайлы'
+        indexes = [
+            models.Index(
+                fields=('refcount', 'updated'), name='blob_refcount_idx'
+            ),
+        ]
+
+
+class ShardBucket(models.Model):
+    """Корзина авторов, перенесенная командой reshard на другой шард.
+    Хранится в default. Корзины без строки размещаются по кругу,
+    см. posts.sharding.shard_of_bucket.
+    """
+    bucket = models.PositiveIntegerField('Корзина', primary_key=True)
+    alias = models.CharField('Шард', max_length=100)
+
+    class Meta:
+        verbose_name = 'Корзина шарда'
+        verbose_name_plural = 'Корзины шардов'
+
+
+class ShardSequence(models.Model):
+    """Счетчики id постов и комментариев корзины.
+    Лежит на шарде корзины и переезжает вместе с ней.
+    """
+    bucket = models.PositiveIntegerField('Корзина', primary_key=True)
+    posts = models.PositiveBigIntegerField('Выдано id постов', default=0)
+    comments = models.PositiveBigIntegerField(
+        'Выдано id комментариев', default=0
+    )
+
+    class Meta:
+        verbose_name = 'Счетчик корзины'
+        verbose_name_plural = 'Счетчики корзин'
+
+
+class TrendingEvent(models.Model):
+    """Просмотр или комментарий поста для расчета популярности.
+    Очередь: команда refresh_trending обрабатывает события
+    и удаляет их, см. posts.trending.
+    """
+    VIEW = 'view'
+    COMMENT = 'comment'
+    KINDS = ((VIEW, 'Просмотры'), (COMMENT, 'Комментарий'))
+
+    kind = models.CharField('Тип', max_length=10, choices=KINDS)
+    post_id = models.BigIntegerField('Пост')
+    # Просмотры копятся в процессе и пишутся одной строкой на пост.
+    count = models.PositiveIntegerField('Число', default=1)
+    created = models.DateTimeField('Создано', auto_now_add=True)
+
+    class Meta:
+        verbose_name = 'Событие популярности'
+        verbose_name_plural = 'События популярности'
+
+
+class TrendingScore(models.Model):
+    """Затухающая оценка популярности поста, группы или автора."""
+    POST = 'post'
+    GROUP = 'group'
+    AUTHOR = 'author'
+    KINDS = ((POST, 'Пост'), (GROUP, 'Группа'), (AUTHOR, 'Автор'))
+
+    kind = models.CharField('Тип', max_length=10, choices=KINDS)
+    object_id = models.BigIntegerField('Объект')
+    score = models.FloatField('Оценка')
+
+    class Meta:
+        verbose_name = 'Оценка популярности'
+        verbose_name_plural = 'Оценки популярности'
+        constraints = [
+            models.UniqueConstraint(
+                fields=['kind', 'object_id'], name='unique_trending_score'
+            )
+        ]
+        indexes = [
+            models.Index(
+                fields=('kind', 'score'), name='trending_kind_score_idx'
+            ),
+        ]
+
+
+class TrendingCursor(models.Model):
+    """Докуда refresh_trending обработал журнал и когда."""
+    source = models.CharField('Журнал', max_length=50, primary_key=True)
+    last_id = models.BigIntegerField('Последний id', default=0)
+    updated = models.DateTimeField('Обновлен')
+
+    class Meta:
+        verbose_name = 'Позиция расчета популярности'
+        verbose_name_plural = 'Позиции расчета популярности'
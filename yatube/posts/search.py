@@ -0,0 +1,316 @@
+import base64
+import binascii
+import re
+from typing import Iterator, NamedTuple, Optional
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import QuerySet
+from django.db.models.expressions import RawSQL
+from django.utils.html import escape
+from django.utils.safestring import mark_safe
+
+from . import sharding
+from .models import Comment, Post
+
+# Виртуальная таблица FTS5 создается миграцией 0015_search.
+# rowid строки однозначно задает объект: у постов он четный,
+# у комментариев нечетный, поэтому обновление и удаление
+# не требуют поиска по неиндексированным колонкам.
+TABLE = 'posts_search'
+KIND_POST = 'post'
+KIND_COMMENT = 'comment'
+
+# Маркеры совпадений внутри snippet(). Текст экранируется
+# уже после выборки, а маркеры затем заменяются на <mark>.
+MARK_START = '\x02'
+MARK_END = '\x03'
+SNIPPET_TOKENS = 24
+MAX_TERMS = 10
+
+WORD = re.compile(r'\w+')
+
+
+class SearchHit(NamedTuple):
+    post: Post
+    kind: str
+    snippet: str
+
+
+class SearchPage:
+    """Страница результатов поиска.
+    Сортировка идет по BM25, поэтому номеров страниц нет: как и
+    CursorPage, страница отдает токен следующей страницы.
+    """
+
+    def __init__(self, hits, cursor, next_cursor):
+        self.object_list = hits
+        self.cursor = cursor
+        self.next_cursor = next_cursor
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def has_next(self):
+        return self.next_cursor is not None
+
+    def has_previous(self):
+        return self.cursor is not None
+
+
+def post_rowid(pk: int) -> int:
+    return pk * 2
+
+
+def comment_rowid(pk: int) -> int:
+    return pk * 2 + 1
+
+
+def match_expression(query: str) -> Optional[str]:
+    """Превращает пользовательский ввод в выражение MATCH.
+    Операторы FTS5 из ввода не пропускаются: каждое слово берется
+    в кавычки и ищется по префиксу, слова объединяются через AND.
+    """
+    terms = WORD.findall(query.lower())[:MAX_TERMS]
+    if not terms:
+        return None
+    return ' '.join(f'"{term}"*' for term in terms)
+
+
+def _write(rowid: int, text: str, kind: str, post_id: int,
+           created: bool) -> None:
+    with connection.cursor() as cursor:
+        if not created:
+            cursor.execute(f'DELETE FROM {TABLE} WHERE rowid = %s', [rowid])
+        cursor.execute(
+            f'INSERT INTO {TABLE} (rowid, text, kind, post_id) '
+            f'VALUES (%s, %s, %s, %s)',
+            [rowid, text, kind, post_id],
+        )
+
+
+def _remove(rowid: int) -> None:
+    with connection.cursor() as cursor:
+        cursor.execute(f'DELETE FROM {TABLE} WHERE rowid = %s', [rowid])
+
+
+def index_post(post: Post, created: bool = False) -> None:
+    _write(post_rowid(post.pk), post.text, KIND_POST, post.pk, created)
+
+
+def unindex_post(pk: int) -> None:
+    _remove(post_rowid(pk))
+
+
+def index_comment(comment: Comment, created: bool = False) -> None:
+    _write(
+        comment_rowid(comment.pk), comment.text, KIND_COMMENT,
+        comment.post_id, created
+    )
+
+
+def unindex_comment(pk: int) -> None:
+    _remove(comment_rowid(pk))
+
+
+def encode_cursor(score: float, rowid: int, floor: int) -> str:
+    raw = f'{score!r}|{rowid}|{floor}'.encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_cursor(token: str) -> Optional[tuple]:
+    """Распаковывает токен в (score, rowid, floor) или None."""
+    try:
+        padded = token + '=' * (-len(token) % 4)
+        raw = base64.urlsafe_b64decode(padded).decode()
+        score, rowid, floor = raw.split('|')
+        return float(score), int(rowid), int(floor)
+    except (binascii.Error, UnicodeError, ValueError):
+        return None
+
+
+def highlight(snippet: str) -> str:
+    return mark_safe(
+        escape(snippet)
+        .replace(MARK_START, '<mark>')
+        .replace(MARK_END, '</mark>')
+    )
+
+
+def window() -> int:
+    return getattr(settings, 'SEARCH_RANK_WINDOW', 2000)
+
+
+def _floor(expression: str) -> Optional[int]:
+    """Наименьший rowid среди window() самых новых совпадений.
+    BM25 считается для каждого совпадения, поэтому частое слово
+    на миллионе постов ранжировалось бы секундами. Ранжируются
+    только новейшие совпадения: их FTS5 отдает по убыванию rowid
+    и останавливается на LIMIT. Для редких слов окно покрывает
+    все совпадения и порядок не отличается от полного.
+    """
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'SELECT MIN(id) FROM ('
+            f'SELECT rowid AS id FROM {TABLE} WHERE {TABLE} MATCH %s '
+            f'ORDER BY rowid DESC LIMIT %s)',
+            [expression, window()],
+        )
+        return cursor.fetchone()[0]
+
+
+def _ranked(expression: str, floor: int, position: Optional[tuple],
+            limit: int):
+    """Строки индекса по возрастанию bm25 (лучшие первыми).
+    Keyset-пагинация идет по паре (rank, rowid); rank нельзя
+    сравнивать прямо в WHERE запроса к FTS5, поэтому условие
+    накладывается на подзапрос.
+    """
+    sql = (
+        f'SELECT * FROM ('
+        f'SELECT rowid AS id, kind, post_id, rank AS score, '
+        f"snippet({TABLE}, 0, %s, %s, '…', %s) AS fragment "
+        f'FROM {TABLE} WHERE {TABLE} MATCH %s AND rowid >= %s)'
+    )
+    params = [MARK_START, MARK_END, SNIPPET_TOKENS, expression, floor]
+    if position is not None:
+        sql += ' WHERE score > %s OR (score = %s AND id > %s)'
+        score, rowid = position
+        params += [score, score, rowid]
+    sql += ' ORDER BY score, id LIMIT %s'
+    params.append(limit)
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        return cursor.fetchall()
+
+
+def search(query: str, cursor: Optional[str], per_page: int) -> SearchPage:
+    """Ищет посты и комментарии, лучшие совпадения первыми.
+    Граница окна ранжирования запоминается в курсоре, чтобы
+    все страницы одной выдачи ранжировались по одному набору.
+    Посты найденных строк загружаются одним запросом.
+    """
+    expression = match_expression(query)
+    if expression is None:
+        return SearchPage([], None, None)
+    position = decode_cursor(cursor) if cursor else None
+    if position is None:
+        floor = _floor(expression)
+        if floor is None:
+            return SearchPage([], None, None)
+    else:
+        *position, floor = position
+    rows = _ranked(expression, floor, position, per_page + 1)
+    page, extra = rows[:per_page], rows[per_page:]
+    posts = Post.objects.select_related('author', 'group').in_bulk(
+        {row[2] for row in page}
+    )
+    hits = [
+        SearchHit(posts[post_id], kind, highlight(fragment))
+        for rowid, kind, post_id, score, fragment in page
+        if post_id in posts
+    ]
+    next_cursor = None
+    if extra:
+        last = page[-1]
+        next_cursor = encode_cursor(last[3], last[0], floor)
+    return SearchPage(hits, cursor if position else None, next_cursor)
+
+
+def like_search(query: str):
+    """Прежний поиск через LIKE '%…%', оставлен для сравнения."""
+    posts = Post.objects.select_related('author', 'group')
+    for term in WORD.findall(query)[:MAX_TERMS]:
+        posts = posts.filter(text__icontains=term)
+    return posts
+
+
+def filter_posts(posts: QuerySet, query: str) -> QuerySet:
+    """Оставляет в posts те, в тексте которых есть все слова запроса.
+    С одним шардом индекс читается подзапросом внутри того же
+    SQL-запроса. Индекс есть только в default, поэтому при нескольких
+    шардах id постов сначала читаются из него отдельно.
+    """
+    expression = match_expression(query)
+    if expression is None:
+        return posts.none()
+    sql = (
+        f'SELECT post_id FROM {TABLE} '
+        f'WHERE {TABLE} MATCH %s AND kind = %s'
+    )
+    params = [expression, KIND_POST]
+    if not sharding.enabled():
+        return posts.filter(pk__in=RawSQL(sql, params))
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        ids = [post_id for post_id, in cursor.fetchall()]
+    return posts.filter(pk__in=ids)
+
+
+def _chunks(rows: QuerySet, chunk_size: int) -> Iterator[list]:
+    """Пачки строк values_list, первым значением идет pk."""
+    last_pk = 0
+    while True:
+        chunk = list(rows.filter(pk__gt=last_pk).order_by('pk')[:chunk_size])
+        if not chunk:
+            return
+        last_pk = chunk[-1][0]
+        yield chunk
+
+
+def _replace(rows: QuerySet, chunk_size: int, rowid,
+             index_row) -> Iterator[int]:
+    """Заменяет строки индекса одного вида пачками по pk.
+    Строки вида лежат в своей четности rowid, и rowid растет вместе
+    с pk, поэтому строки пачки удаляются по диапазону rowid и пишутся
+    заново в одной транзакции: поиск все время видит полный индекс.
+    В конце удаляются строки за последним pk - удаленные объекты.
+    """
+    sql = (
+        f'INSERT INTO {TABLE} (rowid, text, kind, post_id) '
+        f'VALUES (%s, %s, %s, %s)'
+    )
+    delete = (
+        f'DELETE FROM {TABLE} WHERE rowid > %s AND rowid <= %s '
+        f'AND rowid %% 2 = %s'
+    )
+    start = parity = rowid(0)
+    for chunk in _chunks(rows, chunk_size):
+        end = rowid(chunk[-1][0])
+        with transaction.atomic(), connection.cursor() as cursor:
+            cursor.execute(delete, [start, end, parity])
+            cursor.executemany(sql, [index_row(*row) for row in chunk])
+        start = end
+        yield len(chunk)
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'DELETE FROM {TABLE} WHERE rowid > %s AND rowid %% 2 = %s',
+            [start, parity],
+        )
+
+
+def rebuild(chunk_size: int = 1000) -> Iterator[int]:
+    """Переиндексирует все посты и комментарии.
+    Каждая пачка пишется в своей транзакции, чтобы не держать
+    блокировку базы на все время перестроения, и заменяет только
+    свои строки, поэтому /search/ во время перестроения ищет
+    по полному индексу. Отдает размер каждой записанной пачки.
+    """
+    yield from _replace(
+        Post.objects.values_list('pk', 'text'), chunk_size, post_rowid,
+        lambda pk, text: (post_rowid(pk), text, KIND_POST, pk),
+    )
+    yield from _replace(
+        Comment.objects.values_list('pk', 'text', 'post_id'), chunk_size,
+        comment_rowid,
+        lambda pk, text, post_id: (
+            comment_rowid(pk), text, KIND_COMMENT, post_id
+        ),
+    )
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"INSERT INTO {TABLE} ({TABLE}) VALUES ('optimize')"
+        )
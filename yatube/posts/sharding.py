@@ -0,0 +1,624 @@
+"""Шардирование постов и комментариев по автору.
+
+Посты автора и комментарии к ним лежат в одной базе из POST_SHARDS.
+Автор попадает в виртуальную корзину author_id % POST_SHARD_BUCKETS,
+корзина - в шард: по таблице ShardBucket (ее меняет команда reshard),
+а если строки нет - по кругу. Переносится всегда корзина целиком.
+
+Новые посты и комментарии получают id с номером корзины:
+LEGACY_LIMIT + seq * POST_SHARD_BUCKETS + bucket, где seq - счетчик
+корзины (ShardSequence, переезжает вместе с ней). По такому id
+post_detail сразу знает шард. Посты со старыми id меньше LEGACY_LIMIT
+по id не адресуются и ищутся на всех шардах. Число корзин входит
+в id, поэтому после включения шардов его менять нельзя.
+
+С одним шардом (по умолчанию) все запросы идут как без шардов.
+ShardedQuerySet сам выбирает шард по pk, автору или посту, а запросы
+без такого фильтра (index, группы, лента подписок) выполняет на всех
+шардах и сливает результаты по сортировке запроса.
+"""
+import heapq
+import time
+from collections import defaultdict
+from functools import cmp_to_key
+from itertools import chain
+from typing import Optional
+
+from django.apps import apps
+from django.conf import settings
+from django.core.cache import cache
+from django.db import (DEFAULT_DB_ALIAS, NotSupportedError,
+                       OperationalError, connections, models)
+from django.db.models import (Count, F, Max, Min, Sum,
+                              prefetch_related_objects)
+from django.db.models.query import (FlatValuesListIterable, ModelIterable,
+                                    ValuesIterable, ValuesListIterable)
+
+# Граница id: меньшие id выданы до включения шардов.
+LEGACY_LIMIT = 1 << 40
+SHARDED = {'posts.post', 'posts.comment'}
+# Модели, таблицы которых создаются на шардах кроме default.
+SHARD_TABLES = {'post', 'comment', 'shardsequence'}
+
+MAP_VERSION_KEY = 'sharding:map-version'
+FROZEN_KEY = 'sharding:frozen:{bucket}'
+# Корзины, которые reshard сейчас переносит: их строки лежат на двух
+# шардах, и запросы по всем шардам читают только шард-владелец.
+MOVING_KEY = 'sharding:moving'
+
+# Как агрегаты отдельных шардов сводятся в общий результат.
+MERGE_AGGREGATES = {Max: max, Min: min, Sum: sum, Count: sum}
+
+
+class ShardFrozen(OperationalError):
+    """Корзина переносится на другой шард, запись в нее закрыта."""
+
+
+def shards() -> list:
+    return list(getattr(settings, 'POST_SHARDS', [DEFAULT_DB_ALIAS]))
+
+
+def enabled() -> bool:
+    return len(shards()) > 1
+
+
+def buckets() -> int:
+    return getattr(settings, 'POST_SHARD_BUCKETS', 1024)
+
+
+def bucket_of_author(author_id: int) -> int:
+    return int(author_id) % buckets()
+
+
+def bucket_of_post(post_id) -> Optional[int]:
+    """Корзина из id поста или None для старых id."""
+    post_id = int(post_id)
+    if post_id < LEGACY_LIMIT:
+        return None
+    return (post_id - LEGACY_LIMIT) % buckets()
+
+
+_directory = {
+    'version': None, 'checked': float('-inf'), 'map': {}, 'moving': (),
+}
+
+
+def reset_directory() -> None:
+    _directory.update(
+        version=None, checked=float('-inf'), map={}, moving=()
+    )
+
+
+def directory() -> dict:
+    """Перенесенные корзины: {bucket: alias}.
+    Таблица и список переносимых корзин читаются заново, когда reshard
+    меняет версию в кеше; версия проверяется не чаще раза
+    в POST_SHARD_MAP_TTL секунд.
+    """
+    now = time.monotonic()
+    if now - _directory['checked'] < getattr(
+        settings, 'POST_SHARD_MAP_TTL', 1
+    ):
+        return _directory['map']
+    version = cache.get(MAP_VERSION_KEY, 0)
+    if version != _directory['version']:
+        ShardBucket = apps.get_model('posts', 'ShardBucket')
+        _directory['map'] = dict(
+            ShardBucket.objects.using(DEFAULT_DB_ALIAS)
+            .values_list('bucket', 'alias')
+        )
+        _directory['moving'] = tuple(cache.get(MOVING_KEY) or ())
+        _directory['version'] = version
+    _directory['checked'] = now
+    return _directory['map']
+
+
+def moving() -> tuple:
+    """Корзины, которые сейчас переносятся, см. MOVING_KEY."""
+    directory()
+    return _directory['moving']
+
+
+def shard_of_bucket(bucket: int) -> str:
+    aliases = shards()
+    alias = directory().get(bucket)
+    if alias in aliases:
+        return alias
+    return aliases[bucket % len(aliases)]
+
+
+def shard_for_author(author_id: int) -> str:
+    return shard_of_bucket(bucket_of_author(author_id))
+
+
+def shard_for_post(post_id) -> Optional[str]:
+    """Шард поста по id или None, если пост надо искать везде."""
+    bucket = bucket_of_post(post_id)
+    return None if bucket is None else shard_of_bucket(bucket)
+
+
+def _key(value) -> Optional[int]:
+    """id из значения фильтра; для выражений (OuterRef и т. п.) None."""
+    if isinstance(value, models.Model):
+        value = value.pk
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def bucket_for(instance: models.Model) -> int:
+    """Корзина, в которой хранится пост или комментарий."""
+    if instance._meta.label_lower == 'posts.post':
+        return bucket_of_author(instance.author_id)
+    bucket = bucket_of_post(instance.post_id)
+    if bucket is not None:
+        return bucket
+    # Старый пост лежит в корзине своего автора.
+    if instance._meta.get_field('post').is_cached(instance):
+        return bucket_of_author(instance.post.author_id)
+    Post = apps.get_model('posts', 'Post')
+    return bucket_of_author(
+        Post.objects.filter(pk=instance.post_id)
+        .values_list('author_id', flat=True).get()
+    )
+
+
+def writer_for(instance: models.Model) -> str:
+    if not enabled():
+        return DEFAULT_DB_ALIAS
+    return shard_of_bucket(bucket_for(instance))
+
+
+def wait_writable(bucket: int) -> None:
+    """Ждет, пока reshard не закончит перенос корзины."""
+    key = FROZEN_KEY.format(bucket=bucket)
+    deadline = time.monotonic() + getattr(
+        settings, 'POST_SHARD_FREEZE_WAIT', 10
+    )
+    while cache.get(key):
+        if time.monotonic() >= deadline:
+            raise ShardFrozen(f'Корзина {bucket} переносится на другой шард')
+        time.sleep(0.05)
+
+
+def allocate_ids(objs: list, using: str) -> None:
+    """Выдает id новым объектам одной модели из счетчиков их корзин.
+    Счетчик корзины увеличивается одним запросом на всю пачку.
+    """
+    ShardSequence = apps.get_model('posts', 'ShardSequence')
+    is_post = objs[0]._meta.label_lower == 'posts.post'
+    column = 'posts' if is_post else 'comments'
+    by_bucket = defaultdict(list)
+    for obj in objs:
+        if obj.pk is None:
+            by_bucket[bucket_for(obj)].append(obj)
+    sql = (
+        f'INSERT INTO {ShardSequence._meta.db_table} '
+        f'(bucket, posts, comments) VALUES (%s, %s, %s) '
+        f'ON CONFLICT (bucket) DO UPDATE SET {column} = {column} + %s '
+        f'RETURNING {column}'
+    )
+    with connections[using].cursor() as cursor:
+        for bucket, group in by_bucket.items():
+            size = len(group)
+            cursor.execute(sql, [
+                bucket, size if is_post else 0, 0 if is_post else size, size
+            ])
+            last, = cursor.fetchone()
+            for seq, obj in enumerate(group, start=last - len(group) + 1):
+                obj.pk = LEGACY_LIMIT + seq * buckets() + bucket
+
+
+def before_write(instance: models.Model, using: str = None,
+                 save_kwargs: dict = None) -> None:
+    """Проверка корзины и выдача id перед записью поста или комментария.
+    Если id выдан здесь, в save_kwargs ставится force_insert:
+    иначе save сначала попробует UPDATE по новому id.
+    """
+    if not enabled():
+        return
+    wait_writable(bucket_for(instance))
+    if instance.pk is None:
+        allocate_ids([instance], using or writer_for(instance))
+        if save_kwargs is not None:
+            save_kwargs.setdefault('force_insert', True)
+
+
+def extra_shards() -> list:
+    return [alias for alias in shards() if alias != DEFAULT_DB_ALIAS]
+
+
+def delete_author(user_id: int) -> None:
+    """Удаляет посты и комментарии пользователя с дополнительных шардов.
+    В default их удаляет каскад Django, а на другие базы он не ходит.
+    """
+    Post = apps.get_model('posts', 'Post')
+    Comment = apps.get_model('posts', 'Comment')
+    for alias in extra_shards():
+        Comment.objects.using(alias).filter(author_id=user_id).delete()
+        Post.objects.using(alias).filter(author_id=user_id).delete()
+
+
+def detach_group(group_id: int) -> None:
+    """Убирает группу у постов на дополнительных шардах, см. delete_author."""
+    Post = apps.get_model('posts', 'Post')
+    for alias in extra_shards():
+        Post.objects.using(alias).filter(group_id=group_id).update(group=None)
+
+
+def db_for_instance(model, instance, write=False) -> Optional[str]:
+    """Шард для запроса к model, связанного с объектом instance.
+    Читать можно там, откуда объект загружен, а запись идет
+    туда, где сейчас его корзина.
+    """
+    label = instance._meta.label_lower
+    if label in SHARDED:
+        if instance._state.db and not instance._state.adding and not write:
+            return instance._state.db
+        return writer_for(instance)
+    if model._meta.label_lower == 'posts.post' and (
+        label == settings.AUTH_USER_MODEL.lower()
+    ):
+        return shard_for_author(instance.pk)
+    return None
+
+
+def _post_bucket(value) -> Optional[int]:
+    key = _key(value)
+    return None if key is None else bucket_of_post(key)
+
+
+def route(model, kwargs: dict) -> tuple:
+    """Шард и корзина по условиям filter() или (None, None)."""
+    if model._meta.label_lower == 'posts.post':
+        candidates = [
+            _post_bucket(kwargs.get('pk')), _post_bucket(kwargs.get('id'))
+        ]
+        for name in ('author', 'author_id'):
+            key = _key(kwargs.get(name))
+            if key is not None:
+                candidates.append(bucket_of_author(key))
+    else:
+        post = kwargs.get('post')
+        if isinstance(post, models.Model) and post._state.db:
+            return post._state.db, bucket_of_author(post.author_id)
+        candidates = [_post_bucket(post), _post_bucket(kwargs.get('post_id'))]
+    bucket = next(
+        (bucket for bucket in candidates if bucket is not None), None
+    )
+    if bucket is None:
+        return None, None
+    return shard_of_bucket(bucket), bucket
+
+
+def _related_paths(model, select_related) -> list:
+    """select_related() в виде путей для prefetch_related_objects."""
+    if select_related is True:
+        return [
+            field.name for field in model._meta.concrete_fields
+            if field.is_relation and not field.null
+        ]
+    paths = []
+    for name, nested in select_related.items():
+        children = _related_paths(None, nested) if nested else []
+        paths.extend(f'{name}__{child}' for child in children)
+        if not children:
+            paths.append(name)
+    return paths
+
+
+def _compare(directions):
+    def compare(left, right):
+        for a, b, descending in zip(left[0], right[0], directions):
+            if a == b:
+                continue
+            result = -1 if a < b else 1
+            return -result if descending else result
+        return 0
+    return cmp_to_key(compare)
+
+
+class ShardedQuerySet(models.QuerySet):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._shard_bucket = None
+
+    def _clone(self):
+        clone = super()._clone()
+        clone._shard_bucket = self._shard_bucket
+        return clone
+
+    def _filter_or_exclude(self, negate, args, kwargs):
+        clone = super()._filter_or_exclude(negate, args, kwargs)
+        if not negate and clone._db is None and enabled():
+            alias, bucket = route(self.model, kwargs)
+            if alias is not None:
+                clone = clone.using(alias)
+                clone._shard_bucket = bucket
+        return clone
+
+    def _target(self) -> Optional[str]:
+        """Шард запроса или None, если запрос идет на все шарды."""
+        if self._db is not None:
+            return self._db
+        instance = self._hints.get('instance')
+        if instance is not None:
+            return db_for_instance(self.model, instance)
+        return None
+
+    def _scattered(self) -> bool:
+        return enabled() and self._target() is None
+
+    def _unlimited(self, alias, owned=True):
+        clone = self._chain().using(alias)
+        clone.query.clear_limits()
+        return clone._owned(alias) if owned else clone
+
+    def _owned(self, alias):
+        """Без строк переносимых корзин, владелец которых - другой шард.
+        Пока reshard не удалил источник, такие строки лежат и там,
+        и на новом шарде, и ленты показали бы их дважды.
+        """
+        foreign = [
+            bucket for bucket in moving() if shard_of_bucket(bucket) != alias
+        ]
+        if not foreign:
+            return self
+        author = (
+            'author_id' if self.model._meta.label_lower == 'posts.post'
+            else 'post__author_id'
+        )
+        return self.alias(
+            shard_bucket=F(author) % buckets()
+        ).exclude(shard_bucket__in=foreign)
+
+    def _fetch_from(self, alias) -> list:
+        """Строки одного шарда. На шардах нет таблиц пользователей
+        и групп, поэтому select_related там заменяется на prefetch
+        из default.
+        """
+        clone = self._chain().using(alias)
+        clone._prefetch_related_lookups = ()
+        paths = []
+        if (alias != DEFAULT_DB_ALIAS and clone.query.select_related
+                and clone._iterable_class is ModelIterable):
+            paths = _related_paths(self.model, clone.query.select_related)
+            clone = clone.select_related(None)
+        rows = list(clone)
+        if paths:
+            prefetch_related_objects(rows, *paths)
+        return rows
+
+    def _ordering(self) -> list:
+        """Сортировка запроса в виде [(поле, по убыванию)]."""
+        query = self.query
+        if query.extra_order_by:
+            raise NotSupportedError('extra(order_by) на нескольких шардах')
+        names = query.order_by or (
+            self.model._meta.ordering if query.default_ordering else ()
+        )
+        ordering = []
+        for name in names:
+            if not isinstance(name, str) or '__' in name or name == '?':
+                raise NotSupportedError(
+                    f'Сортировка {name!r} на нескольких шардах'
+                )
+            descending = name.startswith('-')
+            ordering.append((name.lstrip('-'), descending))
+        return ordering
+
+    def _keyed(self, alias, names) -> list:
+        """Строки шарда в виде (ключ сортировки, строка)."""
+        if self._iterable_class is ModelIterable:
+            attnames = []
+            for name in names:
+                try:
+                    attnames.append(self.model._meta.get_field(name).attname)
+                except Exception:
+                    attnames.append(name)
+            return [
+                (tuple(getattr(row, name) for name in attnames), row)
+                for row in self._fetch_from(alias)
+            ]
+        if not names:
+            return [((), row) for row in self._fetch_from(alias)]
+        fields = list(self._fields)
+        if not fields or self._iterable_class not in (
+            ValuesIterable, ValuesListIterable, FlatValuesListIterable
+        ):
+            raise NotSupportedError(
+                'Сортировка таких строк на нескольких шардах'
+            )
+        # Поля сортировки добавляются к выборке и потом убираются.
+        extra = [name for name in names if name not in fields]
+        if self._iterable_class is ValuesIterable:
+            clone = self.values(*fields, *extra)
+            return [
+                (tuple(row[name] for name in names),
+                 {name: row[name] for name in fields})
+                for row in clone._fetch_from(alias)
+            ]
+        clone = self.values_list(*fields, *extra)
+        columns = fields + extra
+        flat = self._iterable_class is FlatValuesListIterable
+        return [
+            (tuple(row[columns.index(name)] for name in names),
+             row[0] if flat else row[:len(fields)])
+            for row in clone._fetch_from(alias)
+        ]
+
+    def _gather(self) -> list:
+        """Scatter-gather: запрос на каждом шарде и слияние по сортировке.
+        С каждого шарда берется не больше high_mark строк, поэтому
+        страница ленты читается по индексу на каждом шарде.
+        """
+        low, high = self.query.low_mark, self.query.high_mark
+        ordering = self._ordering()
+        names = [name for name, _ in ordering]
+        parts = []
+        for alias in shards():
+            clone = self._unlimited(alias)
+            if high is not None:
+                clone.query.set_limits(high=high)
+            parts.append(clone._keyed(alias, names))
+        if ordering:
+            rows = heapq.merge(
+                *parts, key=_compare([desc for _, desc in ordering])
+            )
+        else:
+            rows = chain(*parts)
+        return [row for _, row in rows][low:high]
+
+    def _fetch_all(self):
+        if self._result_cache is None and enabled():
+            target = self._target()
+            if target is None:
+                self._result_cache = self._gather()
+            elif target != DEFAULT_DB_ALIAS and self.query.select_related:
+                self._result_cache = self._fetch_from(target)
+        super()._fetch_all()
+
+    def _iterate(self, alias, chunk_size):
+        if alias != DEFAULT_DB_ALIAS and self.query.select_related:
+            return iter(self._fetch_from(alias))
+        return super(ShardedQuerySet, self.using(alias)).iterator(chunk_size)
+
+    def iterator(self, chunk_size=2000):
+        if not enabled():
+            return super().iterator(chunk_size)
+        target = self._target()
+        if target is not None:
+            return self._iterate(target, chunk_size)
+        if self.query.is_sliced:
+            return iter(self._gather())
+        # Порядок сохраняется только внутри шарда.
+        return chain.from_iterable(
+            self._unlimited(alias)._iterate(alias, chunk_size)
+            for alias in shards()
+        )
+
+    def count(self):
+        if self._result_cache is not None or not self._scattered():
+            return super().count()
+        total = sum(self._unlimited(alias).count() for alias in shards())
+        low, high = self.query.low_mark, self.query.high_mark
+        if high is not None:
+            total = min(total, high)
+        return max(0, total - low)
+
+    def exists(self):
+        if self._result_cache is not None or not self._scattered():
+            return super().exists()
+        return any(self._unlimited(alias).exists() for alias in shards())
+
+    def aggregate(self, *args, **kwargs):
+        if not self._scattered():
+            return super().aggregate(*args, **kwargs)
+        for arg in args:
+            kwargs[arg.default_alias] = arg
+        for name, aggregate in kwargs.items():
+            if type(aggregate) not in MERGE_AGGREGATES or getattr(
+                aggregate, 'distinct', False
+            ):
+                raise NotSupportedError(
+                    f'Агрегат {name} на нескольких шардах'
+                )
+        results = [
+            self._unlimited(alias).aggregate(**kwargs) for alias in shards()
+        ]
+        merged = {}
+        for name, aggregate in kwargs.items():
+            values = [
+                result[name] for result in results
+                if result[name] is not None
+            ]
+            merged[name] = (
+                MERGE_AGGREGATES[type(aggregate)](values) if values else None
+            )
+        return merged
+
+    def update(self, **kwargs):
+        if enabled() and self._shard_bucket is not None:
+            wait_writable(self._shard_bucket)
+        if not self._scattered():
+            return super().update(**kwargs)
+        return sum(
+            self._unlimited(alias, owned=False).update(**kwargs)
+            for alias in shards()
+        )
+
+    def delete(self):
+        if enabled() and self._shard_bucket is not None:
+            wait_writable(self._shard_bucket)
+        if not self._scattered():
+            return super().delete()
+        total, per_model = 0, defaultdict(int)
+        for alias in shards():
+            deleted, counts = self._unlimited(alias, owned=False).delete()
+            total += deleted
+            for label, count in counts.items():
+                per_model[label] += count
+        return total, dict(per_model)
+
+    def create(self, **kwargs):
+        if not enabled():
+            return super().create(**kwargs)
+        # QuerySet.create записал бы объект в default.
+        obj = self.model(**kwargs)
+        self._for_write = True
+        obj.save(force_insert=True, using=self._db)
+        return obj
+
+    def bulk_create(self, objs, *args, **kwargs):
+        if not enabled():
+            return super().bulk_create(objs, *args, **kwargs)
+        objs = list(objs)
+        by_alias = defaultdict(list)
+        for obj in objs:
+            if obj.pk is None:
+                wait_writable(bucket_for(obj))
+            by_alias[self._db or writer_for(obj)].append(obj)
+        for alias, group in by_alias.items():
+            allocate_ids(group, alias)
+            super(ShardedQuerySet, self.using(alias)).bulk_create(
+                group, *args, **kwargs
+            )
+        return objs
+
+
+ShardedManager = models.Manager.from_queryset(ShardedQuerySet)
+
+
+class ShardRouter:
+    """Роутер постов и комментариев по шардам, см. модуль выше.
+    Стоит перед ReplicaRouter: реплики есть только у default.
+    """
+
+    def db_for_read(self, model, **hints):
+        if not enabled() or model._meta.label_lower not in SHARDED:
+            return None
+        instance = hints.get('instance')
+        if instance is None:
+            return None
+        return db_for_instance(model, instance)
+
+    def db_for_write(self, model, **hints):
+        if not enabled() or model._meta.label_lower not in SHARDED:
+            return None
+        instance = hints.get('instance')
+        if instance is None:
+            return None
+        return db_for_instance(model, instance, write=True)
+
+    def allow_relation(self, obj1, obj2, **hints):
+        if enabled() and SHARDED & {
+            obj1._meta.label_lower, obj2._meta.label_lower
+        }:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        if db == DEFAULT_DB_ALIAS or db not in shards():
+            return None
+        return app_label == 'posts' and model_name in SHARD_TABLES
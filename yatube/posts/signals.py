@@ -0,0 +1,204 @@
+from django.db import transaction
+from django.db.models.signals import (post_delete, post_save, pre_delete,
+                                      pre_save)
+from django.dispatch import receiver
+
+from . import (blobs, counters, feed_cache, follow_graph, search, sharding,
+               timeline, trending, variants)
+from .models import Comment, Follow, Group, Post, User, UserStats
+from .utils import invalidate_page_counts
+
+
+@receiver(post_save, sender=User)
+def create_user_stats(sender, instance, created, **kwargs):
+    if created:
+        UserStats.objects.get_or_create(user=instance)
+
+
+@receiver(pre_save, sender=Post)
+def remember_old_post(sender, instance, **kwargs):
+    if instance.pk is not None and not instance._state.adding:
+        instance._old_group_id, instance._old_image = (
+            Post.objects.filter(pk=instance.pk)
+            .values_list('group_id', 'image').first()
+            or (None, '')
+        )
+
+
+@receiver(post_save, sender=Post)
+def count_saved_post(sender, instance, created, **kwargs):
+    if created:
+        counters.post_added(instance)
+    elif hasattr(instance, '_old_group_id'):
+        counters.post_moved(instance._old_group_id, instance.group_id)
+
+
+@receiver(post_delete, sender=Post)
+def count_deleted_post(sender, instance, **kwargs):
+    counters.post_added(instance, -1)
+
+
+@receiver(post_delete, sender=Post)
+def forget_deleted_post(sender, instance, **kwargs):
+    timeline.forget_post(instance.pk)
+
+
+# Каскад Django удаляет связанные строки только в базе удаляемого
+# объекта, посты и комментарии на других шардах удаляются здесь.
+@receiver(pre_delete, sender=User)
+def delete_sharded_posts(sender, instance, **kwargs):
+    sharding.delete_author(instance.pk)
+
+
+@receiver(pre_delete, sender=Group)
+def detach_sharded_posts(sender, instance, **kwargs):
+    sharding.detach_group(instance.pk)
+
+
+@receiver(post_save, sender=Comment)
+def count_saved_comment(sender, instance, created, **kwargs):
+    if created:
+        counters.comment_added(instance)
+
+
+@receiver(post_delete, sender=Comment)
+def count_deleted_comment(sender, instance, **kwargs):
+    counters.comment_added(instance, -1)
+
+
+@receiver(post_save, sender=Comment)
+def score_saved_comment(sender, instance, created, **kwargs):
+    if created:
+        trending.record_comment(instance.post_id)
+
+
+@receiver(post_save, sender=Follow)
+def count_saved_follow(sender, instance, created, **kwargs):
+    if created:
+        counters.follow_added(instance)
+
+
+@receiver(post_delete, sender=Follow)
+def count_deleted_follow(sender, instance, **kwargs):
+    counters.follow_added(instance, -1)
+
+
+@receiver(post_save, sender=Follow)
+def log_saved_follow(sender, instance, created, **kwargs):
+    if created:
+        follow_graph.record(instance.user_id, [instance.author_id], True)
+
+
+@receiver(post_delete, sender=Follow)
+def log_deleted_follow(sender, instance, **kwargs):
+    follow_graph.record(instance.user_id, [instance.author_id], False)
+
+
+@receiver(post_save, sender=Post)
+def fan_out_new_post(sender, instance, created, **kwargs):
+    if created:
+        timeline.fan_out_post(instance)
+
+
+@receiver(post_save, sender=Post)
+@receiver(post_delete, sender=Post)
+@receiver(post_save, sender=Follow)
+@receiver(post_delete, sender=Follow)
+def reset_page_counts(sender, **kwargs):
+    invalidate_page_counts()
+
+
+@receiver(post_save, sender=Follow)
+def backfill_timeline(sender, instance, created, **kwargs):
+    if created:
+        timeline.backfill(instance.user_id, instance.author_id)
+
+
+@receiver(post_delete, sender=Follow)
+def prune_timeline(sender, instance, **kwargs):
+    timeline.prune(instance.user_id, instance.author_id)
+
+
+@receiver(post_save, sender=Post)
+@receiver(post_delete, sender=Post)
+def bump_post_feeds(sender, instance, **kwargs):
+    namespaces = [
+        'index', f'profile:{instance.author_id}', f'post:{instance.pk}'
+    ]
+    groups = {instance.group_id, getattr(instance, '_old_group_id', None)}
+    namespaces += [f'group:{pk}' for pk in groups if pk is not None]
+    feed_cache.bump(*namespaces)
+
+
+@receiver(post_save, sender=Post)
+def bump_post_timelines(sender, instance, created, **kwargs):
+    # Новый пост сбрасывает ленты подписчиков при раскладке,
+    # удаленный - в forget_deleted_post.
+    if not created:
+        timeline.touch_post(instance.pk)
+
+
+@receiver(post_save, sender=Comment)
+@receiver(post_delete, sender=Comment)
+def bump_comment_feeds(sender, instance, **kwargs):
+    feed_cache.bump(f'post:{instance.post_id}')
+
+
+@receiver(post_save, sender=Follow)
+@receiver(post_delete, sender=Follow)
+def bump_follow_feed(sender, instance, **kwargs):
+    feed_cache.bump(f'follow:{instance.user_id}')
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def bump_profile(sender, instance, update_fields=None, **kwargs):
+    # Вход пользователя сохраняет только last_login.
+    if update_fields is None or set(update_fields) != {'last_login'}:
+        feed_cache.bump(f'profile:{instance.pk}')
+
+
+@receiver(post_save, sender=Group)
+@receiver(post_delete, sender=Group)
+def bump_group(sender, instance, **kwargs):
+    feed_cache.bump(f'group:{instance.pk}')
+
+
+@receiver(post_save, sender=Post)
+def index_post(sender, instance, created, **kwargs):
+    search.index_post(instance, created)
+
+
+@receiver(post_delete, sender=Post)
+def unindex_post(sender, instance, **kwargs):
+    search.unindex_post(instance.pk)
+
+
+@receiver(post_save, sender=Comment)
+def index_comment(sender, instance, created, **kwargs):
+    search.index_comment(instance, created)
+
+
+@receiver(post_delete, sender=Comment)
+def unindex_comment(sender, instance, **kwargs):
+    search.unindex_comment(instance.pk)
+
+
+@receiver(post_save, sender=Post)
+def schedule_image_variants(sender, instance, **kwargs):
+    if instance.image:
+        transaction.on_commit(lambda: variants.schedule(instance))
+
+
+@receiver(post_save, sender=Post)
+def count_image_reference(sender, instance, **kwargs):
+    old_image = getattr(instance, '_old_image', '') or ''
+    new_image = instance.image.name or ''
+    if old_image != new_image:
+        blobs.acquire(new_image)
+        blobs.release(old_image)
+
+
+@receiver(post_delete, sender=Post)
+def release_image_reference(sender, instance, **kwargs):
+    blobs.release(instance.image.name or '')
@@ -0,0 +1,108 @@
+"""Рекомендации «на кого подписаться».
+
+Считаются офлайн командой suggest_follows по графу подписок
+(posts.follow_graph): кандидаты для u - авторы, на которых подписаны
+те, на кого подписан u. Оценка кандидата c по общим посредникам v:
+- common: их число;
+- jaccard: их число, деленное на размер объединения подписок u
+  и подписчиков c;
+- adamic-adar: сумма 1 / log(1 + число подписок v), посредник,
+  подписанный на всех подряд, весит меньше.
+Лучшие кандидаты пишутся в FollowSuggestion, страница читает их одним
+запросом по индексу (user, rank).
+"""
+import math
+from collections import Counter, defaultdict
+from heapq import nlargest
+from typing import List, Optional, Tuple
+
+from django.conf import settings
+from django.db import transaction
+
+from . import follow_graph
+from .follow_graph import FollowGraph
+from .models import FollowSuggestion, User
+
+SCORES = ('adamic-adar', 'jaccard', 'common')
+
+
+def shown() -> int:
+    """Сколько рекомендаций показывает страница."""
+    return getattr(settings, 'FOLLOW_SUGGESTIONS_SHOWN', 5)
+
+
+def suggest(graph: FollowGraph, user_id: int, top: int,
+            score: str = 'adamic-adar',
+            max_degree: Optional[int] = None) -> List[Tuple[int, float]]:
+    """Лучшие top кандидатов для user_id: пары (id автора, оценка).
+    Посредники с подписками больше max_degree пропускаются.
+    """
+    followees = graph.following.get(user_id)
+    # Counter.update считает элементы массива в C. Для adamic-adar
+    # посредники группируются по числу подписок: вес у группы общий.
+    groups = defaultdict(Counter)
+    for middle in followees:
+        candidates = graph.following.get(middle)
+        degree = len(candidates)
+        if not degree or (max_degree and degree > max_degree):
+            continue
+        groups[degree if score == 'adamic-adar' else 1].update(candidates)
+    if score == 'adamic-adar':
+        scores = defaultdict(float)
+        for degree, counts in groups.items():
+            weight = 1 / math.log(1 + degree)
+            for candidate, count in counts.items():
+                scores[candidate] += count * weight
+    else:
+        scores = groups[1]
+    scores.pop(user_id, None)
+    for followee in followees:
+        scores.pop(followee, None)
+    if score == 'jaccard':
+        scores = {
+            candidate: count / (
+                len(followees) + len(graph.followers.get(candidate)) - count
+            )
+            for candidate, count in scores.items()
+        }
+    # При равной оценке выше автор с меньшим id: результат не зависит
+    # от порядка обхода.
+    return nlargest(
+        top, scores.items(), key=lambda item: (item[1], -item[0])
+    )
+
+
+def store(suggestions: dict, low: Optional[int],
+          high: Optional[int]) -> int:
+    """Заменяет рекомендации пользователей с id от low до high.
+    suggestions - {user_id: [(author_id, score), ...]}. Строки
+    пользователей диапазона, которых нет в suggestions, удаляются.
+    """
+    stale = FollowSuggestion.objects.all()
+    if low is not None:
+        stale = stale.filter(user_id__gte=low)
+    if high is not None:
+        stale = stale.filter(user_id__lte=high)
+    rows = [
+        FollowSuggestion(
+            user_id=user_id, author_id=author_id, score=score, rank=rank
+        )
+        for user_id, ranked in suggestions.items()
+        for rank, (author_id, score) in enumerate(ranked)
+    ]
+    with transaction.atomic():
+        stale.delete()
+        FollowSuggestion.objects.bulk_create(rows, batch_size=1000)
+    return len(rows)
+
+
+def for_user(user: User, limit: Optional[int] = None) -> list:
+    """Рекомендации пользователю без тех, на кого он уже подписался
+    после расчета. Один запрос по индексу (user, rank).
+    """
+    return list(
+        FollowSuggestion.objects.filter(user=user)
+        .exclude(author_id__in=follow_graph.followees(user.pk))
+        .select_related('author')
+        .order_by('rank')[:limit or shown()]
+    )
@@ -0,0 +1,35 @@
+from django import template
+
+from posts.thumbnails import resolve_page, thumbnail_url
+from posts.variants import fallback_url, sources
+
+register = template.Library()
+
+
+@register.simple_tag
+def post_image(post):
+    """Адрес для <img src>: JPEG из вариантов картинки, если они
+    готовы, иначе превью из posts.thumbnails. Если страница уже
+    прошла через resolve_post_images, адрес берется готовым.
+    """
+    url = getattr(post, 'image_url', None) or fallback_url(post)
+    return url if url is not None else thumbnail_url(post.image)
+
+
+@register.simple_tag
+def resolve_post_images(page_obj):
+    """Находит превью всех постов страницы двумя запросами.
+    Вызывается перед циклом по page_obj внутри {% cache %},
+    чтобы закешированный фрагмент ничего не запрашивал.
+    Фрагмент с исходником заменяется, когда готовы варианты:
+    posts.variants меняет версии кеша страниц с этим постом.
+    """
+    # Посты с готовыми вариантами превью не нужны.
+    resolve_page(post for post in page_obj if not fallback_url(post))
+    return ''
+
+
+@register.simple_tag
+def image_sources(post):
+    """<source> для <picture> из вариантов картинки поста."""
+    return sources(post)
@@ -0,0 +1,194 @@
+from django.core.cache import cache
+from django.test import Client, TestCase
+from django.urls import reverse
+
+from core.middleware.query_budget import collect_budgets
+from posts.models import Comment, Group, Post, User
+from yatube.settings import num_posts
+
+
+class ApiTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(
+            username='author', first_name='Лев'
+        )
+        cls.group = Group.objects.create(
+            title='Группа', slug='group', description='Описание'
+        )
+        cls.posts = [
+            Post.objects.create(
+                author=cls.author, group=cls.group, text=f'Пост {i}'
+            )
+            for i in range(num_posts + 3)
+        ]
+        cls.post = cls.posts[-1]
+        Comment.objects.create(
+            post=cls.post, author=cls.author, text='Комментарий'
+        )
+
+    def setUp(self):
+        cache.clear()
+        self.client = Client()
+
+    def get(self, name, *args, **params):
+        return self.client.get(reverse(f'api:{name}', args=args), params)
+
+    def test_list_pages_with_cursor(self):
+        """Курсор проходит ленту целиком без повторов и пропусков."""
+        for name, args in (('posts', ()), ('group_posts', ('group',)),
+                           ('profile_posts', ('author',))):
+            with self.subTest(name=name):
+                ids, cursor = [], ''
+                while cursor is not None:
+                    data = self.get(name, *args, cursor=cursor).json()
+                    ids += [item['id'] for item in data['results']]
+                    cursor = data['next']
+                expected = sorted(
+                    self.posts, key=lambda post: (post.pub_date, post.pk),
+                    reverse=True,
+                )
+                self.assertEqual(ids, [post.pk for post in expected])
+
+    def test_sparse_fields(self):
+        """?fields= оставляет только запрошенные поля."""
+        data = self.get('post', self.post.pk, fields='text,author,group')
+        self.assertEqual(data.json(), {
+            'text': self.post.text, 'author': 'author', 'group': 'group',
+        })
+        item = self.get('posts', fields='id').json()['results'][0]
+        self.assertEqual(item, {'id': self.post.pk})
+        full = self.get('post', self.post.pk).json()
+        self.assertEqual(full['comments_count'], 1)
+        self.assertIsNone(full['image'])
+
+    def test_resources(self):
+        """Группа, профиль и комментарии отдаются проекциями."""
+        cases = {
+            ('group', 'group'): {'title': 'Группа', 'posts_count': 13},
+            ('profile', 'author'): {'first_name': 'Лев', 'posts_count': 13},
+        }
+        for (name, arg), expected in cases.items():
+            with self.subTest(name=name):
+                data = self.get(name, arg, fields=','.join(expected)).json()
+                self.assertEqual(data, expected)
+        comments = self.get('post_comments', self.post.pk).json()['results']
+        self.assertEqual(
+            [(item['author'], item['text']) for item in comments],
+            [('author', 'Комментарий')],
+        )
+
+    def test_errors(self):
+        """Неизвестное поле - 400, нет объекта - 404."""
+        cases = [
+            (('posts',), {'fields': 'id,password'}, 400),
+            (('post', 0), {}, 404),
+            (('post_comments', 0), {}, 404),
+            (('group_posts', 'missing'), {}, 404),
+            (('profile', 'missing'), {}, 404),
+        ]
+        for args, params, status in cases:
+            with self.subTest(args=args):
+                self.assertEqual(self.get(*args, **params).status_code, status)
+
+    def test_etag(self):
+        """Повторный запрос с ETag получает 304, с сессией тоже."""
+        user_client = Client()
+        user_client.force_login(self.author)
+        url = reverse('api:post', args=(self.post.pk,))
+        for client in (self.client, user_client):
+            with self.subTest(authenticated=client is user_client):
+                response = client.get(url)
+                self.assertIn('ETag', response)
+                again = client.get(
+                    url, HTTP_IF_NONE_MATCH=response['ETag']
+                )
+                self.assertEqual(again.status_code, 304)
+
+    def batch(self, **params):
+        return self.client.get(reverse('api:batch'), params)
+
+    def test_batch(self):
+        """Пачка сохраняет порядок запроса, ненайденное - null."""
+        first, second = self.posts[0], self.posts[1]
+        data = self.batch(
+            posts=f'{second.pk},0,{first.pk}',
+            users='missing,author', groups='group',
+        ).json()
+        self.assertEqual(
+            [item and item['id'] for item in data['posts']],
+            [second.pk, None, first.pk],
+        )
+        self.assertEqual(data['posts'][0]['author'], 'author')
+        self.assertEqual(
+            [item and item['username'] for item in data['users']],
+            [None, 'author'],
+        )
+        self.assertEqual(data['groups'][0]['posts_count'], 13)
+
+    def test_batch_cache(self):
+        """Повтор пачки не ходит в базу, правка объекта сбрасывает его."""
+        params = {
+            'posts': f'{self.post.pk}', 'users': 'author', 'groups': 'group',
+        }
+        self.batch(**params)
+        with self.assertNumQueries(0):
+            self.batch(**params)
+        self.post.text = 'Новый текст'
+        self.post.save()
+        self.author.first_name = 'Толстой'
+        self.author.save()
+        data = self.batch(**params).json()
+        self.assertEqual(data['posts'][0]['text'], 'Новый текст')
+        self.assertEqual(data['users'][0]['first_name'], 'Толстой')
+
+    def test_batch_errors(self):
+        """Нечисловой или не 64-битный id поста и превышение лимита - 400."""
+        cases = [
+            {'posts': '1,x'},
+            {'posts': str(2 ** 63)},
+            {'posts': '99999999999999999999999'},
+            {'posts': str(-2 ** 63 - 1)},
+            {'posts': ','.join(map(str, range(1, 5))), 'groups': 'a,b'},
+        ]
+        with self.settings(API_BATCH_LIMIT=5):
+            for params in cases:
+                with self.subTest(params=params):
+                    response = self.batch(**params)
+                    self.assertEqual(response.status_code, 400)
+                    self.assertIn('error', response.json())
+                    self.assertNotIn(b'\\u', response.content)
+        self.assertEqual(
+            self.batch(posts=str(2 ** 63 - 1)).json()['posts'], [None]
+        )
+
+    def test_budgets(self):
+        """Все ресурсы API укладываются в бюджеты запросов."""
+        user_client = Client()
+        user_client.force_login(self.author)
+        urls = [
+            reverse('api:posts'),
+            reverse('api:post', args=(self.post.pk,)),
+            reverse('api:post_comments', args=(self.post.pk,)),
+            reverse('api:group', args=('group',)),
+            reverse('api:group_posts', args=('group',)),
+            reverse('api:profile', args=('author',)),
+            reverse('api:profile_posts', args=('author',)),
+            reverse('api:batch') + '?posts=1,2&users=author&groups=group',
+        ]
+        checked = set()
+        for url in urls:
+            for client in (self.client, user_client):
+                with self.subTest(url=url):
+                    cache.clear()
+                    response = client.get(url)
+                    recorder = response.wsgi_request.query_recorder
+                    self.assertIsNotNone(recorder.budget)
+                    self.assertEqual(recorder.problems(), [])
+                    checked.add(
+                        response.wsgi_request.resolver_match.view_name
+                    )
+        self.assertEqual(
+            checked,
+            {name for name in collect_budgets() if name.startswith('api:')}
+        )
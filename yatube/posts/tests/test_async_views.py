@@ -0,0 +1,118 @@
+import asyncio
+
+from asgiref.sync import sync_to_async
+from django.test import (AsyncClient, SimpleTestCase, TestCase,
+                         override_settings)
+from django.urls import resolve, reverse
+
+from posts import async_views, views
+from posts.models import Follow, Group, Post, User
+
+
+@override_settings(ROOT_URLCONF='yatube.asgi_urls')
+class AsyncViewsTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='author')
+        cls.reader = User.objects.create_user(username='reader')
+        cls.group = Group.objects.create(
+            title='Тестовая группа',
+            slug='test-slug',
+            description='Тестовое описание',
+        )
+        cls.post = Post.objects.create(
+            author=cls.author, group=cls.group, text='Тестовый пост'
+        )
+        Follow.objects.create(user=cls.reader, author=cls.author)
+
+    def test_views_are_async(self):
+        """Ленты и страница поста под ASGI - корутины,
+        под WSGI - обычные функции.
+        """
+        for name in ('index', 'group_posts', 'profile', 'post_detail',
+                     'follow_index'):
+            with self.subTest(view=name):
+                self.assertTrue(
+                    asyncio.iscoroutinefunction(getattr(async_views, name))
+                )
+                self.assertFalse(
+                    asyncio.iscoroutinefunction(getattr(views, name))
+                )
+
+    async def test_async_client(self):
+        """Страницы отдаются через ASGI-обработчик."""
+        client = AsyncClient()
+        await sync_to_async(client.force_login)(self.reader)
+        pages = {
+            reverse('posts:index'): 'posts/index.html',
+            reverse('posts:group_list', args=(self.group.slug,)):
+                'posts/group_list.html',
+            reverse('posts:profile', args=(self.author.username,)):
+                'posts/profile.html',
+            reverse('posts:post_detail', args=(self.post.pk,)):
+                'posts/post_detail.html',
+            reverse('posts:follow_index'): 'posts/follow.html',
+        }
+        for url, template in pages.items():
+            with self.subTest(url=url):
+                response = await client.get(url)
+                self.assertEqual(response.status_code, 200)
+                self.assertTemplateUsed(response, template)
+                self.assertContains(response, 'Тестовый пост')
+        response = await client.get(
+            reverse('posts:profile', args=(self.author.username,))
+        )
+        self.assertTrue(response.context['following'])
+
+    async def test_follow_index_requires_login(self):
+        """Анонима лента подписок отправляет на страницу входа."""
+        url = reverse('posts:follow_index')
+        response = await AsyncClient().get(url)
+        self.assertRedirects(
+            response, f'{reverse("users:login")}?next={url}',
+            fetch_redirect_response=False,
+        )
+
+
+class AsgiApplicationTests(SimpleTestCase):
+    def test_application(self):
+        """yatube.asgi отдает страницу через свой контекст потоков."""
+        from yatube.asgi import application
+
+        messages = []
+
+        async def receive():
+            return {'type': 'http.request', 'body': b''}
+
+        async def send(message):
+            messages.append(message)
+
+        scope = {
+            'type': 'http',
+            'asgi': {'version': '3.0'},
+            'http_version': '1.1',
+            'method': 'GET',
+            'scheme': 'http',
+            'path': reverse('about:author'),
+            'root_path': '',
+            'query_string': b'',
+            'headers': [(b'host', b'testserver')],
+            'server': ('testserver', 80),
+            'client': ('127.0.0.1', 1024),
+        }
+        asyncio.run(application(scope, receive, send))
+        self.assertEqual(messages[0]['status'], 200)
+
+    def test_application_urlconf(self):
+        """yatube.asgi отдает ленты асинхронными представлениями,
+        остальные адреса и имена - те же, что под WSGI.
+        """
+        from yatube.asgi import URLCONF
+
+        url = reverse('posts:post_detail', args=(1,))
+        self.assertEqual(reverse('posts:post_detail', URLCONF, (1,)), url)
+        self.assertIs(resolve(url, URLCONF).func, async_views.post_detail)
+        self.assertIs(resolve(url).func, views.post_detail)
+        create = reverse('posts:post_create')
+        self.assertIs(resolve(create, URLCONF).func, views.post_create)
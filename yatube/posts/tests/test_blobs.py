@@ -0,0 +1,127 @@
+import shutil
+import tempfile
+from io import StringIO
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from sorl.thumbnail import default, get_thumbnail
+
+from core.storages.content_addressed import media_storage
+from posts import thumbnails, variants
+from posts.models import MediaBlob, Post, User
+
+TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+
+SMALL_GIF = (
+    b'\x47\x49\x46\x38\x39\x61\x02\x00'
+    b'\x01\x00\x80\x00\x00\x00\x00\x00'
+    b'\xFF\xFF\xFF\x21\xF9\x04\x00\x00'
+    b'\x00\x00\x00\x2C\x00\x00\x00\x00'
+    b'\x02\x00\x01\x00\x00\x02\x02\x0C'
+    b'\x0A\x00\x3B'
+)
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class MediaBlobTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='author')
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def create_post(self, name='meme.gif', content=SMALL_GIF):
+        return Post.objects.create(
+            author=self.user, text='Пост',
+            image=SimpleUploadedFile(name, content, content_type='image/gif'),
+        )
+
+    def refcount(self, post):
+        return MediaBlob.objects.get(
+            pk=media_storage.digest_of(post.image.name)
+        ).refcount
+
+    def test_reuploads_share_blob(self):
+        """Повторная загрузка ссылается на тот же блоб."""
+        first = self.create_post('meme.gif')
+        second = self.create_post('meme_copy.gif')
+        self.assertEqual(first.image.name, second.image.name)
+        self.assertEqual(self.refcount(first), 2)
+        second.delete()
+        self.assertEqual(self.refcount(first), 1)
+
+    def test_edit_moves_reference(self):
+        """Замена картинки переносит ссылку на новый блоб."""
+        post = self.create_post()
+        old = MediaBlob.objects.get(
+            pk=media_storage.digest_of(post.image.name)
+        )
+        post.image = SimpleUploadedFile(
+            'new.gif', SMALL_GIF + b'\x00', content_type='image/gif'
+        )
+        post.save()
+        old.refresh_from_db()
+        self.assertEqual(old.refcount, 0)
+        self.assertEqual(self.refcount(post), 1)
+
+    @override_settings(MEDIA_GC_GRACE=-1)
+    def test_collect_media(self):
+        """collect_media удаляет только блобы без ссылок."""
+        kept = self.create_post('kept.gif')
+        dropped = self.create_post('dropped.gif', SMALL_GIF + b'\x01')
+        orphan = media_storage.save('posts/orphan.gif', ContentFile(b'x'))
+        dropped_name = dropped.image.name
+        dropped.delete()
+        call_command('collect_media', stdout=StringIO())
+        self.assertTrue(media_storage.exists(kept.image.name))
+        self.assertFalse(media_storage.exists(dropped_name))
+        self.assertFalse(media_storage.exists(orphan))
+        self.assertFalse(
+            MediaBlob.objects.filter(
+                pk=media_storage.digest_of(dropped_name)
+            ).exists()
+        )
+
+    @override_settings(MEDIA_GC_GRACE=-1)
+    def test_collect_derived_files(self):
+        """collect_media удаляет варианты и превью удаленной картинки."""
+        post = self.create_post()
+        name = post.image.name
+        variants.schedule(post, inline=True)
+        thumbnail = get_thumbnail(
+            name, thumbnails.GEOMETRY, **thumbnails.OPTIONS
+        )
+        derived = variants.files(name)
+        self.assertTrue(derived)
+        post.delete()
+        call_command('collect_media', stdout=StringIO())
+        for variant in derived + [thumbnail.name]:
+            with self.subTest(name=variant):
+                self.assertFalse(default_storage.exists(variant))
+        self.assertIsNone(
+            default.kvstore.get(thumbnails.thumbnail_file(name))
+        )
+
+    def test_dedupe_media(self):
+        """dedupe_media переносит старые файлы и убирает дубликаты."""
+        legacy = []
+        for name in ('posts/one.gif', 'posts/two.gif'):
+            default_storage.save(name, ContentFile(SMALL_GIF))
+            post = Post.objects.create(author=self.user, text='Пост')
+            Post.objects.filter(pk=post.pk).update(image=name)
+            legacy.append(post)
+        call_command('dedupe_media', batch_size=1, stdout=StringIO())
+        first, second = [Post.objects.get(pk=post.pk) for post in legacy]
+        self.assertEqual(first.image.name, second.image.name)
+        self.assertIsNotNone(media_storage.digest_of(first.image.name))
+        self.assertFalse(default_storage.exists('posts/one.gif'))
+        self.assertFalse(default_storage.exists('posts/two.gif'))
+        self.assertEqual(self.refcount(first), 2)
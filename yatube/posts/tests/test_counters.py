@@ -0,0 +1,110 @@
+from io import StringIO
+
+from django.core.management import call_command
+from django.test import Client, TestCase
+from django.urls import reverse
+
+from posts.models import Comment, Follow, Group, Post, User, UserStats
+
+
+class CountersTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='author')
+        cls.reader = User.objects.create_user(username='reader')
+        cls.group = Group.objects.create(
+            title='Тестовая группа',
+            slug='test-slug',
+            description='Тестовое описание',
+        )
+        cls.group2 = Group.objects.create(
+            title='Тестовая группа 2',
+            slug='test-slug2',
+            description='Тестовое описание 2',
+        )
+
+    def stats(self, user):
+        return UserStats.objects.get(user=user)
+
+    def test_post_counters(self):
+        """Создание, перенос и удаление поста меняют счетчики."""
+        post = Post.objects.create(
+            author=self.author, group=self.group, text='Пост'
+        )
+        self.assertEqual(self.stats(self.author).posts_count, 1)
+        self.group.refresh_from_db()
+        self.assertEqual(self.group.posts_count, 1)
+        post.group = self.group2
+        post.save()
+        self.group.refresh_from_db()
+        self.group2.refresh_from_db()
+        self.assertEqual(self.group.posts_count, 0)
+        self.assertEqual(self.group2.posts_count, 1)
+        post.delete()
+        self.group2.refresh_from_db()
+        self.assertEqual(self.stats(self.author).posts_count, 0)
+        self.assertEqual(self.group2.posts_count, 0)
+
+    def test_comment_counter(self):
+        """Комментарии считаются в Post.comments_count."""
+        post = Post.objects.create(author=self.author, text='Пост')
+        comment = Comment.objects.create(
+            post=post, author=self.reader, text='Комментарий'
+        )
+        post.refresh_from_db()
+        self.assertEqual(post.comments_count, 1)
+        comment.delete()
+        post.refresh_from_db()
+        self.assertEqual(post.comments_count, 0)
+
+    def test_follow_counters(self):
+        """Подписка меняет счетчики подписчиков и подписок."""
+        follow = Follow.objects.create(user=self.reader, author=self.author)
+        self.assertEqual(self.stats(self.author).followers_count, 1)
+        self.assertEqual(self.stats(self.reader).following_count, 1)
+        follow.delete()
+        self.assertEqual(self.stats(self.author).followers_count, 0)
+        self.assertEqual(self.stats(self.reader).following_count, 0)
+
+    def test_templates_use_counters(self):
+        """Страницы выводят счетчики без COUNT(*)."""
+        post = Post.objects.create(
+            author=self.author, group=self.group, text='Пост'
+        )
+        UserStats.objects.filter(user=self.author).update(posts_count=7)
+        Group.objects.filter(pk=self.group.pk).update(posts_count=8)
+        client = Client()
+        pages = {
+            reverse('posts:profile', args=(self.author.username,)):
+                'Всего постов: 7',
+            reverse('posts:group_list', args=(self.group.slug,)):
+                'Всего постов: 8',
+            reverse('posts:post_detail', args=(post.pk,)):
+                'Всего постов автора: 7',
+        }
+        for url, text in pages.items():
+            with self.subTest(url=url):
+                self.assertContains(client.get(url), text)
+
+    def test_repair_counters(self):
+        """Команда repair_counters исправляет расхождения."""
+        post = Post.objects.create(
+            author=self.author, group=self.group, text='Пост'
+        )
+        Follow.objects.create(user=self.reader, author=self.author)
+        UserStats.objects.filter(user=self.author).update(
+            posts_count=5, followers_count=0
+        )
+        UserStats.objects.filter(user=self.reader).delete()
+        Group.objects.filter(pk=self.group.pk).update(posts_count=3)
+        Post.objects.filter(pk=post.pk).update(comments_count=2)
+        call_command('repair_counters', batch_size=1, stdout=StringIO())
+        author_stats = self.stats(self.author)
+        self.assertEqual(author_stats.posts_count, 1)
+        self.assertEqual(author_stats.followers_count, 1)
+        self.assertEqual(self.stats(self.reader).following_count, 1)
+        self.group.refresh_from_db()
+        post.refresh_from_db()
+        self.assertEqual(self.group.posts_count, 1)
+        self.assertEqual(post.comments_count, 0)
@@ -0,0 +1,107 @@
+from django.core.cache import cache
+from django.test import Client, TestCase
+from django.urls import reverse
+
+from posts.feed_cache import feed_version
+from posts.models import (Comment, Follow, Group, PopularAuthor, Post,
+                          User)
+
+
+class FeedCacheTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='author')
+        cls.reader = User.objects.create_user(username='reader')
+        cls.group = Group.objects.create(
+            title='Тестовая группа',
+            slug='test-slug',
+            description='Тестовое описание',
+        )
+        cls.other_group = Group.objects.create(
+            title='Другая группа',
+            slug='other-slug',
+            description='Тестовое описание',
+        )
+        cls.post = Post.objects.create(
+            author=cls.author, group=cls.group, text='Первый пост'
+        )
+
+    def setUp(self):
+        cache.clear()
+        self.client = Client()
+        self.client.force_login(self.reader)
+
+    def test_post_bumps_its_feeds_only(self):
+        """Новый пост меняет версии своих лент и не трогает чужие."""
+        index = feed_version('index')
+        group = feed_version(f'group:{self.group.pk}')
+        profile = feed_version(f'profile:{self.author.pk}')
+        other_group = feed_version(f'group:{self.other_group.pk}')
+        Post.objects.create(
+            author=self.author, group=self.group, text='Второй пост'
+        )
+        self.assertNotEqual(feed_version('index'), index)
+        self.assertNotEqual(feed_version(f'group:{self.group.pk}'), group)
+        self.assertNotEqual(
+            feed_version(f'profile:{self.author.pk}'), profile
+        )
+        self.assertEqual(
+            feed_version(f'group:{self.other_group.pk}'), other_group
+        )
+
+    def test_cached_page_is_reused_until_change(self):
+        """Страница группы берется из кеша, пока посты не изменились."""
+        url = reverse('posts:group_list', args=(self.group.slug,))
+        self.client.get(url)
+        Post.objects.filter(pk=self.post.pk).update(text='Тихая правка')
+        self.assertContains(self.client.get(url), 'Первый пост')
+        self.post.text = 'Новый текст'
+        self.post.save()
+        self.assertContains(self.client.get(url), 'Новый текст')
+
+    def test_comment_invalidates_post_detail(self):
+        """Новый комментарий сразу виден на странице поста."""
+        url = reverse('posts:post_detail', args=(self.post.pk,))
+        self.client.get(url)
+        Comment.objects.create(
+            post=self.post, author=self.reader, text='Свежий комментарий'
+        )
+        self.assertContains(self.client.get(url), 'Свежий комментарий')
+
+    def test_follow_invalidates_follow_feed(self):
+        """Подписка сразу меняет ленту подписок."""
+        url = reverse('posts:follow_index')
+        self.assertNotContains(self.client.get(url), 'Первый пост')
+        Follow.objects.create(user=self.reader, author=self.author)
+        self.assertContains(self.client.get(url), 'Первый пост')
+
+    def test_follow_feed_ignores_other_authors(self):
+        """Лента подписок сбрасывается постами авторов подписки,
+        а не каждым новым постом сайта.
+        """
+        stranger = User.objects.create_user(username='stranger')
+        Follow.objects.create(user=self.reader, author=self.author)
+        url = reverse('posts:follow_index')
+        self.client.get(url)
+        Post.objects.create(author=stranger, text='Чужой пост')
+        Post.objects.filter(pk=self.post.pk).update(text='Тихая правка')
+        self.assertContains(self.client.get(url), 'Первый пост')
+        self.post.text = 'Правка автора'
+        self.post.save()
+        self.assertContains(self.client.get(url), 'Правка автора')
+        new = Post.objects.create(author=self.author, text='Второй пост')
+        self.assertContains(self.client.get(url), 'Второй пост')
+        new.delete()
+        self.assertNotContains(self.client.get(url), 'Второй пост')
+
+    def test_popular_author_feeds_follow_profile(self):
+        """Посты популярного автора, которые не раскладываются
+        по лентам, сбрасывают ленту подписок через его профиль.
+        """
+        PopularAuthor.objects.create(author_id=self.author.pk)
+        Follow.objects.create(user=self.reader, author=self.author)
+        url = reverse('posts:follow_index')
+        self.assertContains(self.client.get(url), 'Первый пост')
+        Post.objects.create(author=self.author, text='Второй пост')
+        self.assertContains(self.client.get(url), 'Второй пост')
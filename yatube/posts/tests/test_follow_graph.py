@@ -0,0 +1,123 @@
+import os
+import shutil
+import tempfile
+
+from django.db import DatabaseError, connection, transaction
+from django.test import Client, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from posts import follow_graph
+from posts.follow_graph import Adjacency
+from posts.models import Follow, FollowEvent, User
+
+TEMP_DIR = tempfile.mkdtemp()
+
+
+class AdjacencyTests(TestCase):
+    def test_changes_over_compact_lists(self):
+        """Изменения ложатся поверх CSR и сохраняются при сжатии."""
+        lists = Adjacency.from_pairs([(1, 2), (1, 5), (3, 1)])
+        lists.add(1, 3)
+        lists.add(1, 3)
+        lists.remove(3, 1)
+        lists.add(7, 1)
+        expected = {1: [2, 3, 5], 3: [], 7: [1]}
+        for adjacency in (lists, lists.compact()):
+            for key, values in expected.items():
+                with self.subTest(key=key, changed=bool(adjacency.changed)):
+                    self.assertEqual(list(adjacency.get(key)), values)
+        self.assertTrue(lists.contains(1, 3))
+        self.assertFalse(lists.contains(1, 4))
+        self.assertFalse(lists.contains(2, 1))
+
+
+@override_settings(
+    FOLLOW_GRAPH=True,
+    FOLLOW_GRAPH_SNAPSHOT=os.path.join(TEMP_DIR, 'follow-graph.bin'),
+)
+class FollowGraphTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.reader = User.objects.create_user(username='reader')
+        cls.authors = [
+            User.objects.create_user(username=f'author{i}') for i in range(3)
+        ]
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(TEMP_DIR, ignore_errors=True)
+        super().tearDownClass()
+
+    def setUp(self):
+        follow_graph.reset()
+        self.client = Client()
+        self.client.force_login(self.reader)
+
+    def tearDown(self):
+        follow_graph.reset()
+
+    def test_graph_follows_changes(self):
+        """Подписки через модель, представления и пачкой видны в графе."""
+        Follow.objects.create(user=self.reader, author=self.authors[0])
+        self.client.get(
+            reverse('posts:profile_follow', args=(self.authors[1],))
+        )
+        self.client.post(
+            reverse('posts:follow_bulk'),
+            {'action': 'follow', 'username': ['author2']},
+        )
+        Follow.objects.filter(author=self.authors[0]).delete()
+        self.assertEqual(
+            follow_graph.followees(self.reader.pk),
+            [self.authors[1].pk, self.authors[2].pk],
+        )
+        self.assertEqual(follow_graph.followers_count(self.authors[1].pk), 1)
+        self.assertEqual(follow_graph.followers_count(self.authors[0].pk), 0)
+
+    def test_profile_checks_follow_without_sql(self):
+        """Профиль узнает о подписке из графа, не из таблицы Follow."""
+        Follow.objects.create(user=self.reader, author=self.authors[0])
+        follow_graph.graph()
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(
+                reverse('posts:profile', args=(self.authors[0],))
+            )
+        self.assertTrue(response.context['following'])
+        for query in queries:
+            self.assertNotIn('"posts_follow"', query['sql'])
+
+    def test_snapshot_and_missing_events(self):
+        """Снимок читается с дочитыванием журнала, пропуск - перестройка."""
+        Follow.objects.create(user=self.reader, author=self.authors[0])
+        follow_graph.build().dump(follow_graph.snapshot_path())
+        Follow.objects.create(user=self.reader, author=self.authors[1])
+        graph = follow_graph.build()
+        self.assertTrue(graph.is_following(self.reader.pk, self.authors[1].pk))
+        FollowEvent.objects.all().delete()
+        Follow.objects.create(user=self.reader, author=self.authors[2])
+        graph = follow_graph.build()
+        self.assertEqual(
+            list(graph.following.get(self.reader.pk)),
+            [author.pk for author in self.authors],
+        )
+
+    def test_rolled_back_event_is_not_kept(self):
+        """Откатившееся событие с тем же id не сходит за примененное."""
+        try:
+            with transaction.atomic():
+                Follow.objects.create(user=self.reader, author=self.authors[0])
+                graph = follow_graph.build()
+                raise DatabaseError
+        except DatabaseError:
+            pass
+        Follow.objects.create(user=self.reader, author=self.authors[1])
+        self.assertEqual(
+            FollowEvent.objects.get().pk, graph.last_event
+        )
+        self.assertFalse(graph.catch_up())
+        self.assertEqual(
+            list(follow_graph.build().following.get(self.reader.pk)),
+            [self.authors[1].pk],
+        )
@@ -0,0 +1,86 @@
+from django.db import connection
+from django.test import Client, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from posts.models import Follow, Post, TimelineEntry, User, UserStats
+
+
+class FollowTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.reader = User.objects.create_user(username='reader')
+        cls.authors = [
+            User.objects.create_user(username=f'author{i}') for i in range(20)
+        ]
+        for author in cls.authors:
+            Post.objects.create(author=author, text='Пост')
+
+    def setUp(self):
+        self.client = Client()
+        self.client.force_login(self.reader)
+
+    def bulk(self, action, usernames):
+        return self.client.post(
+            reverse('posts:follow_bulk'),
+            {'action': action, 'username': usernames},
+        )
+
+    def stats(self, user):
+        return UserStats.objects.get(user=user)
+
+    def test_follow_is_idempotent(self):
+        """Повторная подписка и подписка на себя ничего не меняют."""
+        url = reverse('posts:profile_follow', args=(self.authors[0],))
+        self.client.get(url)
+        self.client.get(url)
+        self.client.get(reverse('posts:profile_follow', args=(self.reader,)))
+        self.assertEqual(Follow.objects.filter(user=self.reader).count(), 1)
+        self.assertEqual(self.stats(self.reader).following_count, 1)
+        self.assertEqual(self.stats(self.authors[0]).followers_count, 1)
+
+    def test_bulk_follow(self):
+        """Пачка подписок: новые создаются, остальные пропускаются."""
+        Follow.objects.create(user=self.reader, author=self.authors[0])
+        usernames = [author.username for author in self.authors]
+        response = self.bulk('follow', usernames + ['reader', 'nobody'])
+        self.assertEqual(
+            response.json(), {'action': 'follow', 'changed': 19}
+        )
+        self.assertEqual(Follow.objects.filter(user=self.reader).count(), 20)
+        self.assertEqual(self.stats(self.reader).following_count, 20)
+        self.assertEqual(self.stats(self.authors[-1]).followers_count, 1)
+        self.assertEqual(
+            TimelineEntry.objects.filter(user=self.reader).count(), 20
+        )
+        response = self.bulk('unfollow', usernames[:5])
+        self.assertEqual(response.json()['changed'], 5)
+        self.assertEqual(self.stats(self.reader).following_count, 15)
+        self.assertEqual(
+            TimelineEntry.objects.filter(user=self.reader).count(), 15
+        )
+
+    def test_bulk_queries_do_not_grow(self):
+        """Число запросов не зависит от числа авторов в пачке."""
+        counts = []
+        for authors in (self.authors[:2], self.authors[2:]):
+            with CaptureQueriesContext(connection) as queries:
+                self.bulk('follow', [author.username for author in authors])
+            counts.append(len(queries))
+        self.assertEqual(counts[0], counts[1])
+
+    @override_settings(FOLLOW_BULK_LIMIT=3)
+    def test_bulk_rejects_bad_requests(self):
+        """Неизвестное действие, пустой и слишком длинный список - 400."""
+        cases = {
+            'action': ('block', ['author0']),
+            'empty': ('follow', []),
+            'limit': ('follow', ['a', 'b', 'c', 'd']),
+        }
+        for name, (action, usernames) in cases.items():
+            with self.subTest(case=name):
+                self.assertEqual(
+                    self.bulk(action, usernames).status_code, 400
+                )
+        self.assertFalse(Follow.objects.exists())
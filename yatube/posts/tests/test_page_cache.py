@@ -0,0 +1,166 @@
+import os
+import shutil
+import tempfile
+from unittest import mock
+
+from django.contrib.auth.models import AnonymousUser
+from django.core.cache import cache
+from django.db import connection
+from django.http import HttpResponse, HttpResponseServerError
+from django.test import Client, RequestFactory, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils.http import parse_http_date
+
+from core.cache_backends.sqlite import SQLiteCache
+from core.middleware.page_cache import (AnonymousPageCacheMiddleware,
+                                        anonymous_page)
+
+from posts.models import Comment, Group, Post, User
+
+
+class AnonymousPageCacheTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='author')
+        cls.group = Group.objects.create(
+            title='Тестовая группа',
+            slug='test-slug',
+            description='Тестовое описание',
+        )
+        cls.post = Post.objects.create(
+            author=cls.author, group=cls.group, text='Пост'
+        )
+        cls.urls = [
+            reverse('posts:index'),
+            reverse('posts:group_list', args=(cls.group.slug,)),
+            reverse('posts:profile', args=(cls.author.username,)),
+            reverse('posts:post_detail', args=(cls.post.pk,)),
+        ]
+
+    def setUp(self):
+        cache.clear()
+        self.guest_client = Client()
+
+    def test_validators(self):
+        """Анонимные страницы отдают ETag и Last-Modified."""
+        for url in self.urls:
+            with self.subTest(url=url):
+                response = self.guest_client.get(url)
+                self.assertTrue(response.has_header('ETag'))
+                self.assertTrue(response.has_header('Last-Modified'))
+
+    def test_not_modified_before_rendering(self):
+        """If-None-Match и If-Modified-Since дают 304 без шаблонов."""
+        for url in self.urls:
+            response = self.guest_client.get(url)
+            conditions = {
+                'HTTP_IF_NONE_MATCH': response['ETag'],
+                'HTTP_IF_MODIFIED_SINCE': response['Last-Modified'],
+            }
+            for header, value in conditions.items():
+                with self.subTest(url=url, header=header):
+                    response = self.guest_client.get(url, **{header: value})
+                    self.assertEqual(response.status_code, 304)
+                    self.assertEqual(response.templates, [])
+
+    def test_cached_page(self):
+        """Повторный запрос отдается из кеша без запросов к базе."""
+        url = reverse('posts:index')
+        self.guest_client.get(url)
+        Post.objects.filter(pk=self.post.pk).update(text='Тихая правка')
+        with CaptureQueriesContext(connection) as queries:
+            response = self.guest_client.get(url)
+        self.assertEqual(len(queries), 0)
+        self.assertContains(response, 'Пост')
+        self.assertNotContains(response, 'Тихая правка')
+
+    def test_signals_invalidate(self):
+        """Новый пост и комментарий меняют ETag страниц."""
+        etags = {
+            url: self.guest_client.get(url)['ETag'] for url in self.urls
+        }
+        Post.objects.create(
+            author=self.author, group=self.group, text='Новый пост'
+        )
+        Comment.objects.create(
+            post=self.post, author=self.author, text='Комментарий'
+        )
+        for url, etag in etags.items():
+            with self.subTest(url=url):
+                response = self.guest_client.get(url, HTTP_IF_NONE_MATCH=etag)
+                self.assertEqual(response.status_code, 200)
+                self.assertNotEqual(response['ETag'], etag)
+
+    def test_last_modified_is_change_time(self):
+        """Last-Modified - время последнего изменения, а не дата
+        последнего поста: правка и удаление сдвигают его вперед.
+        """
+        urls = self.urls[:3]
+        with mock.patch('posts.feed_cache.time') as clock:
+            clock.time.return_value = 1_000_000_000
+            newer = Post.objects.create(
+                author=self.author, group=self.group, text='Новый пост'
+            )
+            changes = (
+                lambda: self.post.save(),
+                lambda: newer.delete(),
+            )
+            for change in changes:
+                clock.time.return_value += 60
+                change()
+                for url in urls:
+                    with self.subTest(url=url, at=clock.time.return_value):
+                        response = self.guest_client.get(url)
+                        self.assertEqual(
+                            parse_http_date(response['Last-Modified']),
+                            clock.time.return_value,
+                        )
+
+    def test_authorized_not_cached(self):
+        """Авторизованные пользователи получают страницу без кеша."""
+        client = Client()
+        client.force_login(self.author)
+        for url in self.urls:
+            with self.subTest(url=url):
+                response = client.get(url)
+                self.assertFalse(response.has_header('ETag'))
+
+    def test_recompute_lock_released(self):
+        """Несохраненный ответ снимает блокировку пересчета страницы,
+        сохраненный отдается другому воркеру из кеша.
+        """
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory, ignore_errors=True)
+        location = os.path.join(directory, 'cache.sqlite3')
+
+        @anonymous_page(lambda request: ('1', None))
+        def view(request):
+            pass
+
+        middleware = AnonymousPageCacheMiddleware(lambda request: None)
+        cases = [
+            (HttpResponseServerError(), None),
+            (HttpResponse('page'), b'page'),
+        ]
+        with override_settings(CACHES={'default': {
+            'BACKEND': 'core.cache_backends.sqlite.SQLiteCache',
+            'LOCATION': location,
+        }}):
+            for response, cached in cases:
+                with self.subTest(status=response.status_code):
+                    request = RequestFactory().get('/')
+                    request.user = AnonymousUser()
+                    self.assertIsNone(
+                        middleware.process_view(request, view, (), {})
+                    )
+                    middleware.process_response(request, response)
+                    other = SQLiteCache(location, {})
+                    key = request.page_cache_key
+                    self.assertEqual(
+                        getattr(other.get(key), 'content', None), cached
+                    )
+                    if cached is None:
+                        self.assertTrue(other.lock(key))
+                        other.unlock(key)
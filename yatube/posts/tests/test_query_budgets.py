@@ -0,0 +1,123 @@
+from types import SimpleNamespace
+from unittest import mock
+
+from django.core.cache import cache
+from django.test import Client, TestCase
+from django.urls import reverse
+
+from core.middleware.query_budget import (QueryBudgetExceeded,
+                                          QueryRecorder, collect_budgets)
+from posts.models import Comment, Follow, Group, Post, User
+from posts.utils import get_paginator
+
+
+class QueryBudgetTests(TestCase):
+    """Все представления posts укладываются в бюджеты из urls.py
+    и не делают повторяющихся запросов на каждый пост.
+    """
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='author')
+        cls.reader = User.objects.create_user(username='reader')
+        cls.group = Group.objects.create(
+            title='Тестовая группа',
+            slug='test-slug',
+            description='Тестовое описание',
+        )
+        commenters = [
+            User.objects.create_user(username=f'user{i}') for i in range(5)
+        ]
+        for i in range(15):
+            Post.objects.create(
+                author=commenters[i % 5], group=cls.group, text=f'Пост {i}'
+            )
+        cls.post = Post.objects.create(author=cls.author, text='Пост')
+        for commenter in commenters:
+            Comment.objects.create(
+                post=cls.post, author=commenter, text='Комментарий'
+            )
+            Follow.objects.create(user=cls.reader, author=commenter)
+
+    def setUp(self):
+        cache.clear()
+        self.client = Client()
+        self.client.force_login(self.reader)
+        self.author_client = Client()
+        self.author_client.force_login(self.author)
+
+    def test_views_fit_budgets(self):
+        """Каждое представление из query_budgets укладывается в бюджет."""
+        post_id = self.post.pk
+        requests = [
+            ('get', reverse('posts:index'), self.client),
+            ('get', reverse('posts:group_list', args=(self.group.slug,)),
+             self.client),
+            ('get', reverse('posts:profile', args=(self.author.username,)),
+             self.client),
+            ('get', reverse('posts:post_detail', args=(post_id,)),
+             self.client),
+            ('get', reverse('posts:follow_index'), self.client),
+            ('post', reverse('posts:post_create'), self.author_client),
+            ('post', reverse('posts:post_edit', args=(post_id,)),
+             self.author_client),
+            ('post', reverse('posts:add_comment', args=(post_id,)),
+             self.client),
+            ('get', reverse('posts:profile_follow',
+                            args=(self.author.username,)), self.client),
+            ('get', reverse('posts:profile_unfollow',
+                            args=(self.author.username,)), self.client),
+            ('get', reverse('posts:search'), self.client),
+            ('get', reverse('posts:trending'), self.client),
+            ('post', reverse('posts:follow_bulk'), self.author_client,
+             {'username': [f'user{i}' for i in range(5)]}),
+        ]
+        checked = set()
+        for method, url, client, *data in requests:
+            with self.subTest(url=url):
+                response = getattr(client, method)(
+                    url, *data or [{'text': 'Текст', 'q': 'Пост'}]
+                )
+                recorder = response.wsgi_request.query_recorder
+                self.assertIsNotNone(recorder.budget)
+                self.assertEqual(recorder.problems(), [])
+                checked.add(response.wsgi_request.resolver_match.view_name)
+        self.assertEqual(
+            checked,
+            {name for name in collect_budgets() if name.startswith('posts:')}
+        )
+
+    def test_n_plus_one_fails(self):
+        """Повторяющийся запрос на каждый пост роняет тест."""
+        def lazy_paginator(posts, request, *args):
+            page_obj = get_paginator(posts, request, *args)
+            for post in page_obj:
+                Post.objects.get(pk=post.pk)
+            return page_obj
+
+        with mock.patch('posts.views.get_paginator', lazy_paginator):
+            with self.assertRaisesMessage(QueryBudgetExceeded, 'N+1'):
+                self.client.get(reverse('posts:index'))
+
+    def test_recorder_counts_each_database(self):
+        """Точки сохранения не считаются, бюджет действует на каждую базу."""
+        recorder = QueryRecorder(budget=2)
+        queries = [
+            ('default', 'SAVEPOINT "s1"'),
+            ('default', 'SELECT 1'),
+            ('shard1', 'SELECT 1'),
+            ('default', 'SELECT 2'),
+            ('shard1', 'SELECT 2'),
+            ('default', 'RELEASE SAVEPOINT "s1"'),
+        ]
+        for alias, sql in queries:
+            context = {'connection': SimpleNamespace(alias=alias)}
+            recorder(lambda *args: None, sql, None, False, context)
+        self.assertEqual(recorder.problems(), [])
+        context = {'connection': SimpleNamespace(alias='shard1')}
+        recorder(lambda *args: None, 'SELECT 3', None, False, context)
+        self.assertEqual(
+            [message for message, _ in recorder.problems()],
+            ['3 запросов к shard1 при бюджете 2'],
+        )
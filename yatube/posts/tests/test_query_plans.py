@@ -0,0 +1,117 @@
+import re
+from unittest import skipUnless
+
+from django.core.cache import cache
+from django.db import connection
+from django.test import Client, TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from posts.models import (Comment, Follow, Group, PopularAuthor, Post,
+                          User)
+from posts.utils import CursorPaginator
+
+# Полный проход по таблице без индекса: "SCAN posts_post" в SQLite
+# 3.36+ и "SCAN TABLE posts_post AS U0" в более старых версиях.
+FULL_SCAN = re.compile(r'^SCAN (?:TABLE )?\w+(?: AS \w+)?$')
+
+
+@skipUnless(connection.vendor == 'sqlite', 'EXPLAIN QUERY PLAN из SQLite')
+class QueryPlanTests(TestCase):
+    """Каждый запрос страниц приложения должен идти по индексу.
+    Тест падает, если в плане появляется полный проход по таблице
+    или сортировка во временном B-дереве.
+    """
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='author')
+        cls.reader = User.objects.create_user(username='reader')
+        cls.group = Group.objects.create(
+            title='Тестовая группа',
+            slug='test-slug',
+            description='Тестовое описание',
+        )
+        for i in range(25):
+            Post.objects.create(
+                author=cls.author, group=cls.group, text=f'Пост {i}'
+            )
+        cls.post = Post.objects.first()
+        Comment.objects.create(
+            post=cls.post, author=cls.reader, text='Комментарий'
+        )
+        Follow.objects.create(user=cls.reader, author=cls.author)
+
+    def setUp(self):
+        cache.clear()
+        self.client = Client()
+        self.client.force_login(self.reader)
+
+    def plan(self, sql):
+        with connection.cursor() as cursor:
+            cursor.execute('EXPLAIN QUERY PLAN ' + sql)
+            return [row[-1] for row in cursor.fetchall()]
+
+    def assert_indexed(self, url, client=None):
+        with CaptureQueriesContext(connection) as queries:
+            (client or self.client).get(url)
+        for query in queries.captured_queries:
+            sql = query['sql']
+            if not sql.startswith('SELECT'):
+                continue
+            for step in self.plan(sql):
+                with self.subTest(url=url, sql=sql, step=step):
+                    self.assertNotIn('USE TEMP B-TREE', step)
+                    self.assertIsNone(FULL_SCAN.match(step))
+
+    def test_views_use_indexes(self):
+        """Запросы лент, профиля и поста не сортируют и не сканируют."""
+        cursor = CursorPaginator(Post.objects.all(), 10).get_page(None)
+        urls = [
+            reverse('posts:index'),
+            reverse('posts:group_list', args=(self.group.slug,)),
+            reverse('posts:profile', args=(self.author.username,)),
+            reverse('posts:post_detail', args=(self.post.pk,)),
+            reverse('posts:follow_index'),
+        ]
+        for url in urls:
+            self.assert_indexed(url)
+            self.assert_indexed(url + '?page=2')
+            self.assert_indexed(url + f'?cursor={cursor.next_cursor}')
+
+    def test_full_scan_pattern(self):
+        """Полный проход узнается в планах старых и новых SQLite."""
+        cases = {
+            'SCAN posts_post': True,
+            'SCAN TABLE posts_post': True,
+            'SCAN TABLE posts_post AS U0': True,
+            'SCAN posts_post USING INDEX post_pub_date_id_idx': False,
+            'SEARCH posts_post USING INTEGER PRIMARY KEY (rowid=?)': False,
+            'SCAN SUBQUERY 1': False,
+        }
+        for step, full in cases.items():
+            with self.subTest(step=step):
+                self.assertEqual(bool(FULL_SCAN.match(step)), full)
+
+    def test_popular_authors_timeline_uses_indexes(self):
+        """Лента с подмешанными постами популярных авторов
+        тоже читается по индексам.
+        """
+        PopularAuthor.objects.create(author=self.author)
+        cursor = CursorPaginator(Post.objects.all(), 10).get_page(None)
+        url = reverse('posts:follow_index')
+        self.assert_indexed(url)
+        self.assert_indexed(url + '?page=2')
+        self.assert_indexed(url + f'?cursor={cursor.next_cursor}')
+
+    def test_anonymous_freshness_uses_indexes(self):
+        """Проверка свежести страниц для анонимов идет по индексам."""
+        urls = [
+            reverse('posts:index'),
+            reverse('posts:group_list', args=(self.group.slug,)),
+            reverse('posts:profile', args=(self.author.username,)),
+            reverse('posts:post_detail', args=(self.post.pk,)),
+        ]
+        for url in urls:
+            self.assert_indexed(url, Client())
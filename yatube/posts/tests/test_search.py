@@ -0,0 +1,137 @@
+from io import StringIO
+
+from django.core.management import call_command
+from django.db import connection
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+
+from posts import search
+from posts.models import Comment, Post, User
+
+
+class SearchTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='author')
+        cls.post = Post.objects.create(
+            author=cls.author, text='Пишем про котов и <b>собак</b>'
+        )
+        cls.other = Post.objects.create(
+            author=cls.author, text='Коты, коты и снова коты'
+        )
+        cls.comment = Comment.objects.create(
+            post=cls.post, author=cls.author, text='Мой пёс любит прогулки'
+        )
+
+    def setUp(self):
+        self.guest_client = Client()
+
+    def found(self, query, cursor=None):
+        response = self.guest_client.get(
+            reverse('posts:search'), {'q': query, 'cursor': cursor or ''}
+        )
+        return response.context['page_obj']
+
+    def test_ranked_results(self):
+        """Поиск находит посты по префиксу, лучшие совпадения первыми."""
+        hits = list(self.found('кот'))
+        self.assertEqual([hit.post for hit in hits], [self.other, self.post])
+        self.assertEqual(hits[0].kind, search.KIND_POST)
+
+    def test_comments_found(self):
+        """Поиск находит комментарии и ведет на их пост."""
+        hits = list(self.found('прогулк'))
+        self.assertEqual(len(hits), 1)
+        self.assertEqual(hits[0].kind, search.KIND_COMMENT)
+        self.assertEqual(hits[0].post, self.post)
+
+    def test_snippet_escaped(self):
+        """Совпадения выделяются <mark>, остальной текст экранируется."""
+        response = self.guest_client.get(
+            reverse('posts:search'), {'q': 'собак'}
+        )
+        self.assertContains(response, '&lt;b&gt;<mark>собак</mark>&lt;/b&gt;')
+
+    def test_query_syntax_is_not_passed(self):
+        """Операторы FTS5 во вводе не ломают запрос."""
+        queries = ['"', 'кот OR', 'NEAR(', '*', 'col:кот', '']
+        for query in queries:
+            with self.subTest(query=query):
+                self.assertEqual(
+                    self.guest_client.get(
+                        reverse('posts:search'), {'q': query}
+                    ).status_code,
+                    200,
+                )
+
+    def test_signals_keep_index(self):
+        """Правка и удаление постов и комментариев обновляют индекс."""
+        self.post.text = 'Теперь про енотов'
+        self.post.save()
+        self.assertEqual(len(self.found('енот')), 1)
+        self.assertEqual([h.post for h in self.found('кот')], [self.other])
+        self.comment.delete()
+        self.assertEqual(len(self.found('прогулк')), 0)
+        self.other.delete()
+        self.assertEqual(len(self.found('кот')), 0)
+
+    def test_keyset_pagination(self):
+        """Страницы по курсору не теряют и не повторяют результаты."""
+        for i in range(25):
+            Post.objects.create(author=self.author, text=f'жираф {i}')
+        seen = []
+        cursor = None
+        while True:
+            page = search.search('жираф', cursor, 10)
+            seen += [hit.post.pk for hit in page]
+            if not page.has_next():
+                break
+            cursor = page.next_cursor
+        self.assertEqual(len(seen), 25)
+        self.assertEqual(len(set(seen)), 25)
+
+    @override_settings(SEARCH_RANK_WINDOW=5)
+    def test_rank_window(self):
+        """Ранжируются только самые новые совпадения из окна."""
+        posts = [
+            Post.objects.create(author=self.author, text=f'жираф {i}')
+            for i in range(8)
+        ]
+        page = search.search('жираф', None, 3)
+        found = [hit.post for hit in page]
+        found += [hit.post for hit in search.search(
+            'жираф', page.next_cursor, 3
+        )]
+        self.assertCountEqual(found, posts[-5:])
+
+    def test_rebuild_command(self):
+        """Команда rebuild_search_index восстанавливает индекс."""
+        with connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {search.TABLE}')
+        self.assertEqual(len(self.found('кот')), 0)
+        call_command('rebuild_search_index', chunk_size=1, stdout=StringIO())
+        self.assertEqual(len(self.found('кот')), 2)
+        self.assertEqual(len(self.found('прогулк')), 1)
+
+    def test_rebuild_keeps_index_searchable(self):
+        """Во время перестроения поиск видит все строки,
+        а строки удаленных объектов после него пропадают.
+        """
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'INSERT INTO {search.TABLE} (rowid, text, kind, post_id) '
+                f'VALUES (%s, %s, %s, %s)',
+                [search.post_rowid(10 ** 6), 'Кот-призрак', 'post', 10 ** 6],
+            )
+        chunks = search.rebuild(chunk_size=1)
+        next(chunks)
+        self.assertEqual(
+            {hit.post for hit in search.search('кот', None, 10)},
+            {self.post, self.other},
+        )
+        self.assertEqual(len(search.search('прогулки', None, 10)), 1)
+        list(chunks)
+        with connection.cursor() as cursor:
+            cursor.execute(f'SELECT COUNT(*) FROM {search.TABLE}')
+            self.assertEqual(cursor.fetchone()[0], 3)
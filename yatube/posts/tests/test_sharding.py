@@ -0,0 +1,250 @@
+from io import StringIO
+from unittest import mock
+
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection, connections
+from django.test import Client, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from posts import feed_cache, search, sharding
+from posts.management.commands import reshard
+from posts.models import Comment, Follow, Group, Post, User, UserStats
+
+
+@override_settings(
+    POST_SHARDS=['default', 'shard1'], POST_SHARD_BUCKETS=4,
+    POST_SHARD_MAP_TTL=0, POST_SHARD_FREEZE_WAIT=0,
+)
+class ShardingTests(TransactionTestCase):
+    databases = {'default', 'shard1'}
+    # Журнал подписок начинается с id 1, как у графа, построенного
+    # перед тестом по пустому журналу.
+    reset_sequences = True
+
+    def setUp(self):
+        cache.clear()
+        sharding.reset_directory()
+        self.group = Group.objects.create(
+            title='Группа', slug='group', description='Описание'
+        )
+        # Соседние id попадают в соседние корзины, то есть на разные шарды.
+        authors = [
+            User.objects.create_user(username=f'author{i}') for i in range(2)
+        ]
+        self.remote, = [
+            author for author in authors
+            if sharding.shard_for_author(author.pk) == 'shard1'
+        ]
+        self.local, = [author for author in authors if author != self.remote]
+        self.posts = [
+            Post.objects.create(author=author, text='Пост', group=self.group)
+            for author in (self.local, self.remote) * 3
+        ]
+        self.reader = User.objects.create_user(username='reader')
+        for author in authors:
+            Follow.objects.create(user=self.reader, author=author)
+        self.client = Client()
+        self.reader_client = Client()
+        self.reader_client.force_login(self.reader)
+
+    def tearDown(self):
+        sharding.reset_directory()
+        # flush не очищает таблицу FTS5, а счетчики корзин очищает,
+        # и следующий тест выдал бы те же id.
+        with connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {search.TABLE}')
+
+    def remote_post(self):
+        return next(post for post in self.posts if post.author == self.remote)
+
+    def test_posts_stored_on_author_shard(self):
+        """Посты и комментарии лежат на шарде автора поста."""
+        post = self.remote_post()
+        self.reader_client.post(
+            reverse('posts:add_comment', args=(post.pk,)),
+            data={'text': 'Комментарий'},
+        )
+        for author, alias in ((self.remote, 'shard1'),
+                              (self.local, 'default')):
+            with self.subTest(alias=alias):
+                ids = Post.objects.using(alias).values_list('pk', flat=True)
+                self.assertEqual(
+                    set(ids),
+                    {post.pk for post in self.posts if post.author == author}
+                )
+                for pk in ids:
+                    self.assertGreaterEqual(pk, sharding.LEGACY_LIMIT)
+                    self.assertEqual(sharding.shard_for_post(pk), alias)
+        self.assertTrue(
+            Comment.objects.using('shard1').filter(post=post).exists()
+        )
+        self.assertFalse(Comment.objects.using('default').exists())
+
+    def test_author_pages_use_one_shard(self):
+        """Профиль и пост читают посты только с шарда автора."""
+        post = self.remote_post()
+        urls = [
+            reverse('posts:profile', args=(self.remote.username,)),
+            reverse('posts:post_detail', args=(post.pk,)),
+        ]
+        for url in urls:
+            with self.subTest(url=url):
+                with CaptureQueriesContext(connections['default']) as local, \
+                        CaptureQueriesContext(connections['shard1']) as remote:
+                    response = self.client.get(url)
+                self.assertEqual(response.status_code, 200)
+                self.assertContains(response, self.remote.username)
+                self.assertGreater(len(remote), 0)
+                for query in local:
+                    self.assertNotIn('"posts_post"', query['sql'])
+
+    def test_feeds_merge_shards(self):
+        """Ленты собирают посты всех шардов по дате публикации."""
+        expected = sorted(
+            self.posts, key=lambda post: (post.pub_date, post.pk),
+            reverse=True,
+        )
+        pages = {
+            reverse('posts:index'): self.client,
+            reverse('posts:group_list', args=(self.group.slug,)): self.client,
+            reverse('posts:follow_index'): self.reader_client,
+        }
+        for url, client in pages.items():
+            with self.subTest(url=url):
+                page = client.get(url).context['page_obj']
+                self.assertEqual(list(page), expected)
+                self.assertEqual(
+                    [post.author for post in page],
+                    [post.author for post in expected],
+                )
+
+    def test_legacy_post_found_by_id(self):
+        """Пост, созданный до включения шардов, открывается по id."""
+        legacy = Post.objects.create(pk=7, author=self.local, text='Старый')
+        self.assertIsNone(sharding.shard_for_post(legacy.pk))
+        response = self.client.get(
+            reverse('posts:post_detail', args=(legacy.pk,))
+        )
+        self.assertEqual(response.context['post'], legacy)
+
+    def test_reshard_moves_bucket(self):
+        """reshard переносит корзину с постами и комментариями."""
+        post = self.remote_post()
+        Comment.objects.create(post=post, author=self.reader, text='Текст')
+        bucket = sharding.bucket_of_author(self.remote.pk)
+        call_command(
+            'reshard', bucket=[bucket], to='default', settle=0,
+            stdout=StringIO(),
+        )
+        self.assertEqual(sharding.shard_for_author(self.remote.pk), 'default')
+        self.assertFalse(Post.objects.using('shard1').exists())
+        self.assertFalse(Comment.objects.using('shard1').exists())
+        self.assertEqual(
+            Post.objects.using('default').filter(author=self.remote).count(),
+            3
+        )
+        response = self.client.get(
+            reverse('posts:post_detail', args=(post.pk,))
+        )
+        self.assertContains(response, 'Текст')
+        new = Post.objects.create(author=self.remote, text='После переноса')
+        self.assertGreater(new.pk, max(post.pk for post in self.posts))
+        self.assertEqual(sharding.shard_for_post(new.pk), 'default')
+
+    def test_interrupted_reshard_shows_posts_once(self):
+        """Пока источник не очищен, ленты и счетчики видят пост
+        и комментарий один раз, а кеш лент сброшен.
+        """
+        post = self.remote_post()
+        Comment.objects.create(post=post, author=self.reader, text='Текст')
+        bucket = sharding.bucket_of_author(self.remote.pk)
+        version = feed_cache.feed_version('index')
+        with mock.patch.object(
+            reshard.Command, 'purge', side_effect=RuntimeError
+        ), self.assertRaises(RuntimeError):
+            call_command(
+                'reshard', bucket=[bucket], to='default', settle=0,
+                stdout=StringIO(),
+            )
+        self.assertEqual(Post.objects.using('shard1').count(), 3)
+        self.assertNotEqual(feed_cache.feed_version('index'), version)
+        self.assertEqual(Post.objects.count(), len(self.posts))
+        self.assertEqual(Comment.objects.count(), 1)
+        page = self.client.get(reverse('posts:index')).context['page_obj']
+        self.assertEqual(
+            sorted(post.pk for post in page),
+            sorted(post.pk for post in self.posts),
+        )
+        self.assertEqual(page.paginator.count, len(self.posts))
+
+    def test_frozen_bucket_rejects_writes(self):
+        """Пока корзина переносится, запись в нее не проходит."""
+        bucket = sharding.bucket_of_author(self.remote.pk)
+        cache.set(sharding.FROZEN_KEY.format(bucket=bucket), True)
+        with self.assertRaises(sharding.ShardFrozen):
+            Post.objects.create(author=self.remote, text='Пост')
+        Post.objects.create(author=self.local, text='Пост')
+
+    def test_deletes_reach_every_shard(self):
+        """Удаление группы и пользователей доходит до постов
+        и комментариев на других шардах.
+        """
+        post = self.remote_post()
+        Comment.objects.create(post=post, author=self.reader, text='Текст')
+        self.group.delete()
+        self.reader.delete()
+        for alias in ('default', 'shard1'):
+            with self.subTest(alias=alias):
+                posts = Post.objects.using(alias)
+                self.assertFalse(posts.filter(group__isnull=False).exists())
+                self.assertFalse(Comment.objects.using(alias).exists())
+        self.remote.delete()
+        self.assertFalse(Post.objects.using('shard1').exists())
+        self.assertEqual(Post.objects.using('default').count(), 3)
+
+    def test_foreign_keys_constrained_on_default(self):
+        """Ограничения внешних ключей есть в default,
+        на шарде без пользователей и групп их нет.
+        """
+        for alias, expected in (('default', {'author_id', 'group_id'}),
+                                ('shard1', set())):
+            with self.subTest(alias=alias):
+                db = connections[alias]
+                with db.cursor() as cursor:
+                    constraints = db.introspection.get_constraints(
+                        cursor, Post._meta.db_table
+                    )
+                self.assertEqual(
+                    {
+                        column for constraint in constraints.values()
+                        if constraint['foreign_key']
+                        for column in constraint['columns']
+                    },
+                    expected,
+                )
+
+    def test_repair_counters_counts_every_shard(self):
+        """repair_counters складывает посты со всех шардов."""
+        post = self.remote_post()
+        UserStats.objects.filter(user=self.remote).update(posts_count=0)
+        Group.objects.filter(pk=self.group.pk).update(posts_count=0)
+        Post.objects.filter(pk=post.pk).update(comments_count=2)
+        call_command('repair_counters', batch_size=1, stdout=StringIO())
+        self.assertEqual(
+            UserStats.objects.get(user=self.remote).posts_count, 3
+        )
+        self.assertEqual(UserStats.objects.get(user=self.local).posts_count, 3)
+        self.group.refresh_from_db()
+        self.assertEqual(self.group.posts_count, 6)
+        post.refresh_from_db()
+        self.assertEqual(post.comments_count, 0)
+
+    def test_admin_search_reads_index_on_default(self):
+        """Поиск в админке находит посты всех шардов."""
+        found = search.filter_posts(Post.objects.all(), 'пост')
+        self.assertEqual(
+            sorted(post.pk for post in found),
+            sorted(post.pk for post in self.posts),
+        )
@@ -0,0 +1,98 @@
+from io import StringIO
+
+from django.core.management import call_command
+from django.test import Client, TestCase
+from django.urls import reverse
+
+from posts import suggestions
+from posts.follow_graph import Adjacency, FollowGraph
+from posts.models import Follow, FollowSuggestion, User
+
+
+def graph_of(pairs):
+    return FollowGraph(
+        Adjacency.from_pairs(sorted(pairs)),
+        Adjacency.from_pairs(sorted((author, user) for user, author in pairs)),
+    )
+
+
+class SuggestTests(TestCase):
+    # 1 читает 2 и 3; 2 читает 4 и 5; 3 читает 4, 6 и 7; 8 читает 5.
+    PAIRS = [
+        (1, 2), (1, 3), (2, 4), (2, 5), (3, 4), (3, 6), (3, 7), (8, 5),
+    ]
+
+    def test_scores(self):
+        """Общий посредник поднимает автора, подписки и сам читатель
+        в рекомендации не попадают.
+        """
+        graph = graph_of(self.PAIRS + [(2, 1), (3, 2)])
+        expected = {
+            'common': [4, 5, 6, 7],
+            'adamic-adar': [4, 5, 6, 7],
+            # У 5 двое подписчиков, у 6 и 7 по одному.
+            'jaccard': [4, 6, 7, 5],
+        }
+        for score, authors in expected.items():
+            with self.subTest(score=score):
+                ranked = suggestions.suggest(graph, 1, 10, score)
+                self.assertEqual([pk for pk, _ in ranked], authors)
+        self.assertEqual(
+            len(suggestions.suggest(graph, 1, 2, 'common')), 2
+        )
+
+    def test_max_degree_skips_middle(self):
+        """Посредник с множеством подписок пропускается."""
+        graph = graph_of(self.PAIRS)
+        ranked = suggestions.suggest(graph, 1, 10, 'common', max_degree=2)
+        self.assertEqual([pk for pk, _ in ranked], [4, 5])
+
+
+class SuggestFollowsCommandTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.users = [
+            User.objects.create_user(username=f'user{i}') for i in range(4)
+        ]
+        reader, friend, author, other = cls.users
+        Follow.objects.create(user=reader, author=friend)
+        Follow.objects.create(user=friend, author=author)
+        Follow.objects.create(user=friend, author=other)
+
+    def setUp(self):
+        self.client = Client()
+        self.client.force_login(self.users[0])
+
+    def run_command(self):
+        call_command('suggest_follows', chunk_size=1, stdout=StringIO())
+
+    def test_pages_show_suggestions(self):
+        """Профиль и лента подписок показывают рассчитанных авторов."""
+        self.run_command()
+        urls = [
+            reverse('posts:profile', args=(self.users[1].username,)),
+            reverse('posts:follow_index'),
+        ]
+        for url in urls:
+            with self.subTest(url=url):
+                response = self.client.get(url)
+                self.assertEqual(
+                    [item.author for item in response.context['suggestions']],
+                    self.users[2:],
+                )
+
+    def test_followed_and_stale_suggestions_hidden(self):
+        """Новая подписка скрывает рекомендацию, пересчет удаляет
+        рекомендации тех, кто больше ни на кого не подписан.
+        """
+        self.run_command()
+        Follow.objects.create(user=self.users[0], author=self.users[2])
+        self.assertEqual(
+            [item.author for item in suggestions.for_user(self.users[0])],
+            [self.users[3]],
+        )
+        Follow.objects.filter(user=self.users[0]).delete()
+        self.run_command()
+        self.assertFalse(
+            FollowSuggestion.objects.filter(user=self.users[0]).exists()
+        )
@@ -0,0 +1,112 @@
+import shutil
+import tempfile
+from io import StringIO
+from unittest import mock
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import connection
+from django.test import Client, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from sorl.thumbnail import default, get_thumbnail
+
+from posts import feed_cache, thumbnails
+from posts.models import Post, User
+
+TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+
+SMALL_GIF = (
+    b'\x47\x49\x46\x38\x39\x61\x02\x00'
+    b'\x01\x00\x80\x00\x00\x00\x00\x00'
+    b'\xFF\xFF\xFF\x21\xF9\x04\x00\x00'
+    b'\x00\x00\x00\x2C\x00\x00\x00\x00'
+    b'\x02\x00\x01\x00\x00\x02\x02\x0C'
+    b'\x0A\x00\x3B'
+)
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT, THUMBNAIL_WORKERS=0)
+class ThumbnailTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='author')
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        cache.clear()
+        self.client = Client()
+        self.client.force_login(self.user)
+
+    def upload(self, name='small.gif'):
+        return SimpleUploadedFile(name, SMALL_GIF, content_type='image/gif')
+
+    def test_thumbnail_name_matches_sorl(self):
+        """Имя превью совпадает с тем, что создает get_thumbnail."""
+        post = Post.objects.create(
+            author=self.user, text='Пост', image=self.upload()
+        )
+        created = get_thumbnail(
+            post.image.name, thumbnails.GEOMETRY, **thumbnails.OPTIONS
+        )
+        self.assertEqual(
+            thumbnails.thumbnail_file(post.image.name).name, created.name
+        )
+
+    def test_upload_builds_only_variants(self):
+        """Для загрузки создаются варианты картинки, а превью sorl - нет."""
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(
+                reverse('posts:post_create'),
+                data={'text': 'С картинкой', 'image': self.upload()},
+            )
+        call_command('build_image_variants', stdout=StringIO())
+        post = Post.objects.get(text='С картинкой')
+        self.assertEqual(post.image_variants['source'], post.image.name)
+        thumbnail = thumbnails.thumbnail_file(post.image.name)
+        self.assertIsNone(default.kvstore.get(thumbnail))
+
+    def test_missing_thumbnail_falls_back_to_original(self):
+        """Без превью и вариантов шаблон получает исходник без ресайза."""
+        post = Post.objects.create(
+            author=self.user, text='Пост', image=self.upload('pending.gif')
+        )
+        with mock.patch('sorl.thumbnail.base.ThumbnailBackend'
+                        '._create_thumbnail') as resize:
+            response = self.client.get(
+                reverse('posts:post_detail', args=(post.pk,))
+            )
+        resize.assert_not_called()
+        self.assertContains(response, post.image.url)
+
+    def test_page_lookup_is_batched(self):
+        """Превью всей страницы ищутся одним запросом к хранилищу."""
+        for i in range(10):
+            post = Post.objects.create(
+                author=self.user, text=f'Пост {i}',
+                image=self.upload(f'page{i}.gif'),
+            )
+            get_thumbnail(
+                post.image.name, thumbnails.GEOMETRY, **thumbnails.OPTIONS
+            )
+        for cached, expected in ((False, 1), (True, 0)):
+            if not cached:
+                cache.clear()
+            else:
+                feed_cache.bump('index')
+            with self.subTest(cached=cached):
+                with CaptureQueriesContext(connection) as queries:
+                    response = self.client.get(reverse('posts:index'))
+                lookups = [
+                    query for query in queries.captured_queries
+                    if 'thumbnail_kvstore' in query['sql']
+                ]
+                self.assertEqual(len(lookups), expected)
+                self.assertContains(response, '/cache/', count=10)
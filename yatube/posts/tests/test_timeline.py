@@ -0,0 +1,112 @@
+from django.core.paginator import Paginator
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+
+from posts.models import Follow, PopularAuthor, Post, TimelineEntry, User
+from posts.timeline import CURSOR_KEYS, timeline_posts
+from posts.utils import CursorPaginator
+
+
+class TimelineTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='author')
+        cls.reader = User.objects.create_user(username='reader')
+        cls.old_post = Post.objects.create(
+            author=cls.author, text='Пост до подписки'
+        )
+
+    def setUp(self):
+        self.reader_client = Client()
+        self.reader_client.force_login(self.reader)
+        self.author_client = Client()
+        self.author_client.force_login(self.author)
+
+    def feed(self):
+        response = self.reader_client.get(reverse('posts:follow_index'))
+        return list(response.context['page_obj'])
+
+    def test_follow_backfills_timeline(self):
+        """Подписка добавляет в ленту уже опубликованные посты автора."""
+        self.reader_client.get(
+            reverse('posts:profile_follow', args=(self.author.username,))
+        )
+        self.assertTrue(
+            TimelineEntry.objects.filter(
+                user=self.reader, post=self.old_post
+            ).exists()
+        )
+        self.assertEqual(self.feed(), [self.old_post])
+
+    def test_post_create_fans_out(self):
+        """Новый пост из post_create попадает в ленты подписчиков."""
+        Follow.objects.create(user=self.reader, author=self.author)
+        self.author_client.post(
+            reverse('posts:post_create'), data={'text': 'Новый пост'}
+        )
+        post = Post.objects.get(text='Новый пост')
+        self.assertTrue(
+            TimelineEntry.objects.filter(user=self.reader, post=post).exists()
+        )
+        self.assertEqual(self.feed(), [post, self.old_post])
+
+    def test_unfollow_prunes_timeline(self):
+        """Отписка убирает посты автора из ленты."""
+        Follow.objects.create(user=self.reader, author=self.author)
+        self.reader_client.get(
+            reverse('posts:profile_unfollow', args=(self.author.username,))
+        )
+        self.assertFalse(
+            TimelineEntry.objects.filter(user=self.reader).exists()
+        )
+        self.assertEqual(self.feed(), [])
+
+    @override_settings(TIMELINE_FANOUT_LIMIT=1)
+    def test_popular_author_is_pulled_on_read(self):
+        """Посты популярного автора не раскладываются, а читаются из Post."""
+        fan = User.objects.create_user(username='fan')
+        Follow.objects.create(user=self.reader, author=self.author)
+        Follow.objects.create(user=fan, author=self.author)
+        post = Post.objects.create(author=self.author, text='Для всех')
+        self.assertTrue(
+            PopularAuthor.objects.filter(author=self.author).exists()
+        )
+        self.assertFalse(
+            TimelineEntry.objects.filter(post=post).exists()
+        )
+        self.assertEqual(self.feed(), [post, self.old_post])
+
+    def test_merged_feed_pages(self):
+        """Лента с популярными авторами листается по порядку,
+        без повторов и пропусков.
+        """
+        stars = [
+            User.objects.create_user(username=f'star{i}') for i in range(2)
+        ]
+        for author in (self.author, *stars):
+            Follow.objects.create(user=self.reader, author=author)
+        for i in range(7):
+            for author in (self.author, *stars):
+                Post.objects.create(author=author, text=f'Пост {i}')
+        # Посты звезд уже разложены по лентам: ветки пересекаются.
+        for author in stars:
+            PopularAuthor.objects.create(author=author)
+        expected = list(Post.objects.order_by('-pub_date', '-pk'))
+        feed = timeline_posts(self.reader)
+        paginator = Paginator(feed, 4)
+        self.assertEqual(paginator.count, len(expected))
+        by_number = [
+            post for number in paginator.page_range
+            for post in paginator.page(number)
+        ]
+        by_cursor, cursor = [], None
+        while True:
+            page = CursorPaginator(feed, 4, CURSOR_KEYS).get_page(cursor)
+            by_cursor += list(page)
+            cursor = page.next_cursor
+            if cursor is None:
+                break
+        for name, posts in (('page', by_number), ('cursor', by_cursor)):
+            with self.subTest(paginator=name):
+                self.assertEqual(posts, expected)
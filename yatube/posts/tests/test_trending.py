@@ -0,0 +1,139 @@
+import threading
+from datetime import timedelta
+from unittest import mock
+
+from django.core.cache import cache
+from django.db import connection
+from django.db.models import Sum
+from django.test import Client, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from core.middleware.replica import STICKY_COOKIE
+
+from posts import trending
+from posts.models import (Comment, Follow, Group, Post, TrendingCursor,
+                          TrendingEvent, TrendingScore, User)
+
+
+@override_settings(TRENDING_VIEW_FLUSH=0, TRENDING_HALF_LIFE=3600)
+class TrendingTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.reader = User.objects.create_user(username='reader')
+        cls.groups = [
+            Group.objects.create(
+                title=f'Группа {i}', slug=f'group-{i}', description='Описание'
+            )
+            for i in range(2)
+        ]
+        cls.authors = [
+            User.objects.create_user(username=f'author{i}') for i in range(3)
+        ]
+        cls.posts = [
+            Post.objects.create(author=author, group=group, text='Пост')
+            for author, group in zip(cls.authors, cls.groups + [None])
+        ]
+
+    def setUp(self):
+        cache.clear()
+        # Просмотры из других тестов копятся в памяти процесса.
+        trending.flush_views()
+        TrendingEvent.objects.all().delete()
+        self.client = Client()
+
+    def score(self, kind, pk):
+        return TrendingScore.objects.get(kind=kind, object_id=pk).score
+
+    def test_ranking_by_engagement(self):
+        """Комментарии, просмотры и подписки на автора поднимают пост,
+        его группу - комментарии и просмотры ее постов.
+        """
+        first, second, third = self.posts
+        Comment.objects.create(post=second, author=self.reader, text='Да')
+        for _ in range(3):
+            self.client.get(reverse('posts:post_detail', args=(first.pk,)))
+        Follow.objects.create(user=self.reader, author=self.authors[2])
+        self.client.get(reverse('posts:post_detail', args=(third.pk,)))
+        trending.refresh()
+        self.assertEqual(
+            cache.get(trending.POSTS_KEY), [third.pk, second.pk, first.pk]
+        )
+        self.assertEqual(
+            cache.get(trending.GROUPS_KEY),
+            [self.groups[1].pk, self.groups[0].pk],
+        )
+
+    def test_cached_views_are_counted(self):
+        """Просмотры страниц из кеша и ответы 304 тоже считаются."""
+        url = reverse('posts:post_detail', args=(self.posts[0].pk,))
+        etag = None
+        for _ in range(4):
+            etag = self.client.get(url)['ETag']
+        self.assertEqual(
+            self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304
+        )
+        self.client.get(reverse('posts:post_detail', args=(10 ** 9,)))
+        views = TrendingEvent.objects.filter(kind=TrendingEvent.VIEW)
+        self.assertEqual(
+            views.aggregate(total=Sum('count'))['total'], 5
+        )
+        self.assertEqual(
+            set(views.values_list('post_id', flat=True)), {self.posts[0].pk}
+        )
+
+    @override_settings(TRENDING_VIEW_FLUSH=0.01)
+    def test_views_flushed_by_timer(self):
+        """Накопленные просмотры пишет таймер, без новых просмотров."""
+        flushed = threading.Event()
+        with mock.patch.object(
+            trending, 'flush_views', side_effect=flushed.set
+        ):
+            trending.count_view(self.posts[0].pk)
+            self.assertTrue(flushed.wait(5))
+        trending.flush_views()
+
+    def test_view_flush_keeps_reader_on_replica(self):
+        """Запись просмотров не делает анонимный GET пишущим."""
+        post = self.posts[0]
+        response = self.client.get(
+            reverse('posts:post_detail', args=(post.pk,))
+        )
+        self.assertEqual(
+            TrendingEvent.objects.get(kind=TrendingEvent.VIEW).post_id,
+            post.pk,
+        )
+        self.assertNotIn(STICKY_COOKIE, response.cookies)
+
+    def test_refresh_processes_only_new_events(self):
+        """Повторный запуск не учитывает события второй раз,
+        а старые оценки затухают.
+        """
+        post = self.posts[0]
+        Comment.objects.create(post=post, author=self.reader, text='Да')
+        trending.refresh()
+        self.assertFalse(TrendingEvent.objects.exists())
+        score = self.score(TrendingScore.POST, post.pk)
+        TrendingCursor.objects.filter(source='decay').update(
+            updated=timezone.now() - timedelta(hours=1)
+        )
+        trending.refresh()
+        self.assertAlmostEqual(
+            self.score(TrendingScore.POST, post.pk), score / 2, places=3
+        )
+
+    def test_page_reads_ranked_ids(self):
+        """Страница показывает посты в порядке списка из кеша
+        и не агрегирует по постам и комментариям.
+        """
+        ids = [post.pk for post in reversed(self.posts)]
+        cache.set(trending.POSTS_KEY, ids)
+        cache.set(trending.GROUPS_KEY, [self.groups[1].pk])
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('posts:trending'))
+        self.assertEqual(list(response.context['page_obj']), self.posts[::-1])
+        self.assertEqual(response.context['groups'], [self.groups[1]])
+        for query in queries:
+            self.assertNotIn('COUNT(', query['sql'])
+            self.assertNotIn('"posts_comment"', query['sql'])
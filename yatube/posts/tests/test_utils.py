@@ -0,0 +1,140 @@
+from django.core.cache import cache
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+
+from posts.models import Follow, Group, Post, User
+from posts.utils import (CachedCountPaginator, CursorPaginator,
+                         decode_cursor)
+
+
+class CursorPaginatorTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='auth')
+        cls.follower = User.objects.create_user(username='follower')
+        cls.group = Group.objects.create(
+            title='Тестовая группа',
+            slug='test-slug',
+            description='Тестовое описание',
+        )
+        # Общая дата у части постов проверяет разрешение
+        # коллизий по id.
+        posts = Post.objects.bulk_create(
+            Post(author=cls.user, group=cls.group, text=f'Пост {i}')
+            for i in range(23)
+        )
+        pub_date = Post.objects.first().pub_date
+        Post.objects.filter(
+            pk__in=[post.pk for post in posts][:12]
+        ).update(pub_date=pub_date)
+        Follow.objects.create(user=cls.follower, author=cls.user)
+
+    def setUp(self):
+        cache.clear()
+        self.client = Client()
+        self.client.force_login(self.follower)
+
+    def walk(self, url):
+        """Проходит ленту по ссылкам "следующая" до конца."""
+        seen = []
+        cursor = ''
+        while True:
+            response = self.client.get(url, {'cursor': cursor})
+            page_obj = response.context['page_obj']
+            seen.extend(post.pk for post in page_obj)
+            if not page_obj.has_next():
+                return seen, page_obj
+            cursor = page_obj.next_cursor
+
+    def test_cursor_walk_matches_offset_order(self):
+        """Курсорный обход всех лент выдает все посты без повторов."""
+        expected = list(
+            Post.objects.order_by('-pub_date', '-pk')
+            .values_list('pk', flat=True)
+        )
+        urls = [
+            reverse('posts:index'),
+            reverse('posts:group_list', kwargs={'slug': self.group.slug}),
+            reverse('posts:profile', kwargs={'username': self.user}),
+            reverse('posts:follow_index'),
+        ]
+        for url in urls:
+            with self.subTest(url=url):
+                seen, _ = self.walk(url)
+                self.assertEqual(seen, expected)
+
+    def test_previous_cursor_returns_previous_page(self):
+        """Ссылка "предыдущая" возвращает ту же страницу, что была."""
+        paginator = CursorPaginator(Post.objects.all(), 10)
+        first = paginator.get_page(None)
+        second = paginator.get_page(first.next_cursor)
+        back = paginator.get_page(second.previous_cursor)
+        self.assertEqual(list(back), list(first))
+        self.assertFalse(back.has_previous())
+        self.assertTrue(back.has_next())
+
+    def test_cursor_page_does_not_count(self):
+        """Страница выбирается одним запросом без COUNT(*)."""
+        paginator = CursorPaginator(Post.objects.all(), 10)
+        cursor = paginator.get_page(None).next_cursor
+        with self.assertNumQueries(1):
+            page_obj = paginator.get_page(cursor)
+            self.assertEqual(len(page_obj), 10)
+
+    def test_broken_cursor_returns_first_page(self):
+        """Поврежденный токен дает первую страницу."""
+        self.assertIsNone(decode_cursor('not-a-cursor'))
+        response = self.client.get(
+            reverse('posts:index'), {'cursor': '%%%'}
+        )
+        page_obj = response.context['page_obj']
+        self.assertFalse(page_obj.has_previous())
+        self.assertEqual(len(page_obj), 10)
+
+    @override_settings(CURSOR_PAGINATION=True)
+    def test_cursor_mode_from_settings(self):
+        """Настройка включает курсорные ссылки в paginator.html."""
+        response = self.client.get(reverse('posts:index'))
+        page_obj = response.context['page_obj']
+        self.assertContains(response, f'?cursor={page_obj.next_cursor}')
+        self.assertNotContains(response, '?page=2')
+
+
+class CachedCountPaginatorTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='auth')
+        Post.objects.bulk_create(
+            Post(author=cls.user, text=f'Пост {i}') for i in range(500)
+        )
+
+    def setUp(self):
+        cache.clear()
+
+    def test_count_is_cached(self):
+        """Повторный подсчет той же ленты не ходит в базу."""
+        posts = Post.objects.filter(author=self.user)
+        self.assertEqual(CachedCountPaginator(posts, 10).count, 500)
+        with self.assertNumQueries(0):
+            self.assertEqual(CachedCountPaginator(posts, 10).count, 500)
+
+    def test_count_invalidated_on_create_and_delete(self):
+        """Создание и удаление поста сбрасывает кеш размеров лент."""
+        posts = Post.objects.filter(author=self.user)
+        CachedCountPaginator(posts, 10).count
+        post = Post.objects.create(author=self.user, text='Новый пост')
+        self.assertEqual(CachedCountPaginator(posts, 10).count, 501)
+        post.delete()
+        self.assertEqual(CachedCountPaginator(posts, 10).count, 500)
+
+    def test_elided_page_range_is_bounded(self):
+        """Число ссылок на страницы не растет вместе с лентой."""
+        response = self.client.get(reverse('posts:index'), {'page': 25})
+        page_obj = response.context['page_obj']
+        page_range = list(page_obj.elided_page_range)
+        self.assertLess(len(page_range), 10)
+        self.assertIn(25, page_range)
+        self.assertContains(response, '?page=50')
+        self.assertNotContains(response, '?page=40"')
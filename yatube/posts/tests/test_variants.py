@@ -0,0 +1,137 @@
+import io
+import shutil
+import tempfile
+from io import StringIO
+from unittest import mock
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+from PIL import Image
+
+from posts import variants
+from posts.models import Post, User
+
+TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+
+
+def jpeg(width, height):
+    buffer = io.BytesIO()
+    Image.new('RGB', (width, height), 'green').save(buffer, 'JPEG')
+    return SimpleUploadedFile(
+        f'photo{width}.jpg', buffer.getvalue(), content_type='image/jpeg'
+    )
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT, THUMBNAIL_WORKERS=0)
+class ImageVariantsTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='author')
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        cache.clear()
+        self.client = Client()
+        self.client.force_login(self.user)
+
+    def create_post(self, upload, build=True):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(
+                reverse('posts:post_create'),
+                data={'text': 'С картинкой', 'image': upload},
+            )
+        if build:
+            call_command('build_image_variants', stdout=StringIO())
+        return Post.objects.latest('pk')
+
+    def test_no_inline_encoding_without_pool(self):
+        """Без пула загрузка не перекодирует картинку в запросе."""
+        with mock.patch('posts.variants.encode') as encode:
+            post = self.create_post(jpeg(1000, 500), build=False)
+        encode.assert_not_called()
+        self.assertEqual(post.image_variants, {})
+        out = StringIO()
+        call_command('build_image_variants', '--dry-run', stdout=out)
+        self.assertIn('постов без вариантов: 1', out.getvalue())
+
+    def test_variants_created_on_upload(self):
+        """После build_image_variants у поста все ширины во всех форматах."""
+        post = self.create_post(jpeg(2000, 1000))
+        self.assertEqual(post.image_variants['source'], post.image.name)
+        mimes = [mime for _, _, mime, _ in variants.formats()]
+        self.assertEqual(list(post.image_variants['formats']), mimes)
+        for mime, files in post.image_variants['formats'].items():
+            with self.subTest(mime=mime):
+                self.assertEqual(
+                    [file['width'] for file in files], [480, 960, 1440]
+                )
+                for file in files:
+                    self.assertTrue(default_storage.exists(file['name']))
+                    size = Image.open(default_storage.path(file['name'])).size
+                    self.assertEqual(size, (file['width'], file['height']))
+                    self.assertAlmostEqual(
+                        file['height'] / file['width'], 339 / 960, places=2
+                    )
+
+    def test_no_upscale(self):
+        """Картинка уже самой малой ширины дает только одну копию."""
+        post = self.create_post(jpeg(300, 200))
+        for files in post.image_variants['formats'].values():
+            self.assertEqual([file['width'] for file in files], [480])
+
+    def test_picture_markup(self):
+        """Страница поста выводит <picture> со srcset вариантов."""
+        post = self.create_post(jpeg(1000, 500))
+        response = self.client.get(
+            reverse('posts:post_detail', args=(post.pk,))
+        )
+        self.assertContains(response, '<picture>')
+        self.assertContains(response, 'type="image/webp"')
+        self.assertContains(response, ' 480w, ')
+        self.assertContains(response, variants.fallback_url(post))
+
+    def test_cached_feed_picks_up_variants(self):
+        """Закешированная лента показывает варианты, как только они
+        записаны, а не через FEED_CACHE_TIMEOUT.
+        """
+        post = self.create_post(jpeg(1000, 500), build=False)
+        pages = (
+            reverse('posts:index'),
+            reverse('posts:profile', args=(self.user.username,)),
+            reverse('posts:post_detail', args=(post.pk,)),
+        )
+        for page in pages:
+            self.assertNotContains(self.client.get(page), '<source')
+        call_command('build_image_variants', stdout=StringIO())
+        post.refresh_from_db()
+        for page in pages:
+            with self.subTest(page=page):
+                self.assertContains(
+                    self.client.get(page), variants.fallback_url(post)
+                )
+
+    def test_stale_variants_ignored(self):
+        """Варианты прежней картинки не выводятся после ее замены."""
+        post = self.create_post(jpeg(1000, 500))
+        Post.objects.filter(pk=post.pk).update(image='posts/other.jpg')
+        post.refresh_from_db()
+        self.assertEqual(variants.sources(post), [])
+        self.assertIsNone(variants.fallback_url(post))
+
+    def test_reupload_reuses_variants(self):
+        """Повторная загрузка той же картинки не перекодирует ее."""
+        first = self.create_post(jpeg(1000, 500))
+        with mock.patch('posts.variants.encode') as encode:
+            second = self.create_post(jpeg(1000, 500), build=False)
+        encode.assert_not_called()
+        self.assertEqual(second.image_variants, first.image_variants)
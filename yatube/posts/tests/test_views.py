@@ -4,12 +4,15 @@ from django import forms
 from django.core.cache import cache
 from django.core.files.uploadedfile import SimpleUploadedFile
 from django.db import models
-from django.test import Client, TestCase
+from django.test import Client, TestCase, override_settings
 from django.urls import reverse
 
 from posts.models import Follow, Group, Post, User
 
 
+# Пул превью в тестах не запускается: его процессы не видят
+# тестовую базу.
+@override_settings(THUMBNAIL_WORKERS=0)
 class PostPagesTests(TestCase):
     @classmethod
     def setUpClass(cls):
@@ -56,6 +59,7 @@ class PostPagesTests(TestCase):
         )
 
     def setUp(self):
+        cache.clear()
         self.guest_client = Client()
         self.authorized_client = Client()
         self.authorized_client.force_login(self.user)
@@ -263,12 +267,13 @@ class PostPagesTests(TestCase):
         response = self.authorized_client.get(reverse('posts:index'))
         response_post = response.context['page_obj'][0]
         self.assertEqual(post, response_post)
-        post.delete()
         response_2 = self.authorized_client.get(reverse('posts:index'))
         self.assertEqual(response.content, response_2.content)
-        cache.clear()
+        post_url = reverse('posts:post_detail', args=(post.pk,))
+        post.delete()
         response_3 = self.authorized_client.get(reverse('posts:index'))
         self.assertNotEqual(response.content, response_3.content)
+        self.assertNotContains(response_3, f'"{post_url}"')
 
     def test_follow(self):
         """Зарегистрированный пользователь может подписываться."""
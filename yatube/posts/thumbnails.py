@@ -0,0 +1,146 @@
+import logging
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from multiprocessing import get_context
+from typing import Iterable, Optional
+
+import django
+from django.conf import settings
+from django.db.models.fields.files import ImageFieldFile
+from sorl.thumbnail import default
+from sorl.thumbnail import delete as delete_thumbnails
+from sorl.thumbnail.conf import defaults as sorl_defaults
+from sorl.thumbnail.conf import settings as sorl_settings
+from sorl.thumbnail.images import ImageFile, deserialize_image_file
+from sorl.thumbnail.kvstores.base import add_prefix
+from sorl.thumbnail.kvstores.cached_db_kvstore import (
+    EMPTY_VALUE, KVStore as CachedDbKVStore
+)
+from sorl.thumbnail.models import KVStore as KVStoreModel
+
+from .models import Post
+
+logger = logging.getLogger(__name__)
+
+# Превью sorl есть только у постов, загруженных до вариантов
+# картинок (posts.variants): новые не создаются, готовые
+# показываются, пока у поста нет вариантов.
+GEOMETRY = '960x339'
+OPTIONS = {'crop': 'center', 'upscale': True}
+
+_executor = None
+
+
+def executor() -> ProcessPoolExecutor:
+    """Пул процессов, общий для всех запросов этого процесса.
+    Процессы запускаются через spawn и сами настраивают Django:
+    соединения с базой, унаследованные через fork, использовать
+    нельзя.
+    """
+    global _executor
+    if _executor is None:
+        _executor = ProcessPoolExecutor(
+            max_workers=settings.THUMBNAIL_WORKERS,
+            mp_context=get_context('spawn'),
+            initializer=django.setup,
+        )
+    return _executor
+
+
+def forget_broken(error: BaseException) -> None:
+    """Упавший пул не принимает задачи, следующая создаст новый."""
+    global _executor
+    if isinstance(error, BrokenProcessPool):
+        _executor = None
+
+
+def thumbnail_file(name: str) -> ImageFile:
+    """Файл превью, который создаст get_thumbnail(name, GEOMETRY).
+    Имя считается так же, как в ThumbnailBackend.get_thumbnail,
+    но без чтения исходника.
+    """
+    backend = default.backend
+    source = ImageFile(name)
+    options = dict(OPTIONS)
+    if sorl_settings.THUMBNAIL_PRESERVE_FORMAT:
+        options.setdefault('format', backend._get_format(source))
+    for key, value in backend.default_options.items():
+        options.setdefault(key, value)
+    for key, attr in backend.extra_options:
+        value = getattr(sorl_settings, attr)
+        if value != getattr(sorl_defaults, attr):
+            options.setdefault(key, value)
+    return ImageFile(
+        backend._get_thumbnail_filename(source, GEOMETRY, options),
+        default.storage,
+    )
+
+
+def _lookup(thumbnails: list) -> dict:
+    """Записи хранилища sorl для превью: {имя превью: ImageFile}.
+    Вместо запроса к кешу и к базе на каждое превью, как в
+    KVStore.get, делает один get_many и один запрос к базе
+    для ключей, которых нет в кеше.
+    """
+    kvstore = default.kvstore
+    if not isinstance(kvstore, CachedDbKVStore):
+        return {
+            thumbnail.name: kvstore.get(thumbnail)
+            for thumbnail in thumbnails
+        }
+    keys = {add_prefix(thumbnail.key): thumbnail for thumbnail in thumbnails}
+    values = {
+        key: value for key, value in kvstore.cache.get_many(keys).items()
+        if value != EMPTY_VALUE
+    }
+    missing = [key for key in keys if key not in values]
+    if missing:
+        found = dict(
+            KVStoreModel.objects.filter(key__in=missing)
+            .values_list('key', 'value')
+        )
+        kvstore.cache.set_many(found, sorl_settings.THUMBNAIL_CACHE_TIMEOUT)
+        values.update(found)
+    return {
+        thumbnail.name: deserialize_image_file(values[key])
+        for key, thumbnail in keys.items() if key in values
+    }
+
+
+def resolve(images: list) -> dict:
+    """Адреса превью для картинок images: {имя исходника: адрес}.
+    Изображения в запросе не обрабатываются: если превью нет,
+    отдается адрес исходника.
+    """
+    images = [image for image in images if image]
+    files = {image.name: thumbnail_file(image.name) for image in images}
+    ready = _lookup(list(files.values()))
+    urls = {}
+    for image in images:
+        thumbnail = ready.get(files[image.name].name)
+        urls[image.name] = (
+            thumbnail.url if thumbnail is not None else image.url
+        )
+    return urls
+
+
+def resolve_page(posts: Iterable[Post]) -> None:
+    """Проставляет post.image_url всем постам страницы сразу."""
+    posts = [post for post in posts if post.image]
+    urls = resolve([post.image for post in posts])
+    for post in posts:
+        post.image_url = urls[post.image.name]
+
+
+def thumbnail_url(image: ImageFieldFile) -> Optional[str]:
+    """Адрес превью одной картинки, см. resolve()."""
+    if not image:
+        return None
+    return resolve([image])[image.name]
+
+
+def delete(name: str) -> None:
+    """Удаляет превью исходника name и их записи в хранилище sorl.
+    Сам исходник не трогается.
+    """
+    delete_thumbnails(name, delete_file=False)
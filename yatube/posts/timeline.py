@@ -0,0 +1,264 @@
+from functools import reduce
+from operator import or_
+
+from django.conf import settings
+from django.db import connection, connections
+from django.db.models import F, Q, QuerySet
+
+from . import feed_cache, follow_graph, sharding
+from .models import Follow, PopularAuthor, Post, TimelineEntry, User
+from .sharding import ShardedQuerySet
+
+
+def fanout_limit() -> int:
+    """Число подписчиков, после которого автор считается популярным."""
+    return getattr(settings, 'TIMELINE_FANOUT_LIMIT', 1000)
+
+
+def backfill_size() -> int:
+    """Сколько последних постов автора попадает в ленту при подписке."""
+    return getattr(settings, 'TIMELINE_BACKFILL_SIZE', 500)
+
+
+def is_popular(author_id: int) -> bool:
+    return PopularAuthor.objects.filter(author_id=author_id).exists()
+
+
+def fan_out_post(post: Post) -> None:
+    """Раскладывает новый пост по лентам подписчиков автора.
+    Если подписчиков больше лимита, автор помечается популярным,
+    и его посты дальше подмешиваются в ленты при чтении.
+    С несколькими шардами лента читается с шардов, см. timeline_posts.
+    """
+    if sharding.enabled() or is_popular(post.author_id):
+        return
+    followers = list(
+        Follow.objects.filter(author_id=post.author_id)
+        .values_list('user_id', flat=True)[:fanout_limit() + 1]
+    )
+    if len(followers) > fanout_limit():
+        PopularAuthor.objects.get_or_create(author_id=post.author_id)
+        return
+    TimelineEntry.objects.bulk_create(
+        [TimelineEntry(user_id=user_id, post=post, pub_date=post.pub_date)
+         for user_id in followers],
+        batch_size=500,
+        ignore_conflicts=True,
+    )
+    feed_cache.bump(*[f'follow:{user_id}' for user_id in followers])
+
+
+def backfill(user_id: int, author_id: int) -> None:
+    """Добавляет в ленту нового подписчика последние посты автора."""
+    backfill_many(user_id, [author_id])
+
+
+def backfill_many(user_id: int, author_ids: list) -> None:
+    """Добавляет в ленту последние посты каждого из авторов.
+    Одним INSERT ... SELECT: ROW_NUMBER() отбирает по индексу
+    (author, pub_date, id) не больше backfill_size() постов автора.
+    """
+    if sharding.enabled():
+        return
+    popular = set(
+        PopularAuthor.objects.filter(author_id__in=author_ids)
+        .values_list('author_id', flat=True)
+    )
+    author_ids = [pk for pk in author_ids if pk not in popular]
+    if not author_ids:
+        return
+    placeholders = ', '.join(['%s'] * len(author_ids))
+    sql = (
+        f'INSERT INTO {TimelineEntry._meta.db_table} '
+        f'(user_id, post_id, pub_date) '
+        f'SELECT %s, id, pub_date FROM ('
+        f'SELECT id, pub_date, ROW_NUMBER() OVER ('
+        f'PARTITION BY author_id ORDER BY pub_date DESC, id DESC'
+        f') AS position FROM {Post._meta.db_table} '
+        f'WHERE author_id IN ({placeholders})'
+        f') WHERE position <= %s '
+        f'ON CONFLICT (user_id, post_id) DO NOTHING'
+    )
+    with connection.cursor() as cursor:
+        cursor.execute(sql, [user_id, *author_ids, backfill_size()])
+
+
+def prune(user_id: int, author_id: int) -> None:
+    """Убирает из ленты посты автора, от которого пользователь отписался.
+    """
+    prune_many(user_id, [author_id])
+
+
+def prune_many(user_id: int, author_ids: list) -> None:
+    if sharding.enabled():
+        return
+    TimelineEntry.objects.filter(
+        user_id=user_id,
+        post__in=Post.objects.filter(author_id__in=author_ids).values('id'),
+    ).delete()
+
+
+def touch_post(post_id: int) -> None:
+    """Сбрасывает кеш лент подписок, в которые разложен пост."""
+    readers = TimelineEntry.objects.filter(post_id=post_id).values_list(
+        'user_id', flat=True
+    )
+    feed_cache.bump(*[f'follow:{user_id}' for user_id in readers])
+
+
+def forget_post(post_id: int) -> None:
+    touch_post(post_id)
+    TimelineEntry.objects.filter(post_id=post_id).delete()
+
+
+# Поля, по которым сортируется и листается лента подписок.
+CURSOR_KEYS = ('feed_date', 'feed_id')
+
+
+class MergedFeedQuerySet(ShardedQuerySet):
+    """Лента, собранная из нескольких веток.
+    Общий запрос с OR по веткам SQLite сортирует во временном
+    B-дереве. Поэтому срез (страница) читается так: каждая ветка
+    выбирает ключи сортировки не больше high_mark строк по своему
+    индексу, ветки соединяются одним UNION ALL и сливаются здесь,
+    а посты страницы читаются вторым запросом по pk.
+    filter() и order_by() повторяются на ветках, count() и текст
+    запроса - от общего запроса.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._branches = ()
+
+    def _clone(self):
+        clone = super()._clone()
+        clone._branches = self._branches
+        return clone
+
+    def with_branches(self, *branches):
+        """branches - пары (условие в общем запросе, queryset ветки)."""
+        clone = self.filter(reduce(or_, (query for query, _ in branches)))
+        clone._branches = tuple(queryset for _, queryset in branches)
+        return clone
+
+    def _filter_or_exclude(self, negate, args, kwargs):
+        clone = super()._filter_or_exclude(negate, args, kwargs)
+        clone._branches = tuple(
+            branch._filter_or_exclude(negate, args, kwargs)
+            for branch in self._branches
+        )
+        return clone
+
+    def order_by(self, *field_names):
+        clone = super().order_by(*field_names)
+        clone._branches = tuple(
+            branch.order_by(*field_names) for branch in self._branches
+        )
+        return clone
+
+    def _page_keys(self, names: list, high: int) -> list:
+        """Строки (pk, *ключи сортировки) всех веток одним запросом."""
+        parts, params = [], []
+        for branch in self._branches:
+            sql, branch_params = (
+                branch.values_list('pk', *names)[:high].query
+                .sql_with_params()
+            )
+            parts.append(f'SELECT * FROM ({sql})')
+            params.extend(branch_params)
+        with connections[self.db].cursor() as cursor:
+            cursor.execute(' UNION ALL '.join(parts), params)
+            return cursor.fetchall()
+
+    def _merge(self) -> list:
+        low, high = self.query.low_mark, self.query.high_mark
+        ordering = self._ordering()
+        rows = self._page_keys([name for name, _ in ordering], high)
+        # Ключи ленты всегда сортируются в одну сторону.
+        rows.sort(key=lambda row: row[1:], reverse=ordering[0][1])
+        # Пост автора, ставшего популярным, мог остаться в ленте.
+        pks = list(dict.fromkeys(row[0] for row in rows))[low:high]
+        clone = self._chain()
+        clone._branches = ()
+        clone.query.clear_limits()
+        found = clone.in_bulk(pks)
+        return [found[pk] for pk in pks if pk in found]
+
+    def _fetch_all(self):
+        if (self._result_cache is None and self._branches
+                and self.query.high_mark is not None):
+            self._result_cache = self._merge()
+        super()._fetch_all()
+
+
+def pulled_authors(user: User) -> list:
+    """Авторы, чьи посты подмешиваются в ленту user при чтении:
+    популярные, а с несколькими шардами - все авторы подписки.
+    """
+    if sharding.enabled():
+        return list(follow_graph.followees(user.pk))
+    return list(
+        PopularAuthor.objects.filter(
+            author_id__in=follow_graph.followees(user.pk)
+        ).values_list('author_id', flat=True)
+    )
+
+
+def feed_namespaces(user: User, pulled: list) -> list:
+    """Пространства имен кеша ленты подписок user.
+    follow:<id> меняют подписки и раскладка постов по ленте,
+    посты авторов pulled в ленту не раскладываются, поэтому
+    к ней добавляются их profile:<id>.
+    """
+    return [f'follow:{user.pk}'] + [
+        f'profile:{author_id}' for author_id in pulled
+    ]
+
+
+def timeline_posts(user: User, pulled: list = None) -> QuerySet:
+    """Лента подписок пользователя.
+    Посты обычных авторов читаются из материализованной ленты,
+    посты популярных авторов, на которых подписан пользователь,
+    подмешиваются при чтении.
+    Лента отсортирована по CURSOR_KEYS: в обычном случае это
+    колонки TimelineEntry, и страница читается по индексу
+    (user, pub_date, post) без сортировки. С популярными авторами
+    страница сливается из ленты и постов каждого автора,
+    см. MergedFeedQuerySet.
+    С несколькими шардами посты лежат отдельно от ленты, поэтому
+    посты всех авторов подписки читаются с каждого шарда по индексу
+    (author, pub_date, id) и сливаются по дате.
+    pulled - уже найденные pulled_authors(user).
+    """
+    if pulled is None:
+        pulled = pulled_authors(user)
+    if sharding.enabled():
+        return (
+            Post.objects.select_related('author', 'group')
+            .filter(author_id__in=pulled)
+            .annotate(feed_date=F('pub_date'), feed_id=F('pk'))
+            .order_by('-feed_date', '-feed_id')
+        )
+    posts = Post.objects.select_related('author', 'group')
+    materialized = posts.filter(timeline_entries__user=user).annotate(
+        feed_date=F('timeline_entries__pub_date'),
+        feed_id=F('timeline_entries__post_id'),
+    )
+    if not pulled:
+        return materialized.order_by('-feed_date', '-feed_id')
+    # Ветка на каждого популярного автора: тогда страница автора
+    # читается по индексу (author, pub_date, id) без сортировки.
+    own_date = {'feed_date': F('pub_date'), 'feed_id': F('pk')}
+    branches = [(
+        Q(pk__in=TimelineEntry.objects.filter(user=user).values('post')),
+        materialized,
+    )] + [
+        (Q(author_id=author_id),
+         posts.filter(author_id=author_id).annotate(**own_date))
+        for author_id in pulled
+    ]
+    return (
+        MergedFeedQuerySet(Post).select_related('author', 'group')
+        .with_branches(*branches).annotate(**own_date)
+        .order_by('-feed_date', '-feed_id')
+    )
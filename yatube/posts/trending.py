@@ -0,0 +1,270 @@
+"""Популярные посты и группы по затухающей оценке вовлеченности.
+
+Вовлеченность - просмотры и комментарии поста и подписки на его
+автора. Каждое событие добавляет вес из TRENDING_WEIGHTS, который
+уменьшается вдвое каждые TRENDING_HALF_LIFE секунд. Оценки хранятся
+в TrendingScore и пересчитываются командой refresh_trending по
+расписанию: она обрабатывает только события после прошлого запуска
+(очередь TrendingEvent и журнал FollowEvent) и кладет готовые списки
+id в кеш. Страница популярного читает списки из кеша и ничего не
+агрегирует по Post и Comment.
+
+Просмотры считает core.middleware.view_counter, в том числе страниц
+из кеша анонимных страниц и ответов 304. Они копятся в памяти процесса
+и пишутся одной строкой на пост фоновым таймером через
+TRENDING_VIEW_FLUSH секунд после первого просмотра, а также при выходе
+процесса. Запись идет в default мимо роутера реплик: просмотр
+не делает запрос читателя пишущим (cookie прилипания к default,
+см. core.db_routers).
+"""
+import atexit
+import threading
+from collections import Counter, defaultdict
+from typing import List, Optional
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.paginator import Page, Paginator
+from django.db import DEFAULT_DB_ALIAS, connection, connections, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .models import (FollowEvent, Group, Post, TrendingCursor, TrendingEvent,
+                     TrendingScore)
+from yatube.settings import num_posts
+
+POSTS_KEY = 'trending:posts'
+GROUPS_KEY = 'trending:groups'
+WEIGHTS = {'view': 1, 'comment': 5, 'follow': 10}
+
+
+def half_life() -> float:
+    return getattr(settings, 'TRENDING_HALF_LIFE', 60 * 60 * 6)
+
+
+def weights() -> dict:
+    return {**WEIGHTS, **getattr(settings, 'TRENDING_WEIGHTS', {})}
+
+
+def decay(seconds: float) -> float:
+    return 0.5 ** (max(seconds, 0) / half_life())
+
+
+_views = Counter()
+_flush_timer = [None]
+_views_lock = threading.Lock()
+
+
+def count_view(post_id: int) -> None:
+    """Учитывает просмотр в памяти процесса. Первый просмотр после
+    записи заводит таймер flush_views; при TRENDING_VIEW_FLUSH = 0
+    просмотр пишется сразу.
+    """
+    delay = getattr(settings, 'TRENDING_VIEW_FLUSH', 10)
+    timer = None
+    with _views_lock:
+        _views[post_id] += 1
+        if delay and _flush_timer[0] is None:
+            timer = _flush_timer[0] = threading.Timer(
+                delay, _flush_in_background
+            )
+            timer.daemon = True
+    if not delay:
+        flush_views()
+    elif timer is not None:
+        timer.start()
+
+
+def discard_views() -> None:
+    """Забывает накопленные просмотры и останавливает таймер."""
+    with _views_lock:
+        _views.clear()
+        timer, _flush_timer[0] = _flush_timer[0], None
+    if timer is not None:
+        timer.cancel()
+
+
+def post_viewed(request, post_id) -> None:
+    """Счетчик для core.middleware.view_counter.counts_views."""
+    count_view(int(post_id))
+
+
+def _flush_in_background() -> None:
+    try:
+        flush_views()
+    finally:
+        # Соединения потока таймера иначе остались бы открытыми.
+        connections.close_all()
+
+
+def flush_views() -> None:
+    with _views_lock:
+        pending = dict(_views)
+        _views.clear()
+        _flush_timer[0] = None
+    if not pending:
+        return
+    # Явная база не спрашивает роутер, и запрос остается читающим:
+    # страницы популярного читают оценки, а не очередь событий.
+    TrendingEvent.objects.using(DEFAULT_DB_ALIAS).bulk_create([
+        TrendingEvent(kind=TrendingEvent.VIEW, post_id=post_id, count=count)
+        for post_id, count in pending.items()
+    ])
+
+
+atexit.register(flush_views)
+
+
+def record_comment(post_id: int) -> None:
+    TrendingEvent.objects.create(kind=TrendingEvent.COMMENT, post_id=post_id)
+
+
+def _chunks(items: list, size: int = 500):
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+def _post_scores(since: int, now, found: dict) -> int:
+    """Оценки постов из новых событий очереди, found[id] += вес.
+    Возвращает id последнего события.
+    """
+    events = (
+        TrendingEvent.objects.filter(id__gt=since).order_by('id')
+        .values_list('id', 'kind', 'post_id', 'count', 'created')
+    )
+    event_weights = weights()
+    for event_id, kind, post_id, count, created in events.iterator():
+        age = (now - created).total_seconds()
+        found[post_id] += event_weights[kind] * count * decay(age)
+        since = event_id
+    return since
+
+
+def _author_scores(since: int, now, found: dict) -> int:
+    events = (
+        FollowEvent.objects.filter(id__gt=since).order_by('id')
+        .values_list('id', 'author_id', 'followed', 'created')
+    )
+    weight = weights()['follow']
+    for event_id, author_id, followed, created in events.iterator():
+        if followed:
+            found[author_id] += weight * decay((now - created).total_seconds())
+        since = event_id
+    return since
+
+
+def _add_scores(deltas: dict) -> None:
+    sql = (
+        f'INSERT INTO {TrendingScore._meta.db_table} '
+        f'(kind, object_id, score) VALUES (%s, %s, %s) '
+        f'ON CONFLICT (kind, object_id) '
+        f'DO UPDATE SET score = score + excluded.score'
+    )
+    with connection.cursor() as cursor:
+        cursor.executemany(
+            sql, [(kind, pk, score) for (kind, pk), score in deltas.items()]
+        )
+
+
+def refresh() -> dict:
+    """Добавляет к оценкам события после прошлого запуска и
+    обновляет списки в кеше. Возвращает число обработанных объектов.
+    """
+    now = timezone.now()
+    with transaction.atomic():
+        cursors = {
+            cursor.source: cursor
+            for cursor in TrendingCursor.objects.all()
+        }
+        if 'decay' in cursors:
+            age = (now - cursors['decay'].updated).total_seconds()
+            TrendingScore.objects.update(score=F('score') * decay(age))
+            TrendingScore.objects.filter(
+                score__lt=getattr(settings, 'TRENDING_MIN_SCORE', 0.01)
+            ).delete()
+        posts, authors = defaultdict(float), defaultdict(float)
+        last = {
+            'events': _post_scores(
+                getattr(cursors.get('events'), 'last_id', 0), now, posts
+            ),
+            'follows': _author_scores(
+                getattr(cursors.get('follows'), 'last_id', 0), now, authors
+            ),
+            'decay': 0,
+        }
+        deltas = defaultdict(float)
+        for chunk in _chunks(list(posts)):
+            rows = Post.objects.filter(pk__in=chunk).values_list(
+                'pk', 'group_id'
+            )
+            # Удаленные посты пропускаются.
+            for pk, group_id in rows:
+                deltas[TrendingScore.POST, pk] += posts[pk]
+                if group_id is not None:
+                    deltas[TrendingScore.GROUP, group_id] += posts[pk]
+        for author_id, score in authors.items():
+            deltas[TrendingScore.AUTHOR, author_id] += score
+        _add_scores(deltas)
+        for source, last_id in last.items():
+            TrendingCursor.objects.update_or_create(
+                source=source, defaults={'last_id': last_id, 'updated': now}
+            )
+        TrendingEvent.objects.filter(id__lte=last['events']).delete()
+    ranked = rank()
+    return {'objects': len(deltas), **ranked}
+
+
+def rank() -> dict:
+    """Кладет в кеш id самых популярных постов и групп.
+    Оценка поста - его собственная плюс оценка автора.
+    """
+    size = getattr(settings, 'TRENDING_SIZE', 100)
+    candidates = dict(
+        TrendingScore.objects.filter(kind=TrendingScore.POST)
+        .order_by('-score').values_list('object_id', 'score')[:size * 3]
+    )
+    post_authors = dict(
+        Post.objects.filter(pk__in=list(candidates))
+        .values_list('pk', 'author_id')
+    )
+    author_scores = dict(
+        TrendingScore.objects.filter(
+            kind=TrendingScore.AUTHOR,
+            object_id__in=set(post_authors.values()),
+        ).values_list('object_id', 'score')
+    )
+    post_ids = sorted(
+        post_authors,
+        key=lambda pk: (
+            candidates[pk] + author_scores.get(post_authors[pk], 0), pk
+        ),
+        reverse=True,
+    )[:size]
+    group_ids = list(
+        TrendingScore.objects.filter(kind=TrendingScore.GROUP)
+        .order_by('-score').values_list('object_id', flat=True)
+        [:getattr(settings, 'TRENDING_GROUPS', 10)]
+    )
+    cache.set(POSTS_KEY, post_ids, None)
+    cache.set(GROUPS_KEY, group_ids, None)
+    return {'posts': len(post_ids), 'groups': len(group_ids)}
+
+
+def posts_page(number: Optional[str]) -> Page:
+    """Страница популярных постов: один запрос по id из кеша."""
+    page = Paginator(cache.get(POSTS_KEY) or [], num_posts).get_page(number)
+    found = {
+        post.pk: post
+        for post in Post.objects.select_related('author', 'group')
+        .filter(pk__in=list(page.object_list))
+    }
+    page.object_list = [
+        found[pk] for pk in page.object_list if pk in found
+    ]
+    return page
+
+
+def groups() -> List[Group]:
+    ids = cache.get(GROUPS_KEY) or []
+    found = Group.objects.in_bulk(ids)
+    return [found[pk] for pk in ids if pk in found]
@@ -4,6 +4,27 @@ from . import views
 
 app_name = 'posts'
 
+# Сколько SQL-запросов может сделать каждое представление, включая
+# загрузку сессии и пользователя. Проверяется QueryBudgetMiddleware.
+query_budgets = {
+    'index': 5,
+    'group_list': 6,
+    'profile': 7,
+    'post_detail': 5,
+    'post_create': 12,
+    # Правка сбрасывает кеш лент подписок, в которые разложен пост.
+    'post_edit': 11,
+    'add_comment': 9,
+    # С популярными авторами страница читается двумя запросами,
+    # после чужих подписок граф дочитывает журнал еще одним.
+    'follow_index': 8,
+    'profile_follow': 10,
+    'profile_unfollow': 9,
+    'follow_bulk': 10,
+    'search': 5,
+    'trending': 4,
+}
+
 urlpatterns = [
     path('', views.index, name='index'),
     path('group/<slug:slug>/', views.group_posts, name='group_list'),
@@ -14,6 +35,9 @@ urlpatterns = [
     path('posts/<int:post_id>/comment/', views.add_comment,
          name='add_comment'),
     path('follow/', views.follow_index, name='follow_index'),
+    path('follow/bulk/', views.follow_bulk, name='follow_bulk'),
+    path('search/', views.search, name='search'),
+    path('trending/', views.trending_index, name='trending'),
     path(
         'profile/<str:username>/follow/',
         views.profile_follow,
@@ -1,22 +1,247 @@
-from typing import Union
+import base64
+import binascii
+import hashlib
+from collections.abc import Sequence
+from datetime import datetime
+from typing import Optional, Union
 
+from django.conf import settings
+from django.core.cache import cache
+from django.core.exceptions import EmptyResultSet
 from django.core.paginator import Page, Paginator
+from django.db.models import Q, QuerySet
 from django.http import HttpRequest
+from django.utils.functional import cached_property
 
 from yatube.settings import num_posts
 
 from .models import Group, Post, User
 
+CURSOR_NEXT = 'n'
+CURSOR_PREVIOUS = 'p'
+
+COUNT_GENERATION_KEY = 'paginator:count:generation'
+
+
+def invalidate_page_counts() -> None:
+    """Сбрасывает закешированные размеры всех лент.
+    Вызывается из сигналов при изменении постов и подписок:
+    смена поколения делает старые ключи недостижимыми.
+    """
+    try:
+        cache.incr(COUNT_GENERATION_KEY)
+    except ValueError:
+        cache.set(COUNT_GENERATION_KEY, 1, None)
+
+
+class ElidedPage(Page):
+    """Страница, которая отдает сокращенный список номеров страниц."""
+
+    @property
+    def elided_page_range(self):
+        return self.paginator.get_elided_page_range(
+            self.number, on_each_side=2, on_ends=1
+        )
+
+
+class CachedCountPaginator(Paginator):
+    """Paginator, который не пересчитывает COUNT(*) на каждый запрос.
+    Размер выборки кешируется по тексту SQL-запроса, то есть отдельно
+    для каждой ленты, группы и автора, до следующего изменения
+    постов или подписок.
+    """
+
+    def _count_cache_key(self):
+        generation = cache.get_or_set(COUNT_GENERATION_KEY, 1, None)
+        query = str(self.object_list.query).encode()
+        digest = hashlib.md5(query).hexdigest()
+        return f'paginator:count:{generation}:{digest}'
+
+    @cached_property
+    def count(self):
+        if not isinstance(self.object_list, QuerySet):
+            return super().count
+        try:
+            key = self._count_cache_key()
+        except EmptyResultSet:
+            return 0
+        # get_or_set: после сброса поколения COUNT(*) считает
+        # один процесс, см. core.cache_backends.sqlite.
+        return cache.get_or_set(
+            key, self.object_list.count,
+            getattr(settings, 'PAGINATOR_COUNT_TIMEOUT', 300),
+        )
+
+    def _get_page(self, *args, **kwargs):
+        return ElidedPage(*args, **kwargs)
+
+
+def encode_cursor(pub_date: datetime, pk: int, direction: str) -> str:
+    """Упаковывает позицию в ленте в непрозрачный токен для ?cursor=."""
+    raw = f'{direction}|{pub_date.isoformat()}|{pk}'.encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_cursor(token: str) -> Optional[tuple]:
+    """Распаковывает токен курсора.
+    Возвращает кортеж (направление, дата, id) или None,
+    если токен поврежден.
+    """
+    try:
+        padded = token + '=' * (-len(token) % 4)
+        raw = base64.urlsafe_b64decode(padded.encode()).decode()
+        direction, pub_date, pk = raw.split('|')
+        if direction not in (CURSOR_NEXT, CURSOR_PREVIOUS):
+            return None
+        return direction, datetime.fromisoformat(pub_date), int(pk)
+    except (binascii.Error, UnicodeError, ValueError):
+        return None
+
+
+def _key_value(item, key):
+    # Строки .values() - словари, остальное - экземпляры моделей.
+    return item[key] if isinstance(item, dict) else getattr(item, key)
+
+
+class CursorPage(Sequence):
+    """Страница курсорной пагинации.
+    Повторяет интерфейс django.core.paginator.Page в той части,
+    которая нужна шаблонам, но вместо номеров страниц отдает
+    токены соседних страниц.
+    """
+
+    is_cursor = True
+
+    def __init__(self, object_list, paginator, cursor, has_next,
+                 has_previous):
+        self.object_list = object_list
+        self.paginator = paginator
+        self.keys = paginator.keys
+        self.cursor = cursor
+        self._has_next = has_next
+        self._has_previous = has_previous
+
+    def __repr__(self):
+        return f'<CursorPage {self.cursor or "first"}>'
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def __getitem__(self, index):
+        return self.object_list[index]
+
+    def has_next(self):
+        return self._has_next
+
+    def has_previous(self):
+        return self._has_previous
+
+    def has_other_pages(self):
+        return self._has_next or self._has_previous
+
+    @property
+    def next_cursor(self):
+        if not self._has_next:
+            return None
+        date_key, id_key = self.keys
+        last = self.object_list[-1]
+        return encode_cursor(
+            _key_value(last, date_key), _key_value(last, id_key), CURSOR_NEXT
+        )
+
+    @property
+    def previous_cursor(self):
+        if not self._has_previous:
+            return None
+        date_key, id_key = self.keys
+        first = self.object_list[0]
+        return encode_cursor(
+            _key_value(first, date_key), _key_value(first, id_key),
+            CURSOR_PREVIOUS
+        )
+
+
+class CursorPaginator:
+    """Курсорная (keyset) пагинация по паре (pub_date, id).
+    Каждая страница выбирается одним запросом по диапазону индекса,
+    без OFFSET и без COUNT(*), поэтому глубина страницы
+    не влияет на стоимость запроса.
+    Вместо (pub_date, pk) можно передать в keys другую пару полей
+    или аннотаций с теми же значениями, если лента сортируется
+    по колонкам другой таблицы.
+    """
+
+    def __init__(self, object_list: QuerySet, per_page: int,
+                 keys: tuple = ('pub_date', 'pk')):
+        self.object_list = object_list
+        self.per_page = per_page
+        self.keys = keys
+
+    def _range(self, pub_date, pk, op):
+        date_key, id_key = self.keys
+        # Первое условие задает границу диапазона по индексу,
+        # второе отсекает записи с той же датой до курсора.
+        return (
+            Q(**{f'{date_key}__{op}e': pub_date})
+            & (Q(**{f'{date_key}__{op}': pub_date})
+               | Q(**{f'{id_key}__{op}': pk}))
+        )
+
+    def _ordered(self, descending=True):
+        sign = '-' if descending else ''
+        return self.object_list.order_by(*(sign + key for key in self.keys))
+
+    def _after(self, pub_date, pk):
+        return self._ordered().filter(self._range(pub_date, pk, 'lt'))
+
+    def _before(self, pub_date, pk):
+        return self._ordered(descending=False).filter(
+            self._range(pub_date, pk, 'gt')
+        )
+
+    def get_page(self, cursor: Optional[str]) -> CursorPage:
+        """Возвращает страницу по токену курсора.
+        Пустой или поврежденный токен дает первую страницу.
+        """
+        position = decode_cursor(cursor) if cursor else None
+        if position is None:
+            rows = list(self._ordered()[:self.per_page + 1])
+            return CursorPage(
+                rows[:self.per_page], self, None,
+                has_next=len(rows) > self.per_page,
+                has_previous=False,
+            )
+        direction, pub_date, pk = position
+        if direction == CURSOR_NEXT:
+            rows = list(self._after(pub_date, pk)[:self.per_page + 1])
+            return CursorPage(
+                rows[:self.per_page], self, cursor,
+                has_next=len(rows) > self.per_page,
+                has_previous=True,
+            )
+        rows = list(self._before(pub_date, pk)[:self.per_page + 1])
+        return CursorPage(
+            rows[:self.per_page][::-1], self, cursor,
+            has_next=True,
+            has_previous=len(rows) > self.per_page,
+        )
+
 
 def get_paginator(
-        posts: Union[Group, Post, User], request: HttpRequest
-) -> Page:
+        posts: Union[Group, Post, User], request: HttpRequest,
+        keys: tuple = ('pub_date', 'pk')
+) -> Union[Page, CursorPage]:
     """Функция описывает работу пагинации.
     Создается объект, на вход которого передают список,
     и число элементов которое требуется выводить на одну страницу.
     Выводит полученный список страниц.
+    Если в запросе передан ?cursor= или в настройках включен
+    CURSOR_PAGINATION, используется курсорная пагинация по полям keys.
     """
-    paginator = Paginator(posts, num_posts)
+    cursor = request.GET.get('cursor')
+    if cursor is not None or getattr(settings, 'CURSOR_PAGINATION', False):
+        return CursorPaginator(posts, num_posts, keys).get_page(cursor)
+    paginator = CachedCountPaginator(posts, num_posts)
     page_number = request.GET.get('page')
     page_obj = paginator.get_page(page_number)
     return page_obj
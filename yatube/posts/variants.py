@@ -0,0 +1,217 @@
+import hashlib
+import io
+import logging
+from functools import partial
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from PIL import Image, ImageOps
+
+from . import feed_cache, timeline
+from .models import Post
+from .thumbnails import executor, forget_broken
+
+try:
+    # AVIF в Pillow добавляет отдельный плагин.
+    import pillow_avif  # noqa: F401
+except ImportError:
+    pass
+
+logger = logging.getLogger(__name__)
+
+# Форматы в порядке предпочтения: браузер берет первый <source>,
+# который умеет показывать. JPEG остается запасным для <img>.
+FORMATS = (
+    ('AVIF', 'avif', 'image/avif', {'quality': 50}),
+    ('WEBP', 'webp', 'image/webp', {'quality': 80, 'method': 4}),
+    ('JPEG', 'jpg', 'image/jpeg', {'quality': 82, 'progressive': True}),
+)
+# Пропорции кадра совпадают с превью 960x339 из posts.thumbnails.
+ASPECT = (960, 339)
+SIZES = '(max-width: 960px) 100vw, 960px'
+
+
+def widths() -> tuple:
+    return getattr(settings, 'IMAGE_VARIANT_WIDTHS', (480, 960, 1440))
+
+
+def formats() -> list:
+    """Форматы, которые умеет записывать установленный Pillow."""
+    Image.init()
+    return [fmt for fmt in FORMATS if fmt[0] in Image.SAVE]
+
+
+def _pending_key(post_id: int, name: str) -> str:
+    digest = hashlib.md5(name.encode()).hexdigest()
+    return f'variants:pending:{post_id}:{digest}'
+
+
+def _stem(name: str) -> str:
+    return hashlib.md5(name.encode()).hexdigest()
+
+
+def _variant_name(name: str, width: int, extension: str) -> str:
+    stem = _stem(name)
+    return f'posts/variants/{stem[:2]}/{stem}-{width}.{extension}'
+
+
+def files(name: str) -> list:
+    """Файлы вариантов исходника name, которые есть в хранилище.
+    Ищутся по имени, а не по записи в посте: так находятся и
+    копии, записи о которых не сохранились.
+    """
+    stem = _stem(name)
+    directory = f'posts/variants/{stem[:2]}'
+    try:
+        _, names = default_storage.listdir(directory)
+    except FileNotFoundError:
+        return []
+    return [
+        f'{directory}/{filename}' for filename in names
+        if filename.startswith(f'{stem}-')
+    ]
+
+
+def delete(name: str) -> None:
+    """Удаляет варианты исходника name."""
+    for variant in files(name):
+        default_storage.delete(variant)
+
+
+def encode(image: Image.Image, name: str) -> dict:
+    """Кадрирует и перекодирует картинку во все ширины и форматы.
+    Ширины больше исходной пропускаются, кроме самой малой:
+    увеличенная копия весит больше, а четче не становится.
+    """
+    image = ImageOps.exif_transpose(image).convert('RGB')
+    targets = [w for w in widths() if w <= image.width] or [min(widths())]
+    result = {'source': name, 'formats': {}}
+    for pil_format, extension, mime, options in formats():
+        files = []
+        for width in targets:
+            height = round(width * ASPECT[1] / ASPECT[0])
+            frame = ImageOps.fit(image, (width, height), Image.LANCZOS)
+            buffer = io.BytesIO()
+            frame.save(buffer, pil_format, **options)
+            stored = default_storage.save(
+                _variant_name(name, width, extension),
+                ContentFile(buffer.getvalue()),
+            )
+            files.append({
+                'width': width, 'height': height, 'name': stored,
+                'size': buffer.tell(),
+            })
+        result['formats'][mime] = files
+    return result
+
+
+def _store(post_id: int, name: str, variants: dict) -> None:
+    """Записывает варианты, если у поста все еще та же картинка,
+    и сбрасывает версии кеша страниц с этим постом.
+    """
+    row = (
+        Post.objects.filter(pk=post_id)
+        .values_list('author_id', 'group_id').first()
+    )
+    updated = Post.objects.filter(pk=post_id, image=name).update(
+        image_variants=variants
+    )
+    if updated and row is not None:
+        author_id, group_id = row
+        namespaces = ['index', f'profile:{author_id}', f'post:{post_id}']
+        if group_id is not None:
+            namespaces.append(f'group:{group_id}')
+        feed_cache.bump(*namespaces)
+        timeline.touch_post(post_id)
+
+
+def build(post_id: int, name: str) -> None:
+    """Создает варианты картинки поста. Выполняется в пуле."""
+    try:
+        with default_storage.open(name) as source:
+            image = Image.open(source)
+            image.load()
+        _store(post_id, name, encode(image, name))
+    finally:
+        cache.delete(_pending_key(post_id, name))
+
+
+def _report(post_id: int, name: str, future) -> None:
+    error = future.exception()
+    if error is not None:
+        forget_broken(error)
+        logger.error(
+            f'Не удалось создать варианты {name} поста {post_id}',
+            exc_info=error,
+        )
+
+
+def schedule(post: Post, inline: bool = False) -> None:
+    """Ставит перекодирование картинки поста в пул превью.
+    Имя картинки задается ее содержимым (см. ContentAddressedStorage),
+    поэтому для повторной загрузки берутся готовые варианты
+    другого поста. Без пула (THUMBNAIL_WORKERS = 0) запрос
+    картинку не перекодирует: пост ждет команды build_image_variants,
+    которая вызывает schedule с inline=True и перекодирует сразу,
+    в своем процессе.
+    """
+    name = post.image.name
+    if not name or post.image_variants.get('source') == name:
+        return
+    ready = (
+        Post.objects.filter(image=name, image_variants__source=name)
+        .values_list('image_variants', flat=True).first()
+    )
+    if ready is not None:
+        _store(post.pk, name, ready)
+        return
+    if not inline and not getattr(settings, 'THUMBNAIL_WORKERS', 0):
+        return
+    if not cache.add(
+        _pending_key(post.pk, name), True,
+        getattr(settings, 'THUMBNAIL_PENDING_TIMEOUT', 600)
+    ):
+        return
+    if inline:
+        build(post.pk, name)
+        return
+    executor().submit(build, post.pk, name).add_done_callback(
+        partial(_report, post.pk, name)
+    )
+
+
+def _ready(post: Post) -> dict:
+    """Варианты текущей картинки поста; от прежней не отдаются."""
+    variants = post.image_variants or {}
+    if not post.image or variants.get('source') != post.image.name:
+        return {}
+    return variants
+
+
+def fallback_url(post: Post):
+    """JPEG ширины 960 или ближайшей к ней для <img src>."""
+    files = _ready(post).get('formats', {}).get('image/jpeg')
+    if not files:
+        return None
+    best = min(files, key=lambda file: abs(file['width'] - 960))
+    return default_storage.url(best['name'])
+
+
+def sources(post: Post) -> list:
+    """Элементы <source> для <picture>: тип и srcset."""
+    variants = _ready(post)
+    if not variants:
+        return []
+    return [
+        {
+            'type': mime,
+            'srcset': ', '.join(
+                f'{default_storage.url(file["name"])} {file["width"]}w'
+                for file in files
+            ),
+            'sizes': SIZES,
+        }
+        for mime, files in variants['formats'].items()
+    ]
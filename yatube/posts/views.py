@@ -1,26 +1,47 @@
+from django.conf import settings
 from django.contrib.auth.decorators import login_required
+from django.http import HttpResponseBadRequest, JsonResponse
 from django.shortcuts import get_object_or_404, redirect, render
+from django.views.decorators.http import require_POST
 
+from core.middleware.page_cache import anonymous_page
+from core.middleware.replica import replica_reads
+from core.middleware.view_counter import counts_views
+
+from . import (follow_graph, follows, freshness, suggestions, timeline,
+               trending)
+from .feed_cache import feed_context
 from .forms import CommentForm, PostForm
-from .models import Follow, Group, Post, User
+from .models import Group, Post, User
+from .search import search as full_text_search
+from .timeline import CURSOR_KEYS, timeline_posts
 from .utils import get_paginator
+from yatube.settings import num_posts
 from typing import Union
 from django.http import HttpRequest, HttpResponse
 from django.template.response import TemplateResponse
 
 
+@replica_reads
+@anonymous_page(freshness.index)
 def index(request):
     posts = Post.objects.select_related('author', 'group')
-    context = {'page_obj': get_paginator(posts, request)}
+    context = {
+        'page_obj': get_paginator(posts, request),
+        **feed_context('index'),
+    }
     return render(request, 'posts/index.html', context)
 
 
+@replica_reads
+@anonymous_page(freshness.group_posts)
 def group_posts(request, slug):
     group = get_object_or_404(Group, slug=slug)
-    posts = Post.objects.filter(group=group)
+    posts = group.gr_posts.select_related('author', 'group')
     context = {
         'group': group,
-        'page_obj': get_paginator(posts, request)
+        'page_obj': get_paginator(posts, request),
+        **feed_context(f'group:{group.pk}'),
     }
     return render(request, 'posts/group_list.html', context)
 
@@ -37,18 +58,22 @@ def group_posts(request, slug):
 #     return render(request, 'posts/group_list.html', context)
 
 
-def profile(request, username, following=False):
-    author = get_object_or_404(User, username=username)
-    post_list = author.posts.select_related('author')
+@replica_reads
+@anonymous_page(freshness.profile)
+def profile(request, username, following=False, suggested=()):
+    author = get_object_or_404(
+        User.objects.select_related('stats'), username=username
+    )
+    post_list = author.posts.select_related('author', 'group')
     if request.user.is_authenticated:
-        following = Follow.objects.filter(
-            author=author,
-            user=request.user
-        ).exists()
+        following = follow_graph.is_following(request.user.pk, author.pk)
+        suggested = suggestions.for_user(request.user)
     context = {
         'author': author,
         'following': following,
-        'page_obj': get_paginator(post_list, request)
+        'suggestions': suggested,
+        'page_obj': get_paginator(post_list, request),
+        **feed_context(f'profile:{author.pk}'),
     }
     return render(request, 'posts/profile.html', context)
 
@@ -187,14 +212,20 @@ def post_edit(request, post_id):
 #                            'post_id': post_id})
 
 
+@replica_reads
+@counts_views(trending.post_viewed)
+@anonymous_page(freshness.post_detail)
 def post_detail(request, post_id):
-    post = get_object_or_404(Post, pk=post_id)
+    post = get_object_or_404(
+        Post.objects.select_related('author__stats', 'group'), pk=post_id
+    )
     form = CommentForm()
-    comments = post.comments.all()
+    comments = post.comments.select_related('author')
     context = {
         'post': post,
         'form': form,
         'comments': comments,
+        **feed_context(f'post:{post.pk}'),
     }
     return render(request, 'posts/post_detail.html', context)
 
@@ -214,33 +245,67 @@ def add_comment(request, post_id):
 # add_comment = login_required(add_comment)
 
 
+@replica_reads
 @login_required
 def follow_index(request):
-    post = (
-        Post.objects
-        .select_related('author')
-        .filter(author__following__user=request.user)
-    )
-    page_obj = get_paginator(post, request)
+    pulled = timeline.pulled_authors(request.user)
+    post = timeline_posts(request.user, pulled)
+    page_obj = get_paginator(post, request, CURSOR_KEYS)
     context = {
-        'page_obj': page_obj
+        'page_obj': page_obj,
+        'suggestions': suggestions.for_user(request.user),
+        **feed_context(*timeline.feed_namespaces(request.user, pulled)),
     }
     return render(request, 'posts/follow.html', context)
 
 
 @login_required
 def profile_follow(request, username):
-    author = get_object_or_404(User, username=username)
-    if not Follow.objects.filter(
-            user=request.user,
-            author=author,
-    ).exists() and author != request.user:
-        Follow.objects.create(user=request.user, author=author)
+    # Неизвестный автор пропускается, и профиль ответит 404.
+    follows.follow(request.user, [username])
     return redirect('posts:profile', username)
 
 
 @login_required
 def profile_unfollow(request, username):
-    author = get_object_or_404(User, username=username)
-    Follow.objects.filter(user=request.user, author=author).delete()
+    follows.unfollow(request.user, [username])
     return redirect('posts:profile', username)
+
+
+@require_POST
+@login_required
+def follow_bulk(request):
+    """Подписка или отписка сразу от списка авторов (username=...),
+    например при онбординге. Все изменения в одной транзакции.
+    """
+    usernames = request.POST.getlist('username')
+    action = request.POST.get('action', 'follow')
+    limit = getattr(settings, 'FOLLOW_BULK_LIMIT', 100)
+    if action not in ('follow', 'unfollow') or not 0 < len(usernames) <= (
+        limit
+    ):
+        return HttpResponseBadRequest(
+            f'Нужны action=follow|unfollow и от 1 до {limit} username'
+        )
+    changed = getattr(follows, action)(request.user, usernames)
+    return JsonResponse({'action': action, 'changed': len(changed)})
+
+
+def trending_index(request):
+    context = {
+        'page_obj': trending.posts_page(request.GET.get('page')),
+        'groups': trending.groups(),
+    }
+    return render(request, 'posts/trending.html', context)
+
+
+def search(request):
+    query = request.GET.get('q', '').strip()
+    page_obj = full_text_search(
+        query, request.GET.get('cursor'), num_posts
+    )
+    context = {
+        'query': query,
+        'page_obj': page_obj,
+    }
+    return render(request, 'posts/search.html', context)
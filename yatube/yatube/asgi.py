@@ -0,0 +1,38 @@
+"""
+ASGI config for yatube project.
+
+It exposes the ASGI callable as a module-level variable named ``application``.
+
+For more information on this file, see
+https://docs.djangoproject.com/en/3.2/howto/deployment/asgi/
+"""
+
+import os
+
+import django
+from asgiref.sync import ThreadSensitiveContext
+from django.core.handlers.asgi import ASGIHandler
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'yatube.settings')
+
+# Асинхронные представления есть только в этом URLconf, под WSGI
+# работают синхронные (см. posts/async_views.py).
+URLCONF = 'yatube.asgi_urls'
+
+
+class AsyncViewsHandler(ASGIHandler):
+    async def get_response_async(self, request):
+        request.urlconf = URLCONF
+        return await super().get_response_async(request)
+
+
+django.setup(set_prefix=False)
+django_application = AsyncViewsHandler()
+
+
+async def application(scope, receive, send):
+    # Django 3.2 выполняет синхронный код всех запросов в одном общем
+    # потоке. Отдельный контекст на запрос дает каждому запросу
+    # свой поток и свое соединение с БД, как в Django 4.0+.
+    async with ThreadSensitiveContext():
+        await django_application(scope, receive, send)
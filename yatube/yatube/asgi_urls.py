@@ -0,0 +1,15 @@
+"""URLconf для ASGI (yatube/asgi.py): то же, что yatube/urls.py,
+но приложение posts подключено через posts/asgi_urls.py.
+"""
+from django.urls import include, path
+
+from .urls import handler403, handler404  # noqa: F401
+from .urls import urlpatterns as wsgi_urlpatterns
+
+urlpatterns = [
+    path('', include('posts.asgi_urls', namespace='posts')),
+    *(
+        pattern for pattern in wsgi_urlpatterns
+        if getattr(pattern, 'namespace', None) != 'posts'
+    ),
+]
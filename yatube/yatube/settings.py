@@ -27,17 +27,113 @@ DEBUG = True
 
 num_posts = 10
 
+# Курсорная пагинация лент по (pub_date, id) вместо OFFSET-страниц
+CURSOR_PAGINATION = False
+# Сколько секунд хранится в кеше число постов в ленте
+PAGINATOR_COUNT_TIMEOUT = 300
+
+# Лента подписок: авторы с большим числом подписчиков не раскладываются
+# по лентам при публикации, а подмешиваются при чтении
+TIMELINE_FANOUT_LIMIT = 1000
+# Сколько последних постов автора попадает в ленту при подписке
+TIMELINE_BACKFILL_SIZE = 500
+
+# Бюджеты SQL-запросов представлений объявляются в urls.py приложений.
+# При QUERY_BUDGET_STRICT нарушения выбрасывают исключение, иначе пишутся
+# в лог. Запрос, повторенный QUERY_REPEAT_THRESHOLD раз, считается N+1.
+QUERY_BUDGET_STRICT = False
+QUERY_REPEAT_THRESHOLD = 3
+
 CSRF_FAILURE_VIEW = 'core.views.csrf_failure'
 
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
-
+# Картинки постов хранятся по sha256 содержимого и удаляются командой
+# collect_media не раньше, чем через столько секунд без ссылок
+MEDIA_GC_GRACE = 60 * 60 * 24
+# Медиафайлы отдает core.views.media: проверяет доступ и передает
+# файл фронтовому серверу. 'x-accel-redirect' для nginx с internal
+# location MEDIA_INTERNAL_URL, смотрящим в MEDIA_ROOT, 'x-sendfile'
+# для Apache/lighttpd, None - отдача из Python с поддержкой Range
+MEDIA_SENDFILE = None
+MEDIA_INTERNAL_URL = '/internal-media/'
+# Каталоги MEDIA_ROOT, открытые всем, остальное видит только персонал
+MEDIA_PUBLIC_DIRS = ('posts', 'cache')
+# Срок кеширования файлов, имя которых не содержит хеш содержимого
+MEDIA_MAX_AGE = 60 * 60
+
+# Кеш общий для всех воркеров на сервере: файл SQLite в режиме WAL
+# с защитой от лавины пересчетов (см. core/cache_backends/sqlite.py)
 CACHES = {
     'default': {
-        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'BACKEND': 'core.cache_backends.sqlite.SQLiteCache',
+        'LOCATION': os.path.join(BASE_DIR, 'cache.sqlite3'),
+        'OPTIONS': {
+            'MAX_ENTRIES': 100000,
+        },
     }
 }
 
+# Страницы лент хранятся долго: при изменении постов, комментариев
+# и подписок сигналы меняют версию их пространства имен в кеше
+FEED_CACHE_TIMEOUT = 60 * 60 * 6
+
+# Готовые страницы для анонимных читателей, см.
+# core.middleware.page_cache. Версия страницы входит в ключ,
+# поэтому срок нужен только для вытеснения старых копий
+PAGE_CACHE_TIMEOUT = 60 * 60
+
+# Сколько авторов можно подписать или отписать одним запросом
+# к posts:follow_bulk
+FOLLOW_BULK_LIMIT = 100
+
+# Граф подписок в памяти воркера (posts/follow_graph.py): проверка
+# подписки и список авторов ленты без SQL. Снимок пишет команда
+# follow_graph, воркер читает его при старте и дочитывает журнал
+# FollowEvent. follow_graph --prune удаляет события, вошедшие в
+# снимок и старше FOLLOW_GRAPH_EVENT_RETENTION секунд
+FOLLOW_GRAPH = True
+FOLLOW_GRAPH_SNAPSHOT = os.path.join(BASE_DIR, 'follow-graph.bin')
+FOLLOW_GRAPH_EVENT_RETENTION = 60 * 60 * 24
+
+# Рекомендации подписок считает по графу команда suggest_follows
+# (posts/suggestions.py): хранится FOLLOW_SUGGESTIONS_TOP на
+# пользователя, профиль и лента подписок показывают
+# FOLLOW_SUGGESTIONS_SHOWN из них
+FOLLOW_SUGGESTIONS_TOP = 20
+FOLLOW_SUGGESTIONS_SHOWN = 5
+
+# Популярное (posts/trending.py): вес события уменьшается вдвое
+# каждые TRENDING_HALF_LIFE секунд. Оценки и списки в кеше обновляет
+# команда refresh_trending по расписанию, раз в минуту. Просмотры
+# копятся в процессе и пишутся фоновым таймером через
+# TRENDING_VIEW_FLUSH секунд после первого (0 - сразу)
+TRENDING_HALF_LIFE = 60 * 60 * 6
+TRENDING_WEIGHTS = {'view': 1, 'comment': 5, 'follow': 10}
+TRENDING_SIZE = 100
+TRENDING_GROUPS = 10
+TRENDING_VIEW_FLUSH = 10
+# Оценки меньше этой удаляются, чтобы таблица не росла
+TRENDING_MIN_SCORE = 0.01
+
+# Пачка api:batch: сколько постов, профилей и групп можно запросить
+# разом и сколько объект живет в кеше. Изменения сбрасывают его
+# раньше через версии кеша лент
+API_BATCH_LIMIT = 300
+API_BATCH_CACHE_TIMEOUT = 60 * 5
+
+# Поиск ранжирует по BM25 только столько самых новых совпадений,
+# чтобы частые слова не ранжировались по всей базе
+SEARCH_RANK_WINDOW = 2000
+
+# Варианты картинок (posts/variants.py) создаются при сохранении
+# поста в пуле процессов, шаблоны до их готовности показывают
+# исходник. При THUMBNAIL_WORKERS = 0 пул не запускается и запросы
+# картинки не перекодируют. Посты без вариантов доделывает команда
+# build_image_variants, файлы удаленных картинок удаляет collect_media
+THUMBNAIL_WORKERS = 2
+THUMBNAIL_PENDING_TIMEOUT = 60 * 10
+
 ALLOWED_HOSTS = [
     'localhost',
     '127.0.0.1',
@@ -61,6 +157,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'core.middleware.query_budget.QueryBudgetMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -68,6 +165,9 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'core.middleware.replica.ReplicaMiddleware',
+    'core.middleware.view_counter.ViewCounterMiddleware',
+    'core.middleware.page_cache.AnonymousPageCacheMiddleware',
 ]
 
 ROOT_URLCONF = 'yatube.urls'
@@ -97,12 +197,55 @@ WSGI_APPLICATION = 'yatube.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/2.2/ref/settings/#databases
 
+# SQLite в режиме WAL с busy_timeout и BEGIN IMMEDIATE, см.
+# core/db_backends/sqlite3/base.py. Соединения живут между запросами,
+# обслуживание базы - команда sqlite_maintenance по расписанию
 DATABASES = {
     'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
+        'ENGINE': 'core.db_backends.sqlite3',
         'NAME': os.path.join(BASE_DIR, 'db.sqlite3'),
+        'CONN_MAX_AGE': 60 * 10,
+        'OPTIONS': {
+            'BUSY_TIMEOUT': 5000,
+            'MMAP_SIZE': 256 * 1024 * 1024,
+            'CACHE_SIZE': -64 * 1024,
+        },
     }
 }
+# Реплика для чтения: копия default, которую обновляет команда
+# refresh_replica через backup API SQLite. Представления с
+# replica_reads читают с реплики, если ее снимок не старше последней
+# записи больше чем на REPLICA_MAX_LAG секунд, а пользователь
+# не писал сам последние REPLICA_STICKY_SECONDS секунд
+DATABASES['replica'] = {
+    **DATABASES['default'],
+    'NAME': os.path.join(BASE_DIR, 'db-replica.sqlite3'),
+    'TEST': {'MIRROR': 'default'},
+}
+DATABASE_REPLICAS = ['replica']
+DATABASE_ROUTERS = [
+    'posts.sharding.ShardRouter',
+    'core.db_routers.ReplicaRouter',
+]
+REPLICA_STICKY_SECONDS = 10
+REPLICA_MAX_LAG = 0
+
+# Шарды постов и комментариев, см. posts/sharding.py. Автор попадает
+# в корзину author_id % POST_SHARD_BUCKETS, корзины делятся между
+# шардами, переносит корзины команда reshard. Число корзин входит
+# в id постов, после включения второго шарда его не менять. Пример:
+# DATABASES['shard1'] = {
+#     **DATABASES['default'],
+#     'NAME': os.path.join(BASE_DIR, 'db-shard1.sqlite3'),
+# }
+# POST_SHARDS = ['default', 'shard1']
+# и python manage.py migrate --database shard1
+POST_SHARDS = ['default']
+POST_SHARD_BUCKETS = 1024
+# Как часто процесс проверяет, не перенесены ли корзины
+POST_SHARD_MAP_TTL = 1
+# Сколько запись ждет окончания переноса своей корзины
+POST_SHARD_FREEZE_WAIT = 10
 
 
 # Password validation
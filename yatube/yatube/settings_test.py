@@ -0,0 +1,39 @@
+"""Настройки для python manage.py test.
+
+Совпадают с рабочими. Отличается только то, что нельзя включить
+через override_settings: второй шард объявляется до создания
+тестовых баз, а кеш, загруженные файлы и снимок графа подписок лежат в своих
+файлах во временном каталоге, чтобы не смешиваться с данными
+рабочей базы и не оставаться в рабочем дереве. Кеш
+TestRunner очищает перед запуском. Бюджеты запросов в тестах
+строгие: превышение роняет любой тест, а не только проверку
+бюджетов.
+"""
+import os
+import tempfile
+
+from .settings import *  # noqa: F401,F403
+from .settings import BASE_DIR, CACHES, DATABASES
+
+DATABASES['shard1'] = {
+    **DATABASES['default'],
+    'NAME': os.path.join(BASE_DIR, 'db-shard1.sqlite3'),
+}
+
+# Файлы тестов лежат во временном каталоге, а не в рабочем дереве.
+TEST_FILES_DIR = tempfile.gettempdir()
+
+CACHES['default'] = {
+    **CACHES['default'],
+    'LOCATION': os.path.join(TEST_FILES_DIR, 'yatube-test-cache.sqlite3'),
+}
+
+TEST_RUNNER = 'core.test_runner.TestRunner'
+
+MEDIA_ROOT = os.path.join(TEST_FILES_DIR, 'yatube-test-media')
+
+FOLLOW_GRAPH_SNAPSHOT = os.path.join(
+    TEST_FILES_DIR, 'yatube-test-follow-graph.bin'
+)
+
+QUERY_BUDGET_STRICT = True